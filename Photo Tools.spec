@@ -6,6 +6,9 @@ datas = []
 hiddenimports = []
 datas += collect_data_files('PIL')
 hiddenimports += collect_submodules('PIL')
+# gui_phototools importa las herramientas de forma perezosa (lazy_import): PyInstaller no las ve solo
+hiddenimports += ['discovery', 'tiff_to_jpeg', 'split_half_frames', 'frames_pic', 'fix_dates', 'rename_files',
+                  'dedup', 'similarity', 'watch_folder', 'scheduler', 'pipeline', 'renditions', 'numpy']
 
 
 a = Analysis(
@@ -0,0 +1,462 @@
+# bench_tools.py
+"""
+Benchmark de las herramientas de imagen con fixtures sintéticos.
+
+Genera localmente escaneos falsos (pares half-frame con divisor oscuro,
+escaneos con rebates negros, TIFF multipágina y con alfa) a 12/24/50 MP,
+ejecuta cada herramienta en un proceso limpio y guarda wall time,
+imágenes/seg, pico de RSS y asignaciones en un JSON comparable entre commits.
+
+    python bench_tools.py run --sizes 12,24 --out bench_results/abc123.json
+    python bench_tools.py compare bench_results/old.json bench_results/new.json
+    python bench_tools.py startup            # import del GUI (-X importtime) y primera ventana
+    python bench_tools.py transport --sizes 24,50   # pasar un escaneo decodificado entre procesos
+"""
+import os
+import io
+import sys
+import json
+import time
+import pickle
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+import numpy as np
+from PIL import Image
+
+# ===== Config =====
+FIXTURE_DIR     = "bench_fixtures"   # cache de fixtures (se reutiliza entre runs)
+RESULTS_DIR     = "bench_results"
+SIZES_MP        = (12, 24, 50)
+REPEAT          = 3                  # repeticiones cronometradas por caso
+REGRESSION_PCT  = 0.10               # +10% de tiempo = regresión
+STARTUP_REPEAT  = 5
+STARTUP_TOP     = 15                 # módulos más caros en el informe de importtime
+SEED            = 1234
+
+# Dimensiones 3:2 aproximadas por megapíxel
+DIMENSIONS = {
+    12: (4240, 2832),
+    24: (6000, 4000),
+    50: (8660, 5774),
+}
+
+
+# ---------- Fixtures sintéticos ----------
+def _texture(w, h, rng):
+    """Gradiente + ruido: comprime como una foto, no como un color plano."""
+    x = np.linspace(40, 220, w, dtype=np.float32)
+    y = np.linspace(30, 200, h, dtype=np.float32)[:, None]
+    base = (x[None, :] * 0.6 + y * 0.4)
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    for c, k in enumerate((1.0, 0.9, 0.8)):
+        noise = rng.normal(0, 12, size=(h, w)).astype(np.float32)
+        out[..., c] = np.clip(base * k + noise, 0, 255).astype(np.uint8)
+    return out
+
+
+def make_half_frame_pair(path, w, h, rng):
+    """Dos medios fotogramas separados por una banda oscura cerca del centro."""
+    arr = _texture(w, h, rng)
+    center = w // 2 + int(rng.integers(-w // 40, w // 40))
+    band = max(8, w // 100)
+    arr[:, center - band // 2:center + band // 2] = rng.integers(0, 6, size=(h, band // 2 * 2, 3))
+    # rebates laterales finos, como en un escaneo real
+    arr[:, :6] = 3
+    arr[:, -6:] = 3
+    Image.fromarray(arr, "RGB").save(path, quality=92)
+
+
+def make_rebate_scan(path, w, h, rng):
+    """Escaneo con rebates oscuros de grosor distinto en cada lado."""
+    arr = _texture(w, h, rng)
+    left, right, top, bottom = (int(v) for v in rng.integers(8, 35, size=4))
+    arr[:, :left] = 8
+    arr[:, w - right:] = 10
+    arr[:top, :] = 6
+    arr[h - bottom:, :] = 12
+    Image.fromarray(arr, "RGB").save(path, quality=92)
+
+
+def make_multipage_tiff(path, w, h, rng, pages=3):
+    frames = [Image.fromarray(_texture(w, h, rng), "RGB") for _ in range(pages)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], compression="tiff_lzw")
+
+
+def make_alpha_tiff(path, w, h, rng):
+    rgb = _texture(w, h, rng)
+    alpha = np.full((h, w, 1), 255, dtype=np.uint8)
+    alpha[: h // 10] = 0
+    alpha[:, : w // 10] = 128
+    Image.fromarray(np.concatenate([rgb, alpha], axis=2), "RGBA").save(path, compression="tiff_lzw")
+
+
+FIXTURE_KINDS = {
+    "halfframe": ("jpg", make_half_frame_pair),
+    "rebate":    ("jpg", make_rebate_scan),
+    "multipage": ("tif", make_multipage_tiff),
+    "alpha":     ("tif", make_alpha_tiff),
+}
+
+
+def ensure_fixtures(sizes, fixture_dir=None):
+    """Crea (si no existen) los fixtures para cada tamaño. Devuelve {(kind, mp): path}."""
+    fixture_dir = fixture_dir or FIXTURE_DIR
+    os.makedirs(fixture_dir, exist_ok=True)
+    rng = np.random.default_rng(SEED)
+    paths = {}
+    for mp_ in sizes:
+        w, h = DIMENSIONS[mp_]
+        for kind, (ext, make) in FIXTURE_KINDS.items():
+            path = os.path.join(fixture_dir, f"{kind}_{mp_}mp.{ext}")
+            if not os.path.exists(path):
+                print(f"🛠️  generando {path} ({w}x{h})")
+                make(path, w, h, rng)
+            paths[(kind, mp_)] = path
+    return paths
+
+
+# ---------- Casos (se ejecutan en un proceso hijo limpio) ----------
+def _case_process_image(src, out_dir):
+    import frames_pic as fp
+    fp.process_image(src, os.path.join(out_dir, "out_blog.jpg"))
+
+
+def _case_split_half_frame(src, out_dir):
+    import split_half_frames as sf
+    sf.split_half_frame(src, out_dir)
+
+
+def _case_convert_tiff(src, out_dir):
+    import tiff_to_jpeg as tj
+    tj.convert_tiff(src, out_dir)
+
+
+def _case_auto_trim(src, out_dir):
+    import frames_pic as fp
+    img = Image.open(src)
+    img.load()
+    fp.auto_trim_dark_edges(img)
+
+
+# (tool, función, fixtures sobre los que corre)
+CASES = [
+    ("process_image",        _case_process_image,    ("rebate",)),
+    ("split_half_frame",     _case_split_half_frame, ("halfframe",)),
+    ("convert_tiff",         _case_convert_tiff,     ("multipage", "alpha")),
+    ("auto_trim_dark_edges", _case_auto_trim,        ("rebate",)),
+]
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reporta bytes, Linux kilobytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(fn, src, repeat):
+    """Se ejecuta en un proceso nuevo para que el pico de RSS sea del caso."""
+    out_dir = tempfile.mkdtemp(prefix="phototools_bench_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(src, out_dir)  # calentamiento (imports, cachés de Pillow)
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn(src, out_dir)
+                times.append(time.perf_counter() - t0)
+            # pasada aparte con tracemalloc: su overhead no debe contar en el tiempo
+            tracemalloc.start()
+            fn(src, out_dir)
+            snap = tracemalloc.take_snapshot()
+            _, py_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        blocks = sum(stat.count for stat in snap.statistics("filename"))
+        return {
+            "times_s": times,
+            "peak_rss_mb": _peak_rss_mb(),
+            "py_alloc_peak_mb": py_peak / (1024 * 1024),
+            "py_alloc_blocks_live": blocks,
+        }
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def _git_commit():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                      stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.decode().strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes=SIZES_MP, repeat=REPEAT, tools=None):
+    fixtures = ensure_fixtures(sizes)
+    ctx = mp.get_context("spawn")
+    results = {}
+    for tool, fn, kinds in CASES:
+        if tools and tool not in tools:
+            continue
+        for kind in kinds:
+            for mp_ in sizes:
+                name = f"{tool}/{kind}/{mp_}mp"
+                src = fixtures[(kind, mp_)]
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+                    r = ex.submit(_run_case, fn, src, repeat).result()
+                best = min(r["times_s"])
+                r["best_s"] = best
+                r["median_s"] = sorted(r["times_s"])[len(r["times_s"]) // 2]
+                r["images_per_s"] = 1.0 / best if best > 0 else None
+                r["megapixels"] = mp_
+                results[name] = r
+                print(f"⏱️  {name:<40} {best*1000:9.1f} ms  "
+                      f"{r['images_per_s']:.2f} img/s  RSS {r['peak_rss_mb'] or 0:.0f} MB")
+    return results
+
+
+# ---------- Transporte entre procesos: pickle frente a memoria compartida ----------
+TRANSPORTS = ("pickle", "shm")
+
+
+def _transport_produce(src, how):
+    """Worker de "decodificación": decodifica y prepara la imagen para el siguiente proceso."""
+    import shm_images
+    img = Image.open(src).convert("RGB")
+    t0 = time.time()  # reloj de pared: los dos extremos están en procesos distintos
+    payload = shm_images.share(img) if how == "shm" else np.asarray(img)
+    return payload, t0
+
+
+def _transport_consume(payload, how):
+    """Worker de "cálculo": recibe la imagen y la toca para que no quede nada perezoso."""
+    import shm_images
+    if how == "shm":
+        with shm_images.attach(payload) as sh:
+            checksum = int(sh.array[::997, ::997, :3].sum())
+        shm_images.release(payload)
+    else:
+        checksum = int(payload[::997, ::997].sum())
+    return time.time(), checksum
+
+
+def run_transport(sizes=SIZES_MP, repeat=REPEAT):
+    """
+    Tiempo desde que un proceso tiene la imagen decodificada hasta que otro
+    proceso puede leerla, pasando por el padre como en un ProcessPoolExecutor
+    encadenado. "pickle" manda el array; "shm" copia una vez al segmento y
+    manda un ImageRef (shm_images).
+    """
+    import shm_images
+    fixtures = ensure_fixtures(sizes)
+    ctx = mp.get_context("spawn")
+    results = {}
+    with shm_images.process_pool(1, ctx) as producer, shm_images.process_pool(1, ctx) as consumer:
+        for mp_ in sizes:
+            src = fixtures[("halfframe", mp_)]
+            best = {}
+            for how in TRANSPORTS:
+                times, sent = [], 0
+                for i in range(repeat + 1):
+                    payload, t0 = producer.submit(_transport_produce, src, how).result()
+                    sent = len(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+                    t1, _ = consumer.submit(_transport_consume, payload, how).result()
+                    del payload
+                    if i:  # la primera vuelta calienta imports y procesos
+                        times.append(t1 - t0)
+                best[how] = min(times)
+                results[f"transport/{how}/{mp_}mp"] = {
+                    "times_s": times,
+                    "best_s": best[how],
+                    "median_s": sorted(times)[len(times) // 2],
+                    "pickled_bytes": sent,
+                    "megapixels": mp_,
+                }
+                print(f"⏱️  transport/{how}/{mp_}mp{'':<14} {best[how]*1000:9.1f} ms  "
+                      f"{sent:>12,} bytes por el pipe")
+            print(f"💡 {mp_} MP: memoria compartida {best['pickle'] / best['shm']:.1f}× más rápida "
+                  f"({(best['pickle'] - best['shm'])*1000:.0f} ms menos por imagen y salto)\n")
+    return results
+
+
+# ---------- Arranque del GUI ----------
+_FIRST_WINDOW_SNIPPET = """
+import gui_phototools as g
+app = g.MainApp()
+app.update()
+print("WINDOW", flush=True)
+app.destroy()
+"""
+
+
+def parse_importtime(stderr):
+    """[(módulo, self_us, cumulative_us)] de la salida de -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|")
+            rows.append((name.rstrip(), int(self_us), int(cum_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def _here():
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import(module="gui_phototools"):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, cwd=_here())
+    rows = parse_importtime(out.stderr)
+    total = next((cum for name, _, cum in reversed(rows) if name.strip() == module), None)
+    return total, rows
+
+
+def measure_first_window():
+    """Segundos desde lanzar el intérprete hasta la primera ventana dibujada (None sin display)."""
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _FIRST_WINDOW_SNIPPET],
+                         capture_output=True, text=True, cwd=_here())
+    if "WINDOW" not in out.stdout:
+        return None
+    return time.perf_counter() - t0
+
+
+def run_startup(repeat=STARTUP_REPEAT, top=STARTUP_TOP):
+    results = {}
+    imports, rows_best = [], None
+    for _ in range(repeat):
+        total, rows = measure_import()
+        if total is None:
+            continue
+        imports.append(total / 1e6)
+        if rows_best is None or total / 1e6 <= min(imports):
+            rows_best = rows
+    if imports:
+        results["startup/import_gui"] = {"times_s": imports, "best_s": min(imports)}
+        print(f"⏱️  import gui_phototools: {min(imports)*1000:.1f} ms (mejor de {len(imports)})")
+        print(f"\n{'módulo':<50} {'self ms':>8} {'acum ms':>8}")
+        for name, self_us, cum_us in sorted(rows_best, key=lambda r: r[2], reverse=True)[:top]:
+            print(f"{name[:50]:<50} {self_us/1000:8.1f} {cum_us/1000:8.1f}")
+        heavy = [m for m in ("numpy", "PIL.Image") if any(n.strip() == m for n, _, _ in rows_best)]
+        if heavy:
+            print(f"\n⚠️  Se importan al arrancar: {', '.join(heavy)}")
+    windows = [t for t in (measure_first_window() for _ in range(repeat)) if t is not None]
+    if windows:
+        results["startup/first_window"] = {"times_s": windows, "best_s": min(windows)}
+        print(f"\n⏱️  primera ventana (incluye arrancar Python): {min(windows)*1000:.0f} ms")
+    else:
+        print("\nℹ️  Sin display: no se mide la primera ventana")
+    return results
+
+
+def save_results(results, out_path=None):
+    import PIL
+    meta = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+    }
+    if not out_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"{meta['commit'] or 'local'}_{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\n💾 Resultados guardados en: {out_path}")
+    return out_path
+
+
+def compare_results(old_path, new_path, threshold=REGRESSION_PCT):
+    """Imprime la comparación y devuelve la lista de casos que empeoran más de threshold."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{'caso':<40} {'antes ms':>10} {'ahora ms':>10} {'Δ':>8}  {'RSS Δ MB':>9}")
+    regressions = []
+    for name, r_new in sorted(new["results"].items()):
+        r_old = old["results"].get(name)
+        if not r_old:
+            print(f"{name:<40} {'—':>10} {r_new['best_s']*1000:10.1f}")
+            continue
+        delta = (r_new["best_s"] - r_old["best_s"]) / r_old["best_s"]
+        rss_delta = (r_new.get("peak_rss_mb") or 0) - (r_old.get("peak_rss_mb") or 0)
+        flag = "  ⚠️" if delta > threshold else ""
+        print(f"{name:<40} {r_old['best_s']*1000:10.1f} {r_new['best_s']*1000:10.1f} "
+              f"{delta:+7.1%}  {rss_delta:+9.1f}{flag}")
+        if delta > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de Photo Tools con fixtures sintéticos")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="genera fixtures y mide cada herramienta")
+    p_run.add_argument("--sizes", default=",".join(str(s) for s in SIZES_MP),
+                       help="megapíxeles separados por coma (12,24,50)")
+    p_run.add_argument("--repeat", type=int, default=REPEAT)
+    p_run.add_argument("--tool", action="append", help="limitar a una herramienta (repetible)")
+    p_run.add_argument("--out", help="ruta del JSON de resultados")
+
+    p_start = sub.add_parser("startup", help="mide el import del GUI y el tiempo hasta la primera ventana")
+    p_start.add_argument("--repeat", type=int, default=STARTUP_REPEAT)
+    p_start.add_argument("--top", type=int, default=STARTUP_TOP)
+    p_start.add_argument("--out", help="ruta del JSON de resultados")
+
+    p_tr = sub.add_parser("transport", help="pasa un escaneo decodificado entre procesos: pickle frente a memoria compartida")
+    p_tr.add_argument("--sizes", default=",".join(str(s) for s in SIZES_MP),
+                      help="megapíxeles separados por coma (12,24,50)")
+    p_tr.add_argument("--repeat", type=int, default=REPEAT)
+    p_tr.add_argument("--out", help="ruta del JSON de resultados")
+
+    p_cmp = sub.add_parser("compare", help="compara dos JSON y falla si hay regresiones")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=REGRESSION_PCT)
+
+    args = ap.parse_args()
+    if args.cmd == "run":
+        sizes = tuple(int(s) for s in args.sizes.split(",") if s.strip())
+        unknown = [s for s in sizes if s not in DIMENSIONS]
+        if unknown:
+            ap.error(f"tamaños no soportados: {unknown} (usa {sorted(DIMENSIONS)})")
+        results = run_benchmarks(sizes, repeat=args.repeat, tools=args.tool)
+        save_results(results, args.out)
+    elif args.cmd == "transport":
+        sizes = tuple(int(s) for s in args.sizes.split(",") if s.strip())
+        unknown = [s for s in sizes if s not in DIMENSIONS]
+        if unknown:
+            ap.error(f"tamaños no soportados: {unknown} (usa {sorted(DIMENSIONS)})")
+        save_results(run_transport(sizes, repeat=args.repeat), args.out)
+    elif args.cmd == "startup":
+        save_results(run_startup(args.repeat, args.top), args.out)
+    else:
+        regressions = compare_results(args.old, args.new, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresión(es) > {args.threshold:.0%}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# checkpoint.py
+"""
+Checkpoints de lotes: un log JSONL append-only por herramienta con la
+configuración usada y una línea por elemento empezado/terminado.
+
+Si el GUI se cae, el portátil se duerme o el NAS se desconecta, el siguiente
+run con la misma configuración retoma desde donde se quedó: sólo se
+re-validan los elementos que estaban "en vuelo" (empezados, no terminados)
+y se reintentan los que fallaron. El lote sólo se cierra ({"end": true})
+cuando no queda ningún fallo, o si se descarta a propósito (discard()).
+
+    {"v": 1, "tool": "tiff", "settings": {...}, "data": ..., "created": "..."}
+    {"s": "scan_0001.tif"}
+    {"d": "scan_0001.tif", "ok": true}
+    ...
+    {"end": true}
+"""
+import os
+import json
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+CHECKPOINT_VERSION = 1
+FSYNC_EVERY        = 50      # fsync cada N líneas (un corte de luz rehace como mucho N elementos)
+
+
+def checkpoint_path(folder: str, tool: str) -> str:
+    return os.path.join(folder, f".phototools_{tool}.ckpt.jsonl")
+
+
+def _canon(settings) -> object:
+    """Normaliza tuplas/listas y números para comparar configuraciones tras pasar por JSON."""
+    return json.loads(json.dumps(settings, sort_keys=True))
+
+
+def jpeg_complete(path: str) -> bool:
+    """True si el JPEG existe y termina en EOI (una escritura cortada no lo tiene)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < 4:
+                return False
+            f.seek(-2, os.SEEK_END)
+            return f.read(2) == b"\xff\xd9"
+    except OSError:
+        return False
+
+
+def outputs_complete(paths: Iterable[str]) -> bool:
+    paths = list(paths)
+    return bool(paths) and all(jpeg_complete(p) for p in paths)
+
+
+class Checkpoint:
+    def __init__(self, path: str, tool: str, settings, data=None,
+                 done: Optional[dict] = None, inflight: Optional[set] = None, resumed: bool = False):
+        self.path = path
+        self.tool = tool
+        self.settings = _canon(settings)
+        self.data = data
+        self.done = done or {}             # item -> ok
+        self.inflight = inflight or set()  # empezados sin terminar en el run anterior
+        self.resumed = resumed
+        self._fh = None
+        self._since_sync = 0
+
+    # ----- apertura -----
+    @classmethod
+    def resume(cls, folder: str, tool: str, settings) -> Optional["Checkpoint"]:
+        """Carga un checkpoint incompleto con la misma herramienta y configuración, o None."""
+        path = checkpoint_path(folder, tool)
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        if not lines:
+            return None
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None
+        if (header.get("v") != CHECKPOINT_VERSION or header.get("tool") != tool
+                or header.get("settings") != _canon(settings)):
+            return None
+        done, started = {}, set()
+        for ln in lines[1:]:
+            try:
+                rec = json.loads(ln)
+            except ValueError:
+                continue  # última línea a medio escribir
+            if rec.get("end"):
+                return None  # el lote terminó: un run nuevo empieza de cero
+            if "s" in rec:
+                started.add(rec["s"])
+            elif "d" in rec:
+                done[rec["d"]] = bool(rec.get("ok", True))
+        cp = cls(path, tool, settings, header.get("data"), done, started - set(done), resumed=True)
+        cp._fh = open(path, "a", encoding="utf-8")
+        return cp
+
+    @classmethod
+    def create(cls, folder: str, tool: str, settings, data=None) -> "Checkpoint":
+        cp = cls(checkpoint_path(folder, tool), tool, settings, data)
+        cp._fh = open(cp.path, "w", encoding="utf-8")
+        cp._write({"v": CHECKPOINT_VERSION, "tool": tool, "settings": cp.settings, "data": data,
+                   "created": datetime.now().isoformat(timespec="seconds")}, sync=True)
+        return cp
+
+    @classmethod
+    def open(cls, folder: str, tool: str, settings, resume: bool = True, data=None) -> "Checkpoint":
+        cp = cls.resume(folder, tool, settings) if resume else None
+        return cp or cls.create(folder, tool, settings, data)
+
+    # ----- registro -----
+    def _write(self, rec: dict, sync: bool = False):
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        self._since_sync += 1
+        if sync or self._since_sync >= FSYNC_EVERY:
+            os.fsync(self._fh.fileno())
+            self._since_sync = 0
+
+    def begin(self, item: str):
+        self._write({"s": item})
+
+    def finish(self, item: str, ok: bool = True):
+        self.done[item] = ok
+        self.inflight.discard(item)
+        self._write({"d": item, "ok": ok})
+
+    def pending(self, items: Iterable[str], validate: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        Elementos que faltan por hacer: los no terminados y los que fallaron. Los que
+        quedaron en vuelo se re-validan con validate(item) (p. ej. que sus salidas
+        estén completas) y, si pasan, se dan por hechos.
+        """
+        out = []
+        for it in items:
+            if self.done.get(it) is True:
+                continue
+            if it in self.inflight and validate is not None and self._valid(validate, it):
+                self.finish(it, True)
+                continue
+            out.append(it)
+        return out
+
+    @staticmethod
+    def _valid(validate, item) -> bool:
+        try:
+            return bool(validate(item))
+        except Exception:
+            return False  # ante la duda, se rehace
+
+    @property
+    def failed_before(self) -> int:
+        return sum(1 for ok in self.done.values() if not ok)
+
+    def complete(self) -> bool:
+        """
+        Cierra el log. Sólo marca el lote como terminado si nada falló: si no, el
+        siguiente run lo retoma y reintenta los fallos. Devuelve True si se cerró el lote.
+        """
+        finished = all(self.done.values())
+        if finished:
+            self._write({"end": True}, sync=True)
+        self.close()
+        return finished
+
+    def discard(self):
+        """Da el lote por terminado aunque haya fallos (el usuario no quiere reintentarlos)."""
+        self._write({"end": True}, sync=True)
+        self.close()
+
+    def close(self):
+        if self._fh:
+            try:
+                os.fsync(self._fh.fileno())
+            except OSError:
+                pass
+            self._fh.close()
+            self._fh = None
+
+
+class NullCheckpoint(Checkpoint):
+    """Para runs que no deben dejar rastro (dry-run): misma interfaz, sin archivo."""
+
+    def __init__(self):
+        super().__init__("", "", {})
+
+    def _write(self, rec: dict, sync: bool = False):
+        pass
+
+    def complete(self) -> bool:
+        return True
+
+    def close(self):
+        pass
@@ -0,0 +1,269 @@
+# dedup.py
+"""
+Detección de duplicados en el archivo a partir del recorrido de discovery.
+
+Embudo: tamaño → hash parcial (inicio + final) → BLAKE2 completo con lectura
+mmap. Después, una pasada perceptual (dHash) empareja JPEG re-codificados con
+su TIFF original. El resultado se guarda en un índice JSON dentro de la
+carpeta, con caché por (tamaño, mtime) para que las siguientes pasadas sólo
+hasheen lo nuevo. Split/Frames/TIFF→JPEG y Fix Dates lo usan para saltar
+duplicados.
+"""
+import os
+import sys
+import json
+import mmap
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import discovery
+import similarity
+
+INDEX_NAME        = ".phototools_dedup.json"
+INDEX_VERSION     = 2              # v2: dHash calculado por similarity (v1 se recalcula)
+PARTIAL_BYTES     = 64 * 1024      # bytes leídos al inicio y al final para el hash parcial
+CHUNK_BYTES       = 8 * 1024 * 1024
+HASH_WORKERS      = 4
+PERCEPTUAL        = True           # emparejar JPEG re-codificados con su TIFF
+DHASH_MAX_DIST    = 4              # bits distintos (de 64) para considerar la misma imagen
+ASPECT_TOLERANCE  = 0.01
+
+DEDUP_EXTS = (
+    ".jpg", ".jpeg", ".heic", ".heif", ".png", ".gif",
+    ".tif", ".tiff", ".dng", ".nef", ".arw", ".cr2", ".raf",
+    ".mov", ".mp4", ".m4v", ".mts", ".m2ts", ".3gp", ".avi"
+)
+_TIFF_EXTS = (".tif", ".tiff")
+_JPEG_EXTS = (".jpg", ".jpeg")
+
+
+# ---------- Hashes de contenido ----------
+def partial_hash(path: str, size: int) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(PARTIAL_BYTES))
+        if size > 2 * PARTIAL_BYTES:
+            f.seek(-PARTIAL_BYTES, os.SEEK_END)
+            h.update(f.read(PARTIAL_BYTES))
+    return h.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """BLAKE2b del archivo completo, en streaming sobre un mmap (sin copiar a memoria)."""
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as mv:
+                for off in range(0, size, CHUNK_BYTES):
+                    h.update(mv[off:off + CHUNK_BYTES])
+    return h.hexdigest()
+
+
+def _aspect(path: str) -> Optional[float]:
+    from PIL import Image
+    try:
+        with Image.open(path) as im:
+            w, h = im.size
+    except Exception:
+        return None
+    return w / h if h else None
+
+
+# ---------- Índice persistente ----------
+class DedupIndex:
+    def __init__(self, root: str, files: Optional[dict] = None, duplicates: Optional[dict] = None):
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, dict] = files or {}          # relpath -> {size, mtime, partial, blake2, dhash}
+        self.duplicates: Dict[str, str] = duplicates or {}  # relpath duplicado -> relpath que se conserva
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.root, INDEX_NAME)
+
+    def rel(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def is_duplicate(self, path: str) -> bool:
+        return self.rel(path) in self.duplicates
+
+    def original_of(self, path: str) -> Optional[str]:
+        keep = self.duplicates.get(self.rel(path))
+        return os.path.join(self.root, keep) if keep else None
+
+    def groups(self) -> List[List[str]]:
+        """[[original, dup1, dup2, …], …] en rutas relativas."""
+        by_keep: Dict[str, List[str]] = {}
+        for dup, keep in self.duplicates.items():
+            by_keep.setdefault(keep, []).append(dup)
+        return [[keep] + sorted(dups) for keep, dups in sorted(by_keep.items())]
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files, "duplicates": self.duplicates}, f)
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def load(cls, root: str) -> "DedupIndex":
+        idx = cls(root)
+        try:
+            with open(idx.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                idx.files = data.get("files", {})
+                idx.duplicates = data.get("duplicates", {})
+        except (OSError, ValueError):
+            pass
+        return idx
+
+
+def _cached(idx: DedupIndex, rel: str, entry, key: str):
+    rec = idx.files.get(rel)
+    if rec and rec.get("size") == entry.size and rec.get("mtime") == entry.mtime:
+        return rec.get(key)
+    return None
+
+
+def _remember(idx: DedupIndex, rel: str, entry, **values):
+    rec = idx.files.get(rel)
+    if not rec or rec.get("size") != entry.size or rec.get("mtime") != entry.mtime:
+        rec = idx.files[rel] = {"size": entry.size, "mtime": entry.mtime}
+    rec.update(values)
+
+
+def _keeper_order(entry):
+    # el más antiguo es el original; a igualdad, la ruta más corta (no renombrada dos veces)
+    return (entry.mtime, len(entry.path), entry.path)
+
+
+def _hash_all(idx, entries, key, fn, workers):
+    todo = []
+    out = {}
+    for e in entries:
+        rel = idx.rel(e.path)
+        v = _cached(idx, rel, e, key)
+        if v is None:
+            todo.append((rel, e))
+        else:
+            out[e.path] = v
+    if todo:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for (rel, e), v in zip(todo, ex.map(lambda t: _safe(fn, t[1]), todo)):
+                if v is not None:
+                    _remember(idx, rel, e, **{key: v})
+                    out[e.path] = v
+    return out
+
+
+def _safe(fn, entry):
+    try:
+        return fn(entry)
+    except OSError:
+        return None
+
+
+def _group_by(entries, keyfn):
+    groups: Dict[object, list] = {}
+    for e in entries:
+        k = keyfn(e)
+        if k is not None:
+            groups.setdefault(k, []).append(e)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def find_exact_duplicates(idx: DedupIndex, entries, workers: int = HASH_WORKERS) -> List[list]:
+    """Grupos de archivos byte-idénticos (cada grupo ordenado: original primero)."""
+    by_size = _group_by((e for e in entries if e.size > 0), lambda e: e.size)
+    candidates = [e for g in by_size for e in g]
+    partial = _hash_all(idx, candidates, "partial", lambda e: partial_hash(e.path, e.size), workers)
+    by_partial = _group_by(candidates, lambda e: (e.size, partial.get(e.path)) if e.path in partial else None)
+    candidates = [e for g in by_partial for e in g]
+    full = _hash_all(idx, candidates, "blake2", lambda e: full_hash(e.path), workers)
+    groups = _group_by(candidates, lambda e: full.get(e.path))
+    return [sorted(g, key=_keeper_order) for g in groups]
+
+
+def find_reencoded_copies(idx: DedupIndex, entries, workers: int = HASH_WORKERS) -> List[tuple]:
+    """Pares (tiff, jpeg) donde el JPEG es una copia re-codificada del TIFF."""
+    tiffs = [e for e in entries if e.name.lower().endswith(_TIFF_EXTS)]
+    jpegs = [e for e in entries if e.name.lower().endswith(_JPEG_EXTS)]
+    if not tiffs or not jpegs:
+        return []
+    hashes = _hash_all(idx, tiffs + jpegs, "dhash", lambda e: similarity.dhash_file(e.path), workers)
+    tiffs = [t for t in tiffs if t.path in hashes]
+    index = similarity.HashIndex([t.path for t in tiffs], [hashes[t.path] for t in tiffs])
+    pairs = []
+    for j in jpegs:
+        h = hashes.get(j.path)
+        if h is None:
+            continue
+        hits = index.query(h, DHASH_MAX_DIST)
+        best = min(((d, tiffs[i]) for i, d in hits), key=lambda x: x[0], default=None)
+        if best is None:
+            continue
+        t = best[1]
+        at, aj = _aspect(t.path), _aspect(j.path)
+        # el JPEG puede estar reducido (convert_tiff) pero no recortado
+        if at and aj and abs(at - aj) / at <= ASPECT_TOLERANCE:
+            pairs.append((t, j))
+    return pairs
+
+
+def update_index(folder: str, recursive: bool = True, entries: Optional[Iterable] = None,
+                 perceptual: bool = PERCEPTUAL, workers: int = HASH_WORKERS) -> DedupIndex:
+    """Recalcula los duplicados de folder (reutilizando hashes cacheados) y guarda el índice."""
+    idx = DedupIndex.load(folder)
+    if entries is None:
+        entries = discovery.scan_media(folder, recursive=recursive, exts=DEDUP_EXTS)
+    entries = list(entries)
+    live = {idx.rel(e.path) for e in entries}
+
+    def out_of_scope(rel):
+        # una pasada no recursiva no debe tirar la caché de las subcarpetas
+        return not recursive and os.sep in rel
+
+    idx.files = {k: v for k, v in idx.files.items() if k in live or out_of_scope(k)}
+    idx.duplicates = {k: v for k, v in idx.duplicates.items() if out_of_scope(k)}
+    for group in find_exact_duplicates(idx, entries, workers):
+        keep = idx.rel(group[0].path)
+        for dup in group[1:]:
+            idx.duplicates[idx.rel(dup.path)] = keep
+    if perceptual:
+        for tiff, jpeg in find_reencoded_copies(idx, entries, workers):
+            rel = idx.rel(jpeg.path)
+            if rel not in idx.duplicates:
+                keep = idx.rel(tiff.path)
+                idx.duplicates[rel] = idx.duplicates.get(keep, keep)
+    try:
+        idx.save()
+    except OSError:
+        pass  # carpeta de sólo lectura: el índice sigue valiendo en memoria
+    return idx
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Busca duplicados exactos y copias JPEG re-codificadas")
+    ap.add_argument("folder")
+    ap.add_argument("--no-recursive", action="store_true")
+    ap.add_argument("--no-perceptual", action="store_true")
+    args = ap.parse_args()
+    if not os.path.isdir(args.folder):
+        ap.error(f"no es una carpeta: {args.folder}")
+    idx = update_index(args.folder, recursive=not args.no_recursive, perceptual=not args.no_perceptual)
+    groups = idx.groups()
+    for g in groups:
+        print(f"🟢 {g[0]}")
+        for dup in g[1:]:
+            print(f"   ↳ {dup}")
+    print(f"\n🧹 {len(idx.duplicates)} duplicados en {len(groups)} grupos. Índice: {idx.path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# discovery.py
+"""
+Descubrimiento de medios: un único recorrido con os.scandir para todas las
+herramientas. Conserva el stat de cada archivo (tamaño/mtime gratis después),
+recorre subcarpetas en paralelo con hilos (útil en NAS, donde cada listdir
+es un round-trip de red) y entrega resultados en streaming.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+SCAN_WORKERS = 8           # hilos de listado; el cuello de botella es la latencia, no la CPU
+_DONE = object()
+
+
+class MediaEntry(NamedTuple):
+    path: str
+    name: str
+    size: int
+    mtime: float
+    stat: os.stat_result
+
+
+def _norm_exts(exts: Optional[Iterable[str]]):
+    if exts is None:
+        return None
+    return tuple(e.lower() for e in exts)
+
+
+def _scan_dir(folder: str, exts_lower, want_dirs: bool):
+    """Lista una carpeta. Devuelve (entries, subdirs). Ignora carpetas ilegibles como os.walk."""
+    files: List[MediaEntry] = []
+    subdirs: List[str] = []
+    try:
+        with os.scandir(folder) as it:
+            for de in it:
+                try:
+                    if de.is_dir(follow_symlinks=False):
+                        if want_dirs:
+                            subdirs.append(de.path)
+                        continue
+                    if exts_lower is not None and not de.name.lower().endswith(exts_lower):
+                        continue
+                    if not de.is_file():
+                        continue
+                    st = de.stat()
+                except OSError:
+                    continue
+                files.append(MediaEntry(de.path, de.name, st.st_size, st.st_mtime, st))
+    except OSError:
+        pass
+    files.sort(key=lambda e: e.name)
+    return files, subdirs
+
+
+def iter_media(folder: str, recursive: bool = True, exts: Optional[Iterable[str]] = None,
+               workers: int = SCAN_WORKERS) -> Iterator[MediaEntry]:
+    """
+    Genera MediaEntry para cada archivo con extensión en exts (None = todos).
+    En modo recursivo con workers > 1 el orden entre carpetas no está garantizado.
+    """
+    exts_lower = _norm_exts(exts)
+    if not recursive:
+        files, _ = _scan_dir(folder, exts_lower, want_dirs=False)
+        yield from files
+        return
+    if workers <= 1:
+        stack = [folder]
+        while stack:
+            files, subdirs = _scan_dir(stack.pop(), exts_lower, want_dirs=True)
+            yield from files
+            stack.extend(reversed(sorted(subdirs)))
+        return
+
+    out: "queue.Queue" = queue.Queue()
+    pending = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+
+    def submit(d):
+        with lock:
+            pending[0] += 1
+        pool.submit(visit, d)
+
+    def visit(d):
+        try:
+            if stop.is_set():
+                return
+            files, subdirs = _scan_dir(d, exts_lower, want_dirs=True)
+            for sd in subdirs:
+                submit(sd)
+            if files:
+                out.put(files)
+        finally:
+            with lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                out.put(_DONE)
+
+    submit(folder)
+    try:
+        while True:
+            batch = out.get()
+            if batch is _DONE:
+                break
+            yield from batch
+    finally:
+        # si el consumidor abandona el generador, no seguimos listando el NAS
+        stop.set()
+        pool.shutdown(wait=False)
+
+
+def scan_media(folder: str, recursive: bool = True, exts: Optional[Iterable[str]] = None,
+               workers: int = SCAN_WORKERS) -> List[MediaEntry]:
+    """Recorrido completo, ordenado por ruta (determinista para barras de progreso y planes)."""
+    entries = list(iter_media(folder, recursive=recursive, exts=exts, workers=workers))
+    entries.sort(key=lambda e: e.path)
+    return entries
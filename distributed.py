@@ -0,0 +1,486 @@
+# distributed.py
+"""
+Modo distribuido sin coordinador: varias máquinas (o procesos) reparten un
+lote grande a través de la carpeta compartida del NAS.
+
+    python distributed.py work tiff /Volumes/NAS/scans /Volumes/NAS/jpeg   # en cada Mac / Linux
+    python distributed.py status /Volumes/NAS/jpeg tiff
+
+  - Manifiesto: el primer worker escribe out/.phototools_<tool>.manifest.json
+    con la lista de archivos y la configuración de la herramienta; el resto
+    lo lee y usa exactamente esa configuración.
+  - Leases: para procesar un archivo hay que crear su lease con O_EXCL
+    (out/.phototools_<tool>.leases/<hash>.lease); sólo un worker lo consigue.
+    Un hilo lo reescribe cada HEARTBEAT_SECONDS. Si un lease lleva más de
+    LEASE_TTL sin latido (worker caído, portátil dormido), otro worker lo
+    renombra a .stale (rename es atómico: sólo uno gana) y lo reclama.
+  - Salidas idempotentes: se escriben a .part y se renombran, y al terminar se
+    crea <hash>.done. Si dos workers acaban procesando lo mismo (lease robado
+    a un worker lento pero vivo), el resultado es el mismo archivo.
+  - Fallos: <hash>.fail lleva la cuenta de intentos; el archivo vuelve a la
+    cola (detrás de lo nuevo) hasta MAX_ATTEMPTS. `work --retry-failed` borra
+    las marcas .fail y da otra tanda de intentos a los que se rindieron.
+
+Las edades de los leases se comparan con la hora del NAS (mtime de un archivo
+recién escrito en la carpeta de leases), no con el reloj de cada máquina.
+Para probarlo en local basta con lanzar varios `work` en la misma máquina.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import socket
+import hashlib
+import argparse
+import importlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import discovery
+import checkpoint as ck
+import pipeline
+import watch_folder as wf
+
+LEASE_TTL         = 120.0    # s sin latido para dar un lease por abandonado
+HEARTBEAT_SECONDS = 20.0
+POLL_SECONDS      = 5.0      # espera cuando lo que queda lo tienen otros workers
+MAX_ATTEMPTS      = 3        # intentos por archivo (NAS caído un momento) antes de darlo por fallido
+WORKERS           = None     # hilos por proceso; None = os.cpu_count()
+MANIFEST_VERSION  = 1
+
+# configuración de cada herramienta que viaja en el manifiesto (módulo → constantes)
+TOOL_SETTINGS: Dict[str, Dict[str, tuple]] = {
+    "tiff":       {"tiff_to_jpeg": ("MAX_LONG_EDGE", "JPEG_QUALITY", "JPEG_SUBSAMPLING",
+                                    "JPEG_PROGRESSIVE", "JPEG_OPTIMIZE", "MAX_BYTES")},
+    "split":      {"split_half_frames": ("THRESHOLD", "MARGIN", "WINDOW", "FRAMES")},
+    "frames":     {"frames_pic": ("OUTPUT_LONG_SIDE", "MIN_BORDER", "CORNER_RADIUS_PCT",
+                                  "UPSCALE_SMALLER", "AUTO_TRIM", "JPEG_QUALITY", "MAX_BYTES")},
+}
+TOOL_SETTINGS["renditions"] = {**TOOL_SETTINGS["frames"], **TOOL_SETTINGS["tiff"]}
+
+
+def manifest_path(out_dir: str, tool: str) -> str:
+    return os.path.join(out_dir, f".phototools_{tool}.manifest.json")
+
+
+def lease_dir(out_dir: str, tool: str) -> str:
+    return os.path.join(out_dir, f".phototools_{tool}.leases")
+
+
+def item_key(item: str) -> str:
+    return hashlib.sha1(item.encode("utf-8")).hexdigest()[:20]
+
+
+def current_settings(tool: str) -> dict:
+    out = {}
+    for mod, names in TOOL_SETTINGS[tool].items():
+        m = importlib.import_module(mod)
+        out.update({f"{mod}.{n}": getattr(m, n) for n in names})
+    return out
+
+
+def apply_settings(settings: dict):
+    for key, value in settings.items():
+        mod, name = key.rsplit(".", 1)
+        setattr(importlib.import_module(mod), name, value)
+
+
+# ---------- Manifiesto ----------
+def create_manifest(tool: str, inp: str, out_dir: str) -> dict:
+    """Crea el manifiesto si no existe (el primero gana) y devuelve el que haya quedado."""
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(lease_dir(out_dir, tool), exist_ok=True)
+    path = manifest_path(out_dir, tool)
+    if not os.path.exists(path):
+        items = sorted(os.path.relpath(e.path, inp)
+                       for e in discovery.scan_media(inp, recursive=False, exts=wf.TOOLS[tool].exts))
+        doc = {"v": MANIFEST_VERSION, "tool": tool, "inp": os.path.abspath(inp), "items": items,
+               "settings": current_settings(tool), "created": datetime.now().isoformat(timespec="seconds")}
+        tmp = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False)
+        try:
+            os.link(tmp, path)          # atómico y falla si otro ya lo creó
+        except FileExistsError:
+            pass
+        except OSError:                 # SMB sin hard links: O_EXCL
+            try:
+                with open(path, "x", encoding="utf-8") as f:
+                    json.dump(doc, f, ensure_ascii=False)
+            except FileExistsError:
+                pass
+        finally:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    return load_manifest(out_dir, tool)
+
+
+def load_manifest(out_dir: str, tool: str, retries: int = 10) -> dict:
+    path = manifest_path(out_dir, tool)
+    for _ in range(retries):
+        try:
+            with open(path, encoding="utf-8") as f:
+                doc = json.load(f)
+            if doc.get("v") == MANIFEST_VERSION and doc.get("tool") == tool:
+                return doc
+            raise RuntimeError(f"Manifiesto incompatible: {path}")
+        except ValueError:
+            time.sleep(0.5)             # otro worker lo está escribiendo (sólo sin hard links)
+    raise RuntimeError(f"No se pudo leer el manifiesto: {path}")
+
+
+# ---------- Leases ----------
+class LeaseDir:
+    """Leases, latidos y marcas .done/.fail en la carpeta compartida."""
+
+    def __init__(self, path: str, worker_id: str, ttl: float = LEASE_TTL):
+        self.path = path
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.held: Dict[str, str] = {}     # key -> item
+        self._lock = threading.Lock()
+
+    def _p(self, key: str, ext: str) -> str:
+        return os.path.join(self.path, f"{key}.{ext}")
+
+    def share_now(self) -> float:
+        """Hora del NAS: mtime de un archivo que acabamos de escribir."""
+        clock = os.path.join(self.path, f".clock-{self.worker_id}")
+        with open(clock, "w") as f:
+            f.write(str(time.time()))
+        return os.stat(clock).st_mtime
+
+    def _write_lease(self, f, item: str, beat: int):
+        f.write(json.dumps({"item": item, "worker": self.worker_id, "beat": beat,
+                            "at": datetime.now().isoformat(timespec="seconds")}))
+
+    def owner(self, key: str) -> Optional[str]:
+        try:
+            with open(self._p(key, "lease"), encoding="utf-8") as f:
+                return json.load(f).get("worker")
+        except (OSError, ValueError):
+            return None
+
+    def try_claim(self, key: str, item: str, now: Optional[float] = None) -> bool:
+        path = self._p(key, "lease")
+        try:
+            with open(path, "x", encoding="utf-8") as f:
+                self._write_lease(f, item, 0)
+        except FileExistsError:
+            try:
+                age = (now if now is not None else self.share_now()) - os.stat(path).st_mtime
+            except OSError:
+                return False
+            if age <= self.ttl:
+                return False
+            # abandonado: el rename es atómico, sólo un worker se lo queda
+            try:
+                os.rename(path, f"{path}.stale-{self.worker_id}")
+            except OSError:
+                return False
+            os.remove(f"{path}.stale-{self.worker_id}")
+            return self.try_claim(key, item, now)
+        with self._lock:
+            self.held[key] = item
+        return True
+
+    def heartbeat(self):
+        with self._lock:
+            held = dict(self.held)
+        for key, item in held.items():
+            if self.owner(key) != self.worker_id:
+                continue  # nos lo robaron (latido perdido): terminamos igual, la salida es idempotente
+            try:
+                with open(self._p(key, "lease"), "w", encoding="utf-8") as f:
+                    self._write_lease(f, item, int(time.time()))
+            except OSError:
+                pass
+
+    def attempts(self, key: str) -> int:
+        """Intentos fallidos anotados en <key>.fail (0 si no hay)."""
+        try:
+            with open(self._p(key, "fail"), encoding="utf-8") as f:
+                return int(json.load(f).get("attempts", 1))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return 0
+
+    def finish(self, key: str, ok: bool, error: str = "") -> int:
+        """Marca .done o suma un intento a .fail. Devuelve los intentos fallidos acumulados."""
+        attempts = 0 if ok else self.attempts(key) + 1
+        doc = {"worker": self.worker_id, "error": error}
+        if not ok:
+            doc["attempts"] = attempts
+        with open(self._p(key, "done" if ok else "fail"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(doc))
+        if ok:
+            try:
+                os.remove(self._p(key, "fail"))
+            except OSError:
+                pass
+        self.release(key)
+        return attempts
+
+    def gave_up(self, key: str, names: set) -> bool:
+        return f"{key}.fail" in names and self.attempts(key) >= MAX_ATTEMPTS
+
+    def clear_failed(self) -> int:
+        """Borra las marcas .fail (work --retry-failed). Devuelve cuántas había."""
+        n = 0
+        for name in self.listing():
+            if name.endswith(".fail"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                    n += 1
+                except OSError:
+                    pass
+        return n
+
+    def release(self, key: str):
+        with self._lock:
+            self.held.pop(key, None)
+        if self.owner(key) == self.worker_id:
+            try:
+                os.remove(self._p(key, "lease"))
+            except OSError:
+                pass
+
+    def listing(self) -> set:
+        try:
+            return set(os.listdir(self.path))
+        except OSError:
+            return set()
+
+
+# ---------- Worker ----------
+class DistributedWorker:
+    """
+    Procesa los archivos del manifiesto que nadie más tiene, con `workers`
+    hilos. Termina cuando todos tienen .done o agotaron MAX_ATTEMPTS. on_event(kind, item, info)
+    recibe "done" (info = segundos), "fail" (info = error, ya sin más intentos), "skip" e "info".
+    """
+
+    def __init__(self, tool: str, inp: str, out_dir: str, workers: Optional[int] = None,
+                 ttl: float = LEASE_TTL, heartbeat: float = HEARTBEAT_SECONDS, poll: float = POLL_SECONDS,
+                 worker_id: Optional[str] = None, on_event=None):
+        self.tool = tool
+        self.out_dir = out_dir
+        self.manifest = create_manifest(tool, inp, out_dir)
+        self.inp = self.manifest["inp"]
+        apply_settings(self.manifest["settings"])
+        self.workers = max(1, workers or WORKERS or os.cpu_count() or 1)
+        self.heartbeat_s = heartbeat
+        self.poll = poll
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{random.randrange(1 << 16):04x}"
+        self.leases = LeaseDir(lease_dir(out_dir, tool), self.worker_id, ttl)
+        self.on_event = on_event or _print_event
+        items = self.manifest["items"]
+        prior = None
+        if tool == "split":
+            import split_half_frames as sf
+            # mismo manifiesto → mismo prior en todas las máquinas
+            prior = sf.batch_prior([os.path.join(self.inp, it) for it in items])
+        self.render = pipeline.renderer(tool, out_dir, prior)
+        # cada worker empieza en un punto distinto de la lista: menos choques al reclamar
+        start = int(hashlib.sha1(self.worker_id.encode()).hexdigest(), 16) % max(1, len(items))
+        self.order = items[start:] + items[:start]
+        self.keys = {it: item_key(it) for it in items}
+        self._queue: List[str] = []
+        self._qlock = threading.Lock()
+        self._now = 0.0
+        self._stop = threading.Event()
+        self.processed = 0
+        self.failed = 0
+
+    def _refill(self) -> bool:
+        """Recarga la cola con lo pendiente y no reclamado. False si ya no queda nada por hacer ni reintentar."""
+        names = self.leases.listing()
+        pending = [it for it in self.order
+                   if f"{self.keys[it]}.done" not in names and not self.leases.gave_up(self.keys[it], names)]
+        if not pending:
+            return False
+        # los reintentos, detrás de lo que nadie ha probado todavía
+        pending.sort(key=lambda it: f"{self.keys[it]}.fail" in names)
+        now = self.leases.share_now()
+        free = []
+        for it in pending:
+            lease = f"{self.keys[it]}.lease"
+            if lease in names:
+                try:
+                    if now - os.stat(os.path.join(self.leases.path, lease)).st_mtime <= self.leases.ttl:
+                        continue  # lo tiene otro worker vivo (o nosotros)
+                except OSError:
+                    pass
+            free.append(it)
+        self._queue = free
+        self._now = now
+        return True
+
+    def _next(self) -> Optional[str]:
+        """Siguiente archivo reclamado por este worker; None cuando todo está terminado."""
+        while not self._stop.is_set():
+            with self._qlock:
+                while self._queue:
+                    it = self._queue.pop(0)
+                    if self.leases.try_claim(self.keys[it], it, self._now):
+                        return it
+                if not self._refill():
+                    return None
+                if self._queue:
+                    continue
+            self._stop.wait(self.poll)  # lo que queda está en manos de otros
+        return None
+
+    def _process(self, item: str):
+        key = self.keys[item]
+        src = os.path.join(self.inp, item)
+        try:
+            if ck.outputs_complete(wf.TOOLS[self.tool].outputs(src, self.out_dir)):
+                self.leases.finish(key, True)
+                self.on_event("skip", item, None)
+                return
+        except Exception:
+            pass
+        t0 = time.perf_counter()
+        try:
+            with open(src, "rb") as f:
+                buf = io.BytesIO(f.read())
+            pipeline.write_outputs(self.render(src, buf), src, atomic=True)
+        except Exception as e:
+            attempts = self.leases.finish(key, False, str(e))
+            if attempts >= MAX_ATTEMPTS:
+                self.failed += 1
+                self.on_event("fail", item, e)
+            else:
+                self.on_event("info", item, f"🔁 {item}: {e} (intento {attempts}/{MAX_ATTEMPTS}, se reintentará)")
+        else:
+            self.processed += 1
+            self.leases.finish(key, True)
+            self.on_event("done", item, time.perf_counter() - t0)
+
+    def _loop(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            self._process(item)
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat_s):
+            self.leases.heartbeat()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        self.on_event("info", "", f"🤝 {self.worker_id}: {len(self.order)} archivos en el manifiesto, "
+                                  f"{self.workers} hilos")
+        beat = threading.Thread(target=self._beat, name="lease-heartbeat", daemon=True)
+        beat.start()
+        threads = [threading.Thread(target=self._loop, name=f"dist-{i}") for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                t.join()
+        finally:
+            self._stop.set()
+            for key in list(self.leases.held):
+                self.leases.release(key)
+            try:
+                os.remove(os.path.join(self.leases.path, f".clock-{self.worker_id}"))
+            except OSError:
+                pass
+        self.on_event("info", "", f"🏁 {self.worker_id}: OK {self.processed}, Fallos {self.failed}")
+        return self.processed, self.failed
+
+
+def status(out_dir: str, tool: str) -> dict:
+    doc = load_manifest(out_dir, tool)
+    leases = LeaseDir(lease_dir(out_dir, tool), f"status-{os.getpid()}")
+    names = leases.listing()
+    now = leases.share_now()
+    counts = {"total": len(doc["items"]), "done": 0, "failed": 0, "leased": 0, "stale": 0, "pending": 0}
+    workers = set()
+    for it in doc["items"]:
+        key = item_key(it)
+        if f"{key}.done" in names:
+            counts["done"] += 1
+        elif leases.gave_up(key, names):
+            counts["failed"] += 1
+        elif f"{key}.lease" in names:
+            try:
+                age = now - os.stat(os.path.join(leases.path, f"{key}.lease")).st_mtime
+            except OSError:
+                counts["pending"] += 1
+                continue
+            counts["leased" if age <= LEASE_TTL else "stale"] += 1
+            workers.add(leases.owner(key))
+        else:
+            counts["pending"] += 1
+    try:
+        os.remove(os.path.join(leases.path, f".clock-{leases.worker_id}"))
+    except OSError:
+        pass
+    counts["workers"] = sorted(w for w in workers if w)
+    return counts
+
+
+def _print_event(kind, item, info):
+    if kind == "done":
+        print(f"✅ {item} ({info:.1f}s)")
+    elif kind == "fail":
+        print(f"❌ {item}: {info}")
+    elif kind == "skip":
+        print(f"⏭️  {item} (ya estaba)")
+    elif kind == "info":
+        print(info)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Reparte un lote entre varias máquinas a través de la carpeta compartida")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_w = sub.add_parser("work", help="procesa archivos libres del manifiesto hasta que no quede ninguno")
+    p_w.add_argument("tool", choices=sorted(TOOL_SETTINGS))
+    p_w.add_argument("folder")
+    p_w.add_argument("out")
+    p_w.add_argument("--workers", type=int, default=None, help="hilos en esta máquina")
+    p_w.add_argument("--lease-ttl", type=float, default=LEASE_TTL)
+    p_w.add_argument("--heartbeat", type=float, default=HEARTBEAT_SECONDS)
+    p_w.add_argument("--poll", type=float, default=POLL_SECONDS)
+    p_w.add_argument("--id", default=None, help="nombre del worker (por defecto host-pid)")
+    p_w.add_argument("--retry-failed", action="store_true",
+                     help=f"borra las marcas .fail: los fallidos vuelven a tener {MAX_ATTEMPTS} intentos")
+    p_s = sub.add_parser("status", help="resumen del lote")
+    p_s.add_argument("out")
+    p_s.add_argument("tool", choices=sorted(TOOL_SETTINGS))
+    args = ap.parse_args()
+
+    if args.cmd == "status":
+        s = status(args.out, args.tool)
+        print(f"📦 {s['done']}/{s['total']} hechos · {s['leased']} en curso · {s['stale']} abandonados · "
+              f"{s['failed']} fallidos · {s['pending']} pendientes")
+        for w in s["workers"]:
+            print(f"   👷 {w}")
+        return 0
+    if not os.path.isdir(args.folder):
+        ap.error(f"no es una carpeta: {args.folder}")
+    if args.retry_failed:
+        n = LeaseDir(lease_dir(args.out, args.tool), "retry").clear_failed()
+        print(f"🔁 {n} archivo(s) fallidos vuelven a la cola")
+    w = DistributedWorker(args.tool, args.folder, args.out, args.workers, args.lease_ttl,
+                          args.heartbeat, args.poll, args.id)
+    try:
+        _, failed = w.run()
+    except KeyboardInterrupt:
+        w.stop()
+        return 130
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,17 @@
 # fix_dates.py
+import io
 import os
 import shutil
+import struct
 import subprocess
-from typing import Iterable, Tuple, Optional
+from typing import Iterable, NamedTuple, Tuple, Optional
 from datetime import datetime
 import re
 import json
 
+import discovery
+import profiling as prof
+
 # Extensiones de imagen + vídeo
 EXTS = (
     ".jpg", ".jpeg", ".heic", ".heif", ".png", ".gif",
@@ -14,6 +19,11 @@ EXTS = (
     ".mov", ".mp4", ".m4v", ".mts", ".m2ts", ".3gp", ".avi"
 )
 
+# RAW: con XMP_SIDECAR_FOR_RAW (casilla en el GUI) no se reescriben; las fechas van a un
+# sidecar .xmp (convención Adobe: IMG_0001.xmp). Por defecto se tratan como el resto.
+RAW_EXTS = (".dng", ".nef", ".arw", ".cr2", ".raf")
+XMP_SIDECAR_FOR_RAW = False
+
 # Orden de preferencia de tags de fecha (fotos y vídeos)
 TAG_CANDIDATES = [
     "DateTimeOriginal",  # fotos
@@ -23,26 +33,272 @@ TAG_CANDIDATES = [
     "CreationDate",  # Keys:CreationDate (muy común en iPhone vídeos exportados)
 ]
 
+# Orden de preferencia en get_best_datetime(): EXIF de fotos, luego fechas QuickTime, luego XMP.
+# Nombres con grupo de familia 0 (exiftool -G); los lectores nativos devuelven los mismos.
+# QuickTime:CreationDate es Keys:CreationDate (com.apple.quicktime.creationdate), con zona local.
+DATE_TAGS = (
+    "EXIF:DateTimeOriginal",
+    "EXIF:CreateDate",
+    "QuickTime:CreationDate",
+    "QuickTime:CreateDate",
+    "XMP:CreateDate",
+    "QuickTime:ModifyDate",
+)
+
 # ---------- ExifTool metadata reader ----------
 def read_metadata(path: str) -> dict:
     """
     Returns a dict of tags -> values using exiftool JSON.
-    Keys are like 'EXIF:DateTimeOriginal', 'QuickTime:CreateDate', etc.
+    Keys use family-0 groups ('EXIF:DateTimeOriginal', 'QuickTime:CreateDate', 'XMP:CreateDate'),
+    the names DATE_TAGS and the native readers use. With -G1 they would be 'ExifIFD:…', 'Keys:…'.
     """
-    et = shutil.which("exiftool")
+    et = exiftool_path()
     if not et:
         return {}
     try:
-        out = subprocess.check_output(
-            [et, "-j", "-a", "-G1", "-s", path],
-            stderr=subprocess.DEVNULL
-        )
+        with prof.stage("exiftool_read", path) as st:
+            out = subprocess.check_output(
+                [et, "-j", "-a", "-G", "-s", "-api", "QuickTimeUTC=1", path],
+                stderr=subprocess.DEVNULL
+            )
+            st.add_bytes(len(out))
         arr = json.loads(out.decode("utf-8", errors="ignore"))
         return arr[0] if arr else {}
     except Exception:
         return {}
 
 
+# ---------- Lectores nativos de cabecera (sin ExifTool) ----------
+# JPEG/TIFF/DNG: IFD0 → ExifIFD (+ paquete XMP). MOV/MP4: moov/mvhd, mdhd y keys/ilst.
+# Sólo se leen los pocos KB de cabecera; el mdat se salta por tamaño, nunca se recorre.
+NATIVE_READERS = True
+_JPEG_EXTS = (".jpg", ".jpeg")
+_TIFF_EXTS = (".tif", ".tiff", ".dng", ".nef", ".arw", ".cr2")
+_QT_EXTS   = (".mov", ".mp4", ".m4v", ".3gp")
+_QT_EPOCH_OFFSET = 2082844800       # segundos entre 1904-01-01 y 1970-01-01
+_QT_TOPLEVEL = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid", b"meta", b"PICT"}
+_XMP_CREATE = re.compile(rb'xmp:CreateDate(?:="([^"]+)"|>([^<]+)<)')
+
+
+def _xmp_create_date(packet: bytes):
+    m = _XMP_CREATE.search(packet or b"")
+    if not m:
+        return None
+    return _normalize_dt_string(m.group(1) or m.group(2))
+
+
+def _tiff_dates(f, base: int = 0) -> Optional[dict]:
+    """Fechas EXIF/XMP de una estructura TIFF que empieza en base. None si no es TIFF."""
+    f.seek(base)
+    hdr = f.read(8)
+    if len(hdr) < 8 or hdr[:2] not in (b"II", b"MM"):
+        return None
+    e = "<" if hdr[:2] == b"II" else ">"
+    if struct.unpack(e + "H", hdr[2:4])[0] != 42:
+        return None
+
+    def read_ifd(offset):
+        f.seek(base + offset)
+        raw = f.read(2)
+        if len(raw) < 2:
+            return {}
+        n = struct.unpack(e + "H", raw)[0]
+        data = f.read(12 * n)
+        tags = {}
+        for i in range(len(data) // 12):
+            tag, typ, count = struct.unpack(e + "HHI", data[12 * i:12 * i + 8])
+            tags[tag] = (typ, count, data[12 * i + 8:12 * i + 12])
+        return tags
+
+    def value_bytes(entry):
+        typ, count, raw = entry
+        size = count * (1 if typ in (1, 2, 6, 7) else 4)
+        if size <= 4:
+            return raw[:size]
+        f.seek(base + struct.unpack(e + "I", raw)[0])
+        return f.read(min(size, 1 << 20))
+
+    out = {}
+    ifd0 = read_ifd(struct.unpack(e + "I", hdr[4:8])[0])
+    if 0x02BC in ifd0:  # XMP embebido
+        xmp = _xmp_create_date(value_bytes(ifd0[0x02BC]))
+        if xmp:
+            out["XMP:CreateDate"] = xmp
+    if 0x8769 in ifd0:  # puntero a ExifIFD
+        exif = read_ifd(struct.unpack(e + "I", ifd0[0x8769][2])[0])
+        for tag, name in ((0x9003, "EXIF:DateTimeOriginal"), (0x9004, "EXIF:CreateDate")):
+            if tag in exif:
+                val = _normalize_dt_string(value_bytes(exif[tag]).rstrip(b"\0 "))
+                if val:
+                    out[name] = val
+    return out
+
+
+def _jpeg_dates(f) -> Optional[dict]:
+    if f.read(2) != b"\xff\xd8":
+        return None
+    out = {}
+    while True:
+        b = f.read(1)
+        if not b:
+            break
+        if b != b"\xff":
+            return None
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker or marker in (b"\xda", b"\xd9"):  # SOS/EOI: ya no hay metadatos
+            break
+        if b"\xd0" <= marker <= b"\xd7" or marker == b"\x01":
+            continue
+        seglen = struct.unpack(">H", f.read(2))[0] - 2
+        if marker == b"\xe1":
+            data = f.read(seglen)
+            if data.startswith(b"Exif\0\0"):
+                out.update(_tiff_dates(io.BytesIO(data[6:])) or {})
+            elif data.startswith(b"http://ns.adobe.com/xap/1.0/\0"):
+                xmp = _xmp_create_date(data)
+                if xmp:
+                    out.setdefault("XMP:CreateDate", xmp)
+        else:
+            f.seek(seglen, os.SEEK_CUR)
+    return out
+
+
+def _qt_boxes(f, start: int, end: int):
+    """Genera (tipo, inicio_payload, fin) de los boxes entre start y end, saltando por tamaño."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            return
+        size, typ = struct.unpack(">I4s", hdr)
+        payload = pos + 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            payload += 8
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos:
+            return
+        yield typ, payload, min(pos + size, end)
+        pos += size
+
+
+def _qt_time(secs: int) -> Optional[str]:
+    """Segundos desde 1904 (UTC) → hora local, como ExifTool con QuickTimeUTC=1."""
+    if not secs:
+        return None
+    try:
+        return datetime.fromtimestamp(secs - _QT_EPOCH_OFFSET).strftime("%Y:%m:%d %H:%M:%S")
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def _qt_header_times(f, payload: int):
+    f.seek(payload)
+    head = f.read(20)
+    if len(head) < 12:
+        return None, None
+    if head[0] == 1:
+        c, m = struct.unpack(">QQ", head[4:20])
+    else:
+        c, m = struct.unpack(">II", head[4:12])
+    return _qt_time(c), _qt_time(m)
+
+
+def _qt_keys_creation(f, payload: int, end: int) -> Optional[str]:
+    """com.apple.quicktime.creationdate de moov/meta (keys + ilst)."""
+    f.seek(payload)
+    peek = f.read(8)
+    if peek[4:8] != b"hdlr":  # meta ISO = full box (versión/flags); el de QuickTime no
+        payload += 4
+    keys, ilst = [], None
+    for typ, p, e in _qt_boxes(f, payload, end):
+        if typ == b"keys":
+            f.seek(p + 4)
+            count = struct.unpack(">I", f.read(4))[0]
+            for _ in range(count):
+                ksize = struct.unpack(">I", f.read(4))[0]
+                keys.append(f.read(ksize - 4)[4:])  # sin el namespace 'mdta'
+        elif typ == b"ilst":
+            ilst = (p, e)
+    if not ilst or b"com.apple.quicktime.creationdate" not in keys:
+        return None
+    wanted = keys.index(b"com.apple.quicktime.creationdate") + 1
+    for typ, p, e in _qt_boxes(f, *ilst):
+        if struct.unpack(">I", typ)[0] != wanted:
+            continue
+        for dtyp, dp, de in _qt_boxes(f, p, e):
+            if dtyp == b"data":
+                f.seek(dp + 8)
+                return _normalize_dt_string(f.read(de - dp - 8))
+    return None
+
+
+def _quicktime_dates(f) -> Optional[dict]:
+    end = os.fstat(f.fileno()).st_size
+    out = {}
+    saw_moov = False
+    for i, (typ, p, e) in enumerate(_qt_boxes(f, 0, end)):
+        if i == 0 and typ not in _QT_TOPLEVEL:
+            return None
+        if typ != b"moov":
+            continue
+        saw_moov = True
+        for ctyp, cp, ce in _qt_boxes(f, p, e):
+            if ctyp == b"mvhd":
+                c, m = _qt_header_times(f, cp)
+                if c:
+                    out["QuickTime:CreateDate"] = c
+                if m:
+                    out["QuickTime:ModifyDate"] = m
+            elif ctyp == b"trak" and "QuickTime:MediaCreateDate" not in out:
+                for mtyp, mp, me in _qt_boxes(f, cp, ce):
+                    if mtyp != b"mdia":
+                        continue
+                    for htyp, hp, he in _qt_boxes(f, mp, me):
+                        if htyp == b"mdhd":
+                            c, _ = _qt_header_times(f, hp)
+                            if c:
+                                out["QuickTime:MediaCreateDate"] = c
+            elif ctyp == b"meta":
+                keys_date = _qt_keys_creation(f, cp, ce)
+                if keys_date:  # ExifTool: Keys:CreationDate en -G1, QuickTime:CreationDate en -G
+                    out["QuickTime:CreationDate"] = keys_date
+        break
+    if not saw_moov:
+        return None
+    # sin mvhd ni Keys, ExifTool podría encontrar XMP en udta: que decida él
+    if "QuickTime:CreateDate" not in out and "QuickTime:CreationDate" not in out:
+        return None
+    return out
+
+
+def read_header_dates(path: str) -> Optional[dict]:
+    """
+    Lee las fechas que usa get_best_datetime() directamente de la cabecera.
+    Devuelve {tag: 'YYYY:MM:DD HH:MM:SS'} con los mismos nombres que read_metadata(),
+    o None si el formato no se reconoce o no aparece ningún tag de DATE_TAGS
+    (entonces hay que preguntar a ExifTool, que lee más sitios: MakerNotes, XMP en udta…).
+    """
+    lower = path.lower()
+    md = None
+    try:
+        with open(path, "rb") as f, prof.stage("header_read", path):
+            if lower.endswith(_JPEG_EXTS):
+                md = _jpeg_dates(f)
+            elif lower.endswith(_TIFF_EXTS):
+                md = _tiff_dates(f)
+            elif lower.endswith(_QT_EXTS):
+                md = _quicktime_dates(f)
+    except (OSError, struct.error, ValueError, IndexError):
+        return None
+    if not md or not any(md.get(t) for t in DATE_TAGS):
+        return None
+    return md
+
 
 def _to_text(v):
     """Return a clean str or None."""
@@ -102,8 +358,27 @@ def _find_exe(name: str, extra: list[str] | None = None) -> str | None:
             return c
     return None
 
-EXIFTOOL = _find_exe("exiftool")
-SETFILE  = _find_exe("SetFile")
+_exe_cache: dict = {}
+
+def _cached_exe(name: str) -> str | None:
+    # se busca la primera vez que hace falta, no al importar (arranque del GUI)
+    if name not in _exe_cache:
+        _exe_cache[name] = _find_exe(name)
+    return _exe_cache[name]
+
+def exiftool_path() -> str | None:
+    return _cached_exe("exiftool")
+
+def setfile_path() -> str | None:
+    return _cached_exe("SetFile")
+
+def __getattr__(name):
+    # compatibilidad: fd.EXIFTOOL / fd.SETFILE siguen funcionando, pero de forma perezosa
+    if name == "EXIFTOOL":
+        return exiftool_path()
+    if name == "SETFILE":
+        return setfile_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def _subproc_env() -> dict:
     """Ensure PATH includes Homebrew dirs when called from a bundled app."""
@@ -113,23 +388,14 @@ def _subproc_env() -> dict:
     return env
 
 def has_exiftool() -> bool:
-    return EXIFTOOL is not None
+    return exiftool_path() is not None
 
 def has_setfile() -> bool:
-    return SETFILE is not None
+    return setfile_path() is not None
 
 def iter_files(folder: str, recursive: bool = True, exts: Iterable[str] = EXTS):
-    exts_lower = tuple(e.lower() for e in exts)
-    if recursive:
-        for root, _, files in os.walk(folder):
-            for f in files:
-                if f.lower().endswith(exts_lower):
-                    yield os.path.join(root, f)
-    else:
-        for f in os.listdir(folder):
-            path = os.path.join(folder, f)
-            if os.path.isfile(path) and f.lower().endswith(exts_lower):
-                yield path
+    for entry in discovery.iter_media(folder, recursive=recursive, exts=exts):
+        yield entry.path
 
 def _read_tags(path: str, tags: list[str]) -> dict:
     """
@@ -142,7 +408,7 @@ def _read_tags(path: str, tags: list[str]) -> dict:
     args.append(path)
     try:
         out = subprocess.check_output(
-        [EXIFTOOL, "-time:all", "-a", "-G1", "-s", "-api", "QuickTimeUTC=1", path],
+        [exiftool_path(), "-time:all", "-a", "-G", "-s", "-api", "QuickTimeUTC=1", path],
               stderr=subprocess.STDOUT,
               env=_subproc_env(),
         )
@@ -159,29 +425,22 @@ def get_best_datetime(path):
     """
     Returns (tag, 'YYYY:MM:DD HH:MM:SS') or (None, None)
     """
-    md = read_metadata(path)  # your existing function
-    # Order of preference: stills EXIF, then QuickTime dates, then XMP/Keys.
-    candidates = [
-        ("EXIF:DateTimeOriginal", md.get("EXIF:DateTimeOriginal")),
-        ("EXIF:CreateDate",       md.get("EXIF:CreateDate")),
-        ("QuickTime:CreationDate",md.get("QuickTime:CreationDate")),
-        ("QuickTime:CreateDate",  md.get("QuickTime:CreateDate")),
-        ("Keys:CreationDate",     md.get("Keys:CreationDate")),
-        ("XMP:CreateDate",        md.get("XMP:CreateDate")),
-        ("QuickTime:ModifyDate",  md.get("QuickTime:ModifyDate")),
-    ]
-    for tag, raw in candidates:
-        val = _normalize_dt_string(raw)
+    md = read_header_dates(path) if NATIVE_READERS else None
+    if md is None:
+        md = read_metadata(path)  # your existing function
+    for tag in DATE_TAGS:
+        val = _normalize_dt_string(md.get(tag))
         if val:
             return tag, val
     return None, None
 
 
-def _mac_stat_times(path: str) -> Tuple[Optional[datetime], Optional[datetime]]:
+def _mac_stat_times(path: str, st: Optional[os.stat_result] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
     """
     Lee birth time y mtime con os.stat (sólo macOS expone st_birthtime).
+    Si ya tenemos el stat del escaneo (discovery.MediaEntry.stat) no repetimos la llamada.
     """
-    st = os.stat(path)
+    st = st or os.stat(path)
     created = getattr(st, "st_birthtime", None)
     modified = st.st_mtime
     c_dt = datetime.fromtimestamp(created) if created else None
@@ -201,45 +460,243 @@ def _close_enough(a: Optional[datetime], b: Optional[datetime], seconds: int = 2
         return False
     return abs((a - b).total_seconds()) <= seconds
 
-def set_file_times_from_best(path: str, dry_run: bool = False) -> Tuple[bool, str]:
+# ---------- Sidecar XMP para RAW ----------
+_XMP_DATE_PROPS = ("exif:DateTimeOriginal", "xmp:CreateDate", "xmp:ModifyDate", "photoshop:DateCreated")
+_XMP_NAMESPACES = {
+    "xmp": "http://ns.adobe.com/xap/1.0/",
+    "exif": "http://ns.adobe.com/exif/1.0/",
+    "photoshop": "http://ns.adobe.com/photoshop/1.0/",
+}
+_XMP_TEMPLATE = """<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""/>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>
+"""
+
+
+def xmp_sidecar_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".xmp"
+
+
+def _set_xmp_prop(xmp: str, prop: str, value: str) -> str:
+    attr = re.compile(rf'({re.escape(prop)}=")[^"]*(")')
+    if attr.search(xmp):
+        return attr.sub(rf"\g<1>{value}\g<2>", xmp, count=1)
+    elem = re.compile(rf"(<{re.escape(prop)}>)[^<]*(</{re.escape(prop)}>)")
+    if elem.search(xmp):
+        return elem.sub(rf"\g<1>{value}\g<2>", xmp, count=1)
+    ns = prop.split(":", 1)[0]
+    decl = "" if f"xmlns:{ns}=" in xmp else f' xmlns:{ns}="{_XMP_NAMESPACES[ns]}"'
+    return xmp.replace("<rdf:Description", f'<rdf:Description{decl} {prop}="{value}"', 1)
+
+
+def write_xmp_sidecar(path: str, val: str) -> str:
+    """
+    Escribe (o actualiza, respetando lo que ya tenga Lightroom/Capture One) las fechas
+    en el sidecar .xmp del RAW. El original no se toca. Devuelve la ruta del sidecar.
+    """
+    sidecar = xmp_sidecar_path(path)
+    iso = f"{val[0:4]}-{val[5:7]}-{val[8:10]}T{val[11:19]}"
+    try:
+        with open(sidecar, encoding="utf-8") as f:
+            xmp = f.read()
+        if "<rdf:Description" not in xmp:
+            xmp = _XMP_TEMPLATE
+    except FileNotFoundError:
+        xmp = _XMP_TEMPLATE
+    for prop in _XMP_DATE_PROPS:
+        xmp = _set_xmp_prop(xmp, prop, iso)
+    tmp = sidecar + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(xmp)
+    os.replace(tmp, sidecar)
+    return sidecar
+
+# ---------- Plan / aplicar ----------
+# Un dry-run lee los metadatos una vez y deja un plan serializable; al aplicar
+# se ejecuta ese plan sin volver a preguntar a ExifTool, comprobando sólo que
+# tamaño y mtime_ns del archivo siguen siendo los del plan.
+PLAN_VERSION = 1
+VIDEO_EXTS = (".mov", ".mp4", ".m4v", ".mts", ".m2ts", ".3gp", ".avi")
+
+_ACTION_LABELS = {
+    "exif":        "FileCreate/Modify + EXIF",
+    "quicktime":   "FileCreate/Modify + QuickTime",
+    "xmp_sidecar": "FileCreate/Modify + sidecar XMP",
+}
+
+
+class PlanItem(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    tag: Optional[str]            # tag del que sale la fecha (None = sin fecha utilizable)
+    target: Optional[str]         # 'YYYY:MM:DD HH:MM:SS'
+    actions: Tuple[str, ...]      # ("fs_times", "exif" | "quicktime" | "xmp_sidecar")
+
+
+def plan_path(folder: str) -> str:
+    return os.path.join(folder, ".phototools_fixdates.plan.json")
+
+
+def _fingerprint(path: str, st: Optional[os.stat_result] = None) -> Tuple[int, int]:
+    st = st or os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _actions_for(path: str, xmp_sidecar: Optional[bool] = None) -> Tuple[str, ...]:
     lower = path.lower()
-    is_video = lower.endswith((".mov", ".mp4", ".m4v", ".mts", ".m2ts", ".3gp", ".avi"))
+    if xmp_sidecar is None:
+        xmp_sidecar = XMP_SIDECAR_FOR_RAW
+    if xmp_sidecar and lower.endswith(RAW_EXTS):
+        return ("fs_times", "xmp_sidecar")
+    return ("fs_times", "quicktime" if lower.endswith(VIDEO_EXTS) else "exif")
+
 
+def plan_file(path: str, st: Optional[os.stat_result] = None,
+              xmp_sidecar: Optional[bool] = None) -> PlanItem:
+    """Lee los metadatos de path (la parte cara) y decide qué se escribiría."""
+    size, mtime_ns = _fingerprint(path, st)
     tag, val = get_best_datetime(path)
-    base = os.path.basename(path)
     if not tag or not val:
+        return PlanItem(path, size, mtime_ns, None, None, ())
+    return PlanItem(path, size, mtime_ns, tag, val, _actions_for(path, xmp_sidecar))
+
+
+def is_current(item: PlanItem, st: Optional[os.stat_result] = None) -> bool:
+    try:
+        return _fingerprint(item.path, st) == (item.size, item.mtime_ns)
+    except OSError:
+        return False
+
+
+def replan(prev: Optional[PlanItem], path: str, st: Optional[os.stat_result] = None,
+           xmp_sidecar: Optional[bool] = None) -> Tuple[PlanItem, bool]:
+    """
+    Reutiliza prev si el archivo no ha cambiado desde el plan (sólo stat); si
+    no, lo vuelve a leer. Devuelve (item, releído).
+    """
+    if prev is not None and is_current(prev, st):
+        if prev.target:
+            prev = prev._replace(actions=_actions_for(path, xmp_sidecar))  # la casilla XMP pudo cambiar
+        return prev, False
+    return plan_file(path, st, xmp_sidecar), True
+
+
+def describe(item: PlanItem) -> Tuple[bool, str]:
+    """Mensaje de dry-run para una entrada del plan."""
+    base = os.path.basename(item.path)
+    if not item.target:
         return False, f"⚠️  {base} — sin fecha utilizable ({', '.join(TAG_CANDIDATES)})"
+    return True, f"🛈 {base} → (dry-run) {_ACTION_LABELS[item.actions[-1]]} = {item.target} (from {item.tag})"
 
-    if dry_run:
-        what = "FileCreate/Modify + QuickTime" if is_video else "FileCreate/Modify + EXIF"
-        return True, f"🛈 {base} → (dry-run) {what} = {val} (from {tag})"
-
-    before_c, before_m = _mac_stat_times(path)
-
-    # 1) Write metadata + filesystem via exiftool
-    cmd = ["exiftool", "-overwrite_original"]
-    cmd += [f"-FileCreateDate<{tag}", f"-FileModifyDate<{tag}"]
-    if is_video:
-        cmd += [
-            f"-CreateDate<{tag}",
-            f"-ModifyDate<{tag}",
-            f"-MediaCreateDate<{tag}",
-            f"-TrackCreateDate<{tag}",
-        ]
-    else:
-        cmd += [
-            f"-CreateDate<{tag}",
-            f"-ModifyDate<{tag}",
-            f"-AllDates<{tag}",
-        ]
-    cmd.append(path)
 
+def save_plan(folder: str, items: Iterable[PlanItem], settings: dict, path: Optional[str] = None) -> str:
+    path = path or plan_path(folder)
+    doc = {"v": PLAN_VERSION, "folder": os.path.abspath(folder), "settings": settings,
+           "created": datetime.now().isoformat(timespec="seconds"),
+           "items": [it._asdict() for it in items]}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def load_plan(folder: str, path: Optional[str] = None) -> Optional[dict]:
+    """
+    Plan guardado por el dry-run, o None si no hay (o es de otra carpeta/versión).
+    Devuelve el documento con "items" como {ruta: PlanItem}.
+    """
+    path = path or plan_path(folder)
+    try:
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        if doc.get("v") != PLAN_VERSION or doc.get("folder") != os.path.abspath(folder):
+            return None
+        items = {}
+        for d in doc["items"]:
+            it = PlanItem(d["path"], int(d["size"]), int(d["mtime_ns"]), d["tag"], d["target"],
+                          tuple(d["actions"]))
+            items[it.path] = it
+        doc["items"] = items
+        return doc
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def discard_plan(folder: str):
     try:
-        subprocess.check_output([EXIFTOOL, "-overwrite_original", ... , path],
-                        stderr=subprocess.STDOUT,
-                        env=_subproc_env())
-    except subprocess.CalledProcessError as e:
-        return False, f"❌ {base} — {e.output.decode('utf-8', errors='ignore').strip()}"
+        os.remove(plan_path(folder))
+    except OSError:
+        pass
+
+
+def export_plan_csv(path: str, items: Iterable[PlanItem]) -> str:
+    import csv
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["archivo", "bytes", "mtime_ns", "tag", "fecha", "acciones"])
+        for it in items:
+            w.writerow([it.path, it.size, it.mtime_ns, it.tag or "", it.target or "", "+".join(it.actions)])
+    return path
+
+
+def write_command(item: PlanItem) -> list:
+    """
+    Orden de ExifTool que escribe item.target tal cual (hora local), sin volver a leer el tag
+    del archivo: con `-X<tag>` ExifTool re-parsea los metadatos y copia su valor, no el del plan.
+    QuickTimeUTC=1, como al leer: las fechas QuickTime se guardan en UTC y el plan está en
+    hora local, así que ExifTool convierte al escribir.
+    """
+    val = item.target
+    cmd = [exiftool_path(), "-overwrite_original", "-api", "QuickTimeUTC=1",
+           f"-FileCreateDate={val}", f"-FileModifyDate={val}"]
+    if "quicktime" in item.actions:
+        cmd += [f"-QuickTime:{t}={val}" for t in ("CreateDate", "ModifyDate", "MediaCreateDate", "TrackCreateDate")]
+    else:
+        cmd += [f"-AllDates={val}"]  # DateTimeOriginal, CreateDate y ModifyDate
+    cmd.append(item.path)
+    return cmd
+
+
+def apply_item(item: PlanItem, st: Optional[os.stat_result] = None) -> Tuple[bool, str]:
+    """Ejecuta una entrada del plan. Sólo se re-comprueba el stat; los metadatos no se vuelven a leer."""
+    base = os.path.basename(item.path)
+    path, tag, val = item.path, item.tag, item.target
+    if not tag or not val:
+        return describe(item)
+    if not is_current(item, st):
+        return False, f"⚠️  {base} — cambió desde el plan (tamaño/mtime); vuelve a hacer el dry-run"
+    use_sidecar = "xmp_sidecar" in item.actions
+
+    before_c, before_m = _mac_stat_times(path, st)
+
+    if use_sidecar:
+        # 1) RAW: fechas al sidecar .xmp + tiempos del FS directamente; el original queda intacto
+        try:
+            with prof.stage("xmp_sidecar", path) as stg:
+                sidecar = write_xmp_sidecar(path, val)
+                stg.add_bytes(os.path.getsize(sidecar))
+            ts = datetime.strptime(val, "%Y:%m:%d %H:%M:%S").timestamp()
+            os.utime(path, (ts, ts))
+        except (OSError, ValueError) as e:
+            return False, f"❌ {base} — {e}"
+    else:
+        # 1) Write metadata + filesystem via exiftool
+        cmd = write_command(item)
+
+        try:
+            with prof.stage("exiftool_write", path) as stg:
+                subprocess.check_output(cmd,
+                                stderr=subprocess.STDOUT,
+                                env=_subproc_env())
+                stg.add_bytes(os.path.getsize(path))
+        except subprocess.CalledProcessError as e:
+            return False, f"❌ {base} — {e.output.decode('utf-8', errors='ignore').strip()}"
 
     # 2) Try to parse target datetime; if it fails, we’re done (metadata OK; FS maybe not)
     try:
@@ -254,30 +711,59 @@ def set_file_times_from_best(path: str, dry_run: bool = False) -> Tuple[bool, st
     if need_fallback and has_setfile():
         setfile_date = _exif_to_setfile_fmt(val)
         try:
-            subprocess.run([SETFILE, "-d", setfile_date, path], check=True, env=_subproc_env())
-            subprocess.run([SETFILE, "-m", setfile_date, path], check=True, env=_subproc_env())
+            with prof.stage("setfile", path):
+                subprocess.run([setfile_path(), "-d", setfile_date, path], check=True, env=_subproc_env())
+                subprocess.run([setfile_path(), "-m", setfile_date, path], check=True, env=_subproc_env())
             after_c, after_m = _mac_stat_times(path)
         except subprocess.CalledProcessError:
             pass
 
     ok_fs = _close_enough(after_c, target_dt) and _close_enough(after_m, target_dt)
     suffix = " (SetFile fallback)" if need_fallback and ok_fs else ""
+    if use_sidecar:
+        suffix += f" [sidecar {os.path.basename(xmp_sidecar_path(path))}]"
     if ok_fs:
         return True, f"✅ {base} → {val} (from {tag}){suffix}"
     else:
         return True, f"✅ {base} → {val} (from {tag}); ⚠️ birth time del FS puede no haber cambiado"
 
+def set_file_times_from_best(path: str, dry_run: bool = False,
+                             st: Optional[os.stat_result] = None,
+                             xmp_sidecar: Optional[bool] = None) -> Tuple[bool, str]:
+    item = plan_file(path, st, xmp_sidecar)
+    if dry_run:
+        return describe(item)
+    return apply_item(item, st)
+
 def fix_dates_in_folder(folder: str, recursive: bool = True, dry_run: bool = False) -> Tuple[int, int]:
     """
     Procesa todos los archivos en folder. Devuelve (ok, fallos).
+    Con dry_run guarda el plan en plan_path(folder); el siguiente run real lo
+    aplica sin volver a leer los metadatos de los archivos que no han cambiado.
     """
     if not has_exiftool():
         raise RuntimeError("ExifTool no encontrado. Instálalo con: brew install exiftool")
 
-    ok = fail = 0
-    for path in iter_files(folder, recursive=recursive):
-        success, msg = set_file_times_from_best(path, dry_run=dry_run)
+    ok = fail = reread = 0
+    prev = None if dry_run else load_plan(folder)
+    planned = prev["items"] if prev else {}
+    items = []
+    for entry in discovery.iter_media(folder, recursive=recursive, exts=EXTS):
+        item, fresh = replan(planned.get(entry.path), entry.path, entry.stat)
+        reread += fresh and bool(prev)
+        if dry_run:
+            items.append(item)
+            success, msg = describe(item)
+        else:
+            success, msg = apply_item(item, entry.stat)
         print(msg)
         if success: ok += 1
         else: fail += 1
+    if dry_run:
+        print(f"📋 Plan guardado en {save_plan(folder, items, {'recursive': recursive})}")
+    elif prev:
+        print(f"📋 Aplicado el plan del {prev['created']} ({reread} archivo(s) cambiados releídos)")
+        discard_plan(folder)
+    if prof.is_enabled():
+        print("\n" + prof.summary_table())
     return ok, fail
@@ -1,11 +1,18 @@
 import os
 from PIL import Image, ImageDraw, ImageOps, ImageStat
 
+import profiling as prof
+import pipeline
+import resampling
+import jpeg_size
+
 # ===== Config =====
 OUTPUT_LONG_SIDE   = 3000       # long edge final
 MIN_BORDER         = 50         # borde blanco mínimo
 CORNER_RADIUS_PCT  = 0.02       # radio esquinas vs. lado menor de la foto
 UPSCALE_SMALLER    = True
+JPEG_QUALITY       = 95
+MAX_BYTES          = None       # límite por archivo (Instagram, CMS): JPEG_QUALITY pasa a ser el máximo
 ANTIALIAS_SCALE    = 4          # supersampling para máscara redondeada
 
 # Auto-trim de bordes oscuros del escaneo
@@ -14,12 +21,28 @@ TRIM_THRESH        = 28         # 0..255 (más alto = más agresivo)
 TRIM_MAX_PX        = 40         # recorte máximo por lado
 TRIM_SAFETY_INSET  = 1          # px extra hacia dentro tras el recorte
 
-def choose_canvas_size(w, h):
+def choose_canvas_size(w, h, long_side=None):
     # Portrait → 4:5 ; Landscape → 5:4  (width:height)
+    long_side = long_side or OUTPUT_LONG_SIDE
     if h >= w:
-        return (OUTPUT_LONG_SIDE, int(OUTPUT_LONG_SIDE * 5 / 4))
+        return (long_side, int(long_side * 5 / 4))
     else:
-        return (OUTPUT_LONG_SIDE, int(OUTPUT_LONG_SIDE * 4 / 5))
+        return (long_side, int(long_side * 4 / 5))
+
+def frame_layout(w0, h0, long_side=None):
+    """((canvas_w, canvas_h), (iw, ih)): lienzo y tamaño al que se reescala la foto."""
+    # 1) canvas fijo por orientación
+    canvas_w, canvas_h = choose_canvas_size(w0, h0, long_side)
+
+    # 2) caja interior
+    max_w = canvas_w - 2 * MIN_BORDER
+    max_h = canvas_h - 2 * MIN_BORDER
+
+    # 3) reescalar para encajar
+    scale = min(max_w / w0, max_h / h0)
+    if scale < 1 or UPSCALE_SMALLER:
+        return (canvas_w, canvas_h), (max(1, int(round(w0 * scale))), max(1, int(round(h0 * scale))))
+    return (canvas_w, canvas_h), (w0, h0)
 
 def _luma(px):  # quick grayscale weight
     r, g, b = px
@@ -82,29 +105,27 @@ def auto_trim_dark_edges(img: Image.Image) -> Image.Image:
     return img
 
 def process_image(img_path, output_path):
-    img = Image.open(img_path).convert("RGB")
-    img = ImageOps.exif_transpose(img)
+    pipeline.write_outputs(render_image(img_path, output_path), img_path)
+
+def load_prepared(src, img_path=None):
+    """Decodifica, endereza (EXIF) y recorta bordes oscuros: la base de la que salen los marcos."""
+    img_path = img_path or src
+    with prof.stage("decode", img_path) as st:
+        img = Image.open(src).convert("RGB")
+        if isinstance(src, str):
+            st.add_bytes(os.path.getsize(img_path))
+    with prof.stage("exif_transpose", img_path):
+        img = ImageOps.exif_transpose(img)
 
     # --- Recorte automático de bordes negros del escaneo ---
     if AUTO_TRIM:
-        img = auto_trim_dark_edges(img)
-
-    w0, h0 = img.size
-
-    # 1) canvas fijo por orientación
-    canvas_w, canvas_h = choose_canvas_size(w0, h0)
-
-    # 2) caja interior
-    max_w = canvas_w - 2 * MIN_BORDER
-    max_h = canvas_h - 2 * MIN_BORDER
-
-    # 3) reescalar para encajar
-    scale = min(max_w / w0, max_h / h0)
-    if scale < 1 or UPSCALE_SMALLER:
-        new_w = max(1, int(round(w0 * scale)))
-        new_h = max(1, int(round(h0 * scale)))
-        img = img.resize((new_w, new_h), Image.LANCZOS)
+        with prof.stage("trim", img_path):
+            img = auto_trim_dark_edges(img)
+    return img
 
+def compose_frame(img, canvas_size, img_path=None):
+    """Pega img (ya a su tamaño final) centrada en el lienzo blanco con esquinas redondeadas."""
+    canvas_w, canvas_h = canvas_size
     iw, ih = img.size
 
     # 4) canvas blanco
@@ -115,15 +136,42 @@ def process_image(img_path, output_path):
     y = (canvas_h - ih) // 2
 
     # 6) máscara redondeada con antialias
-    radius = max(1, int(min(iw, ih) * CORNER_RADIUS_PCT))
-    aa_w, aa_h = iw * ANTIALIAS_SCALE, ih * ANTIALIAS_SCALE
-    aa_radius = radius * ANTIALIAS_SCALE
-    aa_mask = Image.new("L", (aa_w, aa_h), 0)
-    ImageDraw.Draw(aa_mask).rounded_rectangle([0, 0, aa_w, aa_h], radius=aa_radius, fill=255)
-    mask = aa_mask.resize((iw, ih), Image.LANCZOS)
+    with prof.stage("mask", img_path):
+        radius = max(1, int(min(iw, ih) * CORNER_RADIUS_PCT))
+        aa_w, aa_h = iw * ANTIALIAS_SCALE, ih * ANTIALIAS_SCALE
+        aa_radius = radius * ANTIALIAS_SCALE
+        aa_mask = Image.new("L", (aa_w, aa_h), 0)
+        ImageDraw.Draw(aa_mask).rounded_rectangle([0, 0, aa_w, aa_h], radius=aa_radius, fill=255)
+        mask = resampling.resize(aa_mask, (iw, ih))
 
     # 7) pegar
-    canvas.paste(img, (x, y), mask)
-
-    # 8) guardar
-    canvas.save(output_path, quality=95, subsampling=0)
+    with prof.stage("paste", img_path):
+        canvas.paste(img, (x, y), mask)
+    return canvas
+
+def encode_frame(canvas, img_path=None) -> bytes:
+    with prof.stage("encode", img_path) as st:
+        if MAX_BYTES:
+            res = jpeg_size.encode_max_bytes(canvas, MAX_BYTES, q_max=JPEG_QUALITY, subsampling=0)
+            if not res.fits:
+                print(f"⚠️  {img_path}: {len(res.data) // 1024} KB a calidad {res.quality}, no cabe en {MAX_BYTES // 1024} KB")
+            data = res.data
+        else:
+            data = pipeline.encode_jpeg(canvas, quality=JPEG_QUALITY, subsampling=0)
+        st.add_bytes(len(data))
+    return data
+
+def render_image(src, output_path, img_path=None):
+    """Como process_image pero sin escribir: src es ruta o archivo en memoria; devuelve [pipeline.Output]."""
+    img_path = img_path or src
+    img = load_prepared(src, img_path)
+
+    canvas_size, new_size = frame_layout(*img.size)
+    if new_size != img.size:
+        with prof.stage("resize", img_path):
+            img = resampling.resize(img, new_size)
+
+    canvas = compose_frame(img, canvas_size, img_path)
+
+    # 8) codificar (write_outputs / el pipeline escriben)
+    return [pipeline.Output(output_path, encode_frame(canvas, img_path), canvas.size)]
@@ -1,15 +1,50 @@
 # gui_phototools_basic.py
 import os
+import sys
 import threading
+import importlib.util
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
+import profiling as prof
+import checkpoint as ck
+import runstats
+
+
+def lazy_import(name):
+    """
+    Módulo que se carga de verdad en el primer acceso a un atributo. Así PIL,
+    NumPy y las herramientas no se importan antes de que aparezca la ventana,
+    sino al abrir su pantalla. (PyInstaller no ve estos imports: van en
+    hiddenimports del .spec, ver LAZY_MODULES.)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+LAZY_MODULES = ("discovery", "tiff_to_jpeg", "split_half_frames", "frames_pic", "fix_dates", "rename_files",
+                "dedup", "similarity", "watch_folder", "scheduler", "pipeline", "renditions")
+
 # Tus módulos
-import tiff_to_jpeg as tj
-import split_half_frames as sf
-import frames_pic as fp
-import fix_dates as fd
-import rename_files as rn
+discovery = lazy_import("discovery")
+tj = lazy_import("tiff_to_jpeg")
+sf = lazy_import("split_half_frames")
+fp = lazy_import("frames_pic")
+fd = lazy_import("fix_dates")
+rn = lazy_import("rename_files")
+dd = lazy_import("dedup")
+sim = lazy_import("similarity")
+wf = lazy_import("watch_folder")
+sched = lazy_import("scheduler")
+pipeline = lazy_import("pipeline")
+rd = lazy_import("renditions")
 
 
 # -------- Utilidades comunes --------
@@ -24,14 +59,193 @@ def choose_dir(var: tk.StringVar, title: str):
         _last_dir = d  # remember last chosen folder
 
 def list_images(folder, exts):
-    try:
-        return [f for f in os.listdir(folder) if f.lower().endswith(exts)]
-    except FileNotFoundError:
-        return []
+    return [e.name for e in discovery.scan_media(folder, recursive=False, exts=exts)]
 
 def safe_makedirs(path):
     os.makedirs(path, exist_ok=True)
 
+def drop_duplicates(log: tk.Text, folder: str, names, entries=None, recursive=False):
+    """Actualiza el índice de duplicados de folder y devuelve names sin los duplicados."""
+    log.insert("end", "🔎 Buscando duplicados…\n"); log.see("end")
+    idx = dd.update_index(folder, recursive=recursive, entries=entries)
+    keep = [n for n in names if not idx.is_duplicate(os.path.join(folder, n))]
+    skipped = len(names) - len(keep)
+    if skipped:
+        log.insert("end", f"🧹 {skipped} duplicado(s) saltado(s) (índice {dd.INDEX_NAME})\n")
+    return keep
+
+def open_checkpoint(log: tk.Text, folder: str, tool: str, settings, items, resume: bool, validate=None):
+    """Abre (o retoma) el checkpoint del lote en folder. Devuelve (checkpoint, pendientes)."""
+    try:
+        cp = ck.Checkpoint.open(folder, tool, settings, resume=resume)
+    except OSError as e:
+        log.insert("end", f"⚠️  Sin checkpoint ({e})\n")
+        cp = ck.NullCheckpoint()
+    todo = cp.pending(items, validate)
+    if cp.resumed:
+        msg = f"⏯️  Reanudando: {len(items) - len(todo)} ya hechos, {len(todo)} pendientes"
+        if cp.failed_before:
+            msg += f" ({cp.failed_before} fallaron en el run anterior y se reintentan)"
+        log.insert("end", msg + "\n\n")
+    return cp, todo
+
+def close_checkpoint(log: tk.Text, cp):
+    """Cierra el checkpoint; con fallos el lote queda abierto para reintentarlos con «Reanudar»."""
+    if not cp.complete():
+        log.insert("end", "⏸️  Hubo fallos: el lote queda abierto y «Reanudar» sólo reintenta lo pendiente "
+                          "(desmarca «Reanudar» para empezar de cero)\n")
+
+class StatsPanel(ttk.Frame):
+    """Panel en vivo bajo la barra de progreso: arch/s, MB/s, ETA, latencias, más lentos y en curso."""
+    REFRESH_MS = 500
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.stats = None
+        self._after = None
+        self.lines = [tk.StringVar() for _ in range(3)]
+        for i, var in enumerate(self.lines):
+            ttk.Label(self, textvariable=var, foreground="gray30").grid(column=0, row=i, sticky="w")
+        self.export_btn = ttk.Button(self, text="Exportar CSV…", command=self.export)
+        self.export_btn.grid(column=1, row=0, rowspan=3, sticky="e")
+        self.export_btn.state(["disabled"])
+        self.grid_columnconfigure(0, weight=1)
+
+    def begin(self) -> runstats.RunStats:
+        """Llamar desde start() (hilo de Tk). El worker rellena total/total_bytes y llama a finish_run()."""
+        if self._after:
+            self.after_cancel(self._after)
+        self.stats = runstats.RunStats()
+        self.export_btn.state(["disabled"])
+        self._tick()
+        return self.stats
+
+    def _tick(self):
+        st = self.stats
+        for var, line in zip(self.lines, st.summary_lines()):
+            var.set(line)
+        if st.running:
+            self._after = self.after(self.REFRESH_MS, self._tick)
+        else:
+            self._after = None
+            if st.records:
+                self.export_btn.state(["!disabled"])
+
+    def export(self):
+        if not self.stats:
+            return
+        from datetime import datetime
+        path = filedialog.asksaveasfilename(title="Guardar informe CSV", defaultextension=".csv",
+                                            initialdir=_last_dir,
+                                            initialfile=f"phototools_run_{datetime.now():%Y%m%d-%H%M%S}.csv",
+                                            filetypes=[("CSV", "*.csv")])
+        if path:
+            try:
+                self.stats.export_csv(path)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudo guardar el informe: {e}")
+
+def progress_area(parent, row: int, columnspan: int, pad: dict):
+    """Barra de progreso + panel de estadísticas en una sola fila de la rejilla. Devuelve (pb, panel)."""
+    box = ttk.Frame(parent)
+    box.grid(column=0,row=row,columnspan=columnspan,sticky="we",**pad)
+    box.grid_columnconfigure(0, weight=1)
+    pb = ttk.Progressbar(box, mode="determinate")
+    pb.grid(column=0,row=0,sticky="we")
+    panel = StatsPanel(box)
+    panel.grid(column=0,row=1,sticky="we",pady=(4,0))
+    return pb, panel
+
+def _size_or_zero(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def run_scheduled(log: tk.Text, pb, cp, tool: str, inp: str, out: str, todo, first: int,
+                  stats: "runstats.RunStats" = None):
+    """
+    Procesa todo con el pipeline lectura → cálculo → escritura: el disco lee por
+    adelantado mientras la CPU calcula, y los cálculos se admiten según la RAM
+    estimada por el planificador (el más grande primero). Devuelve (ok, fallos).
+    """
+    jobs = sched.make_jobs([os.path.join(inp, f) for f in todo], tool, keys=todo)
+    by_path = {j.path: j for j in jobs}
+    sizes = {p: _size_or_zero(p) for p in by_path}
+    stats = stats or runstats.RunStats()
+    stats.total, stats.total_bytes = len(jobs), sum(sizes.values())
+    prior = None
+    if tool == "split":
+        # el rollo entero en orden de nombre (también lo ya hecho): al reanudar sale el mismo prior
+        prior = sf.batch_prior([os.path.join(inp, f) for f in sorted(set(cp.done) | set(todo))])
+    render = pipeline.renderer(tool, out, prior)
+    rss = sched.RssSampler()
+    actual = {}
+
+    def compute(p, buf):
+        rss.begin(p)
+        try:
+            return render(p, buf)
+        finally:
+            actual[p] = rss.end(p)
+
+    counts = {"ok": 0, "fail": 0}
+
+    def on_done(res):
+        f = by_path[res.path].key
+        stats.finished(f, ok=res.error is None)
+        if res.error is None:
+            counts["ok"] += 1
+            cp.finish(f, True)
+            real = f"{actual[res.path] / sched.MB:.0f} MB" if actual.get(res.path) is not None else "n/d"
+            log.insert("end", f"✅ {f} (est {by_path[res.path].est_bytes / sched.MB:.0f} MB / real {real}; "
+                              f"leer {res.read_s:.1f}s, calcular {res.compute_s:.1f}s, escribir {res.write_s:.1f}s)\n")
+        else:
+            counts["fail"] += 1
+            cp.finish(f, False)
+            log.insert("end", f"❌ {f}: {res.error}\n")
+        log.see("end"); pb["value"] = first + counts["ok"] + counts["fail"]
+
+    def on_start(p):
+        cp.begin(by_path[p].key)
+        stats.started(by_path[p].key, sizes[p])
+
+    pipe = sched.budgeted_pipeline(jobs, compute)
+    try:
+        with rss:
+            pipe.run([j.path for j in jobs], on_start=on_start, on_done=on_done)
+    finally:
+        stats.finish_run()
+    log.insert("end", "\n" + pipe.stats_table() + "\n")
+    return counts["ok"], counts["fail"]
+
+def start_watch(log: tk.Text, inp: str, out: str, steps) -> "wf.FolderWatcher":
+    """Arranca la vigilancia de inp (carpeta caliente del escáner) volcando los eventos al log."""
+    def on_event(kind, path, info):
+        name = os.path.basename(path)
+        if kind == "done":
+            msg = f"✅ {name} ({info:.1f}s)"
+        elif kind == "fail":
+            msg = f"❌ {name}: {info}"
+        elif kind == "skip":
+            msg = f"⏭️  {name} (ya procesado)"
+        else:
+            msg = info
+        log.insert("end", msg + "\n"); log.see("end")
+    return wf.FolderWatcher(inp, out, steps, on_event=on_event).start()
+
+def report_profile(log: tk.Text, folder: str):
+    """Vuelca la tabla de etapas al log y exporta JSON + Chrome trace (si el perfilado está activo)."""
+    if not prof.is_enabled():
+        return
+    log.insert("end", "\n" + prof.summary_table() + "\n")
+    try:
+        json_path, trace_path = prof.export_all(folder)
+        log.insert("end", f"📊 Perfil: {json_path}\n📊 Trace (chrome://tracing): {trace_path}\n")
+    except OSError as e:
+        log.insert("end", f"⚠️  No se pudo exportar el perfil: {e}\n")
+    log.see("end")
+
 # ====== Pantalla 1: TIFF → JPEG ======
 class TiffToJpegFrame(ttk.Frame):
     def __init__(self, master):
@@ -40,9 +254,15 @@ class TiffToJpegFrame(ttk.Frame):
         self.out = tk.StringVar()
         self.max_long = tk.IntVar(value=getattr(tj, "MAX_LONG_EDGE", 2048))
         self.quality = tk.IntVar(value=getattr(tj, "JPEG_QUALITY", 90))
+        self.max_kb = tk.IntVar(value=0)
+        self.skip_dups = tk.BooleanVar(value=False)
+        self.resume = tk.BooleanVar(value=True)
         self.pb = None
+        self.stats_panel = None
         self.log = None
         self.btn = None
+        self.watch_btn = None
+        self.watcher = None
         self._build()
 
     def _build(self):
@@ -65,49 +285,96 @@ class TiffToJpegFrame(ttk.Frame):
         ttk.Label(self,text="Calidad JPEG (70–95):").grid(column=0,row=5,sticky="w",**pad)
         ttk.Entry(self,textvariable=self.quality,width=10).grid(column=1,row=5,sticky="w",**pad)
 
-        self.pb = ttk.Progressbar(self, mode="determinate")
-        self.pb.grid(column=0,row=6,columnspan=3,sticky="we",**pad)
+        ttk.Checkbutton(self,text="Saltar duplicados",variable=self.skip_dups).grid(column=2,row=4,sticky="w",**pad)
+
+        ttk.Checkbutton(self,text="Reanudar si se interrumpió",variable=self.resume).grid(column=2,row=5,sticky="w",**pad)
+
+        # con límite, la calidad de arriba es el máximo y se baja lo justo para caber
+        ttk.Label(self,text="Tamaño máx. (KB, 0 = sin límite):").grid(column=0,row=6,sticky="w",**pad)
+        ttk.Entry(self,textvariable=self.max_kb,width=10).grid(column=1,row=6,sticky="w",**pad)
+
+        self.pb, self.stats_panel = progress_area(self, row=7, columnspan=3, pad=pad)
 
         self.log = tk.Text(self, height=10)
-        self.log.grid(column=0,row=7,columnspan=3,sticky="nsew",**pad)
-        self.grid_rowconfigure(7, weight=1); self.grid_columnconfigure(1, weight=1)
+        self.log.grid(column=0,row=8,columnspan=3,sticky="nsew",**pad)
+        self.grid_rowconfigure(8, weight=1); self.grid_columnconfigure(1, weight=1)
 
+        self.watch_btn = ttk.Button(self,text="Vigilar carpeta",command=self.toggle_watch)
+        self.watch_btn.grid(column=1,row=9,sticky="e",**pad)
         self.btn = ttk.Button(self,text="Procesar",command=self.start)
-        self.btn.grid(column=2,row=8,sticky="e",**pad)
+        self.btn.grid(column=2,row=9,sticky="e",**pad)
 
-    def start(self):
+    def _folders(self):
         inp, out = self.inp.get().strip(), self.out.get().strip()
         if not inp or not os.path.isdir(inp):
-            messagebox.showerror("Error","Selecciona una carpeta TIFF válida."); return
+            messagebox.showerror("Error","Selecciona una carpeta TIFF válida."); return None
         if not out:
-            messagebox.showerror("Error","Selecciona carpeta de salida."); return
+            messagebox.showerror("Error","Selecciona carpeta de salida."); return None
         safe_makedirs(out)
+        tj.MAX_LONG_EDGE = int(self.max_long.get())
+        tj.JPEG_QUALITY  = int(self.quality.get())
+        tj.MAX_BYTES     = int(self.max_kb.get()) * 1024 or None
+        return inp, out
+
+    def toggle_watch(self):
+        if self.watcher and self.watcher.running:
+            self.watcher.stop(wait=False)
+            self.watch_btn.config(text="Vigilar carpeta"); self.btn.state(["!disabled"])
+            return
+        folders = self._folders()
+        if not folders:
+            return
+        self.log.delete("1.0","end")
+        self.btn.state(["disabled"])
+        try:
+            self.watcher = start_watch(self.log, *folders, "tiff")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            self.btn.state(["!disabled"])
+            return
+        self.watch_btn.config(text="Detener vigilancia")
+
+    def start(self):
+        folders = self._folders()
+        if not folders:
+            return
+        inp, out = folders
 
         files = list_images(inp, (".tif",".tiff"))
         if not files:
             messagebox.showinfo("Info","No hay TIFFs en la carpeta."); return
 
-        tj.MAX_LONG_EDGE = int(self.max_long.get())
-        tj.JPEG_QUALITY  = int(self.quality.get())
-
         self.pb["value"]=0; self.pb["maximum"]=len(files)
         self.log.delete("1.0","end")
         self.btn.state(["disabled"])
+        self.stats_panel.begin()
         threading.Thread(target=self._run,args=(inp,out,files),daemon=True).start()
 
     def _run(self, inp, out, files):
-        ok, fail = 0, 0
-        for i, f in enumerate(files, 1):
-            try:
-                tj.convert_tiff(os.path.join(inp, f), out)
-                ok += 1
-                self.log.insert("end", f"✅ {f}\n")
-            except Exception as e:
-                fail += 1
-                self.log.insert("end", f"❌ {f}: {e}\n")
-            self.log.see("end"); self.pb["value"]=i
-        self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
-        self.btn.state(["!disabled"])
+        prof.reset()
+        cp = None
+        try:
+            if self.skip_dups.get():
+                files = drop_duplicates(self.log, inp, files)
+                self.pb["maximum"] = len(files)
+            cp, todo = open_checkpoint(self.log, out, "tiff",
+                                       {"inp": inp, "max_long": tj.MAX_LONG_EDGE, "quality": tj.JPEG_QUALITY,
+                                        "max_bytes": tj.MAX_BYTES},
+                                       files, self.resume.get(),
+                                       validate=lambda f: ck.outputs_complete(tj.output_paths(os.path.join(inp, f), out)))
+            ok, fail = run_scheduled(self.log, self.pb, cp, "tiff", inp, out, todo, len(files) - len(todo),
+                                     self.stats_panel.stats)
+            close_checkpoint(self.log, cp)
+            self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
+            report_profile(self.log, out)
+        except Exception as e:
+            self.log.insert("end", f"\n❌ Error: {e}\n")
+            messagebox.showerror("Error", str(e))
+        finally:
+            if cp is not None:
+                cp.close()  # sin "end": el siguiente run lo retoma
+            self.stats_panel.stats.finish_run()
+            self.btn.state(["!disabled"])
 
 # ====== Pantalla 2: Split Half-Frames ======
 class SplitHalfFramesFrame(ttk.Frame):
@@ -118,9 +385,15 @@ class SplitHalfFramesFrame(ttk.Frame):
         self.threshold = tk.IntVar(value=getattr(sf, "THRESHOLD", 10))
         self.margin = tk.DoubleVar(value=getattr(sf, "MARGIN", 0.2))
         self.window = tk.IntVar(value=getattr(sf, "WINDOW", 20))
+        self.frames = tk.IntVar(value=getattr(sf, "FRAMES", 2))
+        self.skip_dups = tk.BooleanVar(value=False)
+        self.resume = tk.BooleanVar(value=True)
         self.pb = None
+        self.stats_panel = None
         self.log = None
         self.btn = None
+        self.watch_btn = None
+        self.watcher = None
         self._build()
 
     def _build(self):
@@ -146,50 +419,99 @@ class SplitHalfFramesFrame(ttk.Frame):
         ttk.Label(self,text="Window (px):").grid(column=0,row=6,sticky="w",**pad)
         ttk.Entry(self,textvariable=self.window,width=10).grid(column=1,row=6,sticky="w",**pad)
 
-        self.pb = ttk.Progressbar(self, mode="determinate")
-        self.pb.grid(column=0,row=7,columnspan=3,sticky="we",**pad)
+        ttk.Checkbutton(self,text="Saltar duplicados",variable=self.skip_dups).grid(column=2,row=4,sticky="w",**pad)
+
+        ttk.Checkbutton(self,text="Reanudar si se interrumpió",variable=self.resume).grid(column=2,row=5,sticky="w",**pad)
+
+        # 2 = medios fotogramas; 4–6 = tira de 35 mm entera (_A.._F)
+        frames_box = ttk.Frame(self)
+        frames_box.grid(column=2,row=6,sticky="w",**pad)
+        ttk.Label(frames_box,text="Fotogramas por escaneo:").pack(side="left")
+        ttk.Spinbox(frames_box,from_=2,to=12,textvariable=self.frames,width=4).pack(side="left",padx=(6,0))
+
+        self.pb, self.stats_panel = progress_area(self, row=7, columnspan=3, pad=pad)
 
         self.log = tk.Text(self, height=10)
         self.log.grid(column=0,row=8,columnspan=3,sticky="nsew",**pad)
         self.grid_rowconfigure(8, weight=1); self.grid_columnconfigure(1, weight=1)
 
+        self.watch_btn = ttk.Button(self,text="Vigilar carpeta",command=self.toggle_watch)
+        self.watch_btn.grid(column=1,row=9,sticky="e",**pad)
         self.btn = ttk.Button(self,text="Procesar",command=self.start)
         self.btn.grid(column=2,row=9,sticky="e",**pad)
 
-    def start(self):
+    def _folders(self):
         inp, out = self.inp.get().strip(), self.out.get().strip()
         if not inp or not os.path.isdir(inp):
-            messagebox.showerror("Error","Selecciona una carpeta de entrada válida."); return
+            messagebox.showerror("Error","Selecciona una carpeta de entrada válida."); return None
         if not out:
-            messagebox.showerror("Error","Selecciona carpeta de salida."); return
+            messagebox.showerror("Error","Selecciona carpeta de salida."); return None
         safe_makedirs(out)
+        sf.THRESHOLD = int(self.threshold.get())
+        sf.MARGIN    = float(self.margin.get())
+        sf.WINDOW    = int(self.window.get())
+        sf.FRAMES    = max(2, int(self.frames.get()))
+        return inp, out
+
+    def toggle_watch(self):
+        if self.watcher and self.watcher.running:
+            self.watcher.stop(wait=False)
+            self.watch_btn.config(text="Vigilar carpeta"); self.btn.state(["!disabled"])
+            return
+        folders = self._folders()
+        if not folders:
+            return
+        self.log.delete("1.0","end")
+        self.btn.state(["disabled"])
+        try:
+            self.watcher = start_watch(self.log, *folders, "split")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            self.btn.state(["!disabled"])
+            return
+        self.watch_btn.config(text="Detener vigilancia")
+
+    def start(self):
+        folders = self._folders()
+        if not folders:
+            return
+        inp, out = folders
 
         files = list_images(inp, (".jpg",".jpeg",".png",".tif",".tiff"))
         if not files:
             messagebox.showinfo("Info","No hay imágenes en la carpeta."); return
 
-        sf.THRESHOLD = int(self.threshold.get())
-        sf.MARGIN    = float(self.margin.get())
-        sf.WINDOW    = int(self.window.get())
-
         self.pb["value"]=0; self.pb["maximum"]=len(files)
         self.log.delete("1.0","end")
         self.btn.state(["disabled"])
+        self.stats_panel.begin()
         threading.Thread(target=self._run,args=(inp,out,files),daemon=True).start()
 
     def _run(self, inp, out, files):
-        ok, fail = 0, 0
-        for i, f in enumerate(files, 1):
-            try:
-                sf.split_half_frame(os.path.join(inp, f), out)
-                ok += 1
-                self.log.insert("end", f"✅ {f}\n")
-            except Exception as e:
-                fail += 1
-                self.log.insert("end", f"❌ {f}: {e}\n")
-            self.log.see("end"); self.pb["value"]=i
-        self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
-        self.btn.state(["!disabled"])
+        prof.reset()
+        cp = None
+        try:
+            if self.skip_dups.get():
+                files = drop_duplicates(self.log, inp, files)
+                self.pb["maximum"] = len(files)
+            cp, todo = open_checkpoint(self.log, out, "split",
+                                       {"inp": inp, "threshold": sf.THRESHOLD, "margin": sf.MARGIN, "window": sf.WINDOW,
+                                        "frames": sf.FRAMES},
+                                       files, self.resume.get(),
+                                       validate=lambda f: ck.outputs_complete(sf.output_paths(os.path.join(inp, f), out)))
+            ok, fail = run_scheduled(self.log, self.pb, cp, "split", inp, out, todo, len(files) - len(todo),
+                                     self.stats_panel.stats)
+            close_checkpoint(self.log, cp)
+            self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
+            report_profile(self.log, out)
+        except Exception as e:
+            self.log.insert("end", f"\n❌ Error: {e}\n")
+            messagebox.showerror("Error", str(e))
+        finally:
+            if cp is not None:
+                cp.close()  # sin "end": el siguiente run lo retoma
+            self.stats_panel.stats.finish_run()
+            self.btn.state(["!disabled"])
 
 # ====== Pantalla 3: Marcos 4:5 / 5:4 ======
 class FramesPicFrame(ttk.Frame):
@@ -201,7 +523,13 @@ class FramesPicFrame(ttk.Frame):
         self.min_border = tk.IntVar(value=getattr(fp, "MIN_BORDER", 50))
         self.corner_pct = tk.DoubleVar(value=getattr(fp, "CORNER_RADIUS_PCT", 0.02))
         self.upscale = tk.BooleanVar(value=getattr(fp, "UPSCALE_SMALLER", True))
+        self.max_kb = tk.IntVar(value=0)
+        self.all_renditions = tk.BooleanVar(value=False)
+        self.warn_similar = tk.BooleanVar(value=False)   # pasada extra de hashes: sólo si se pide
+        self.skip_dups = tk.BooleanVar(value=False)
+        self.resume = tk.BooleanVar(value=True)
         self.pb = None
+        self.stats_panel = None
         self.log = None
         self.btn = None
         self._build()
@@ -231,16 +559,25 @@ class FramesPicFrame(ttk.Frame):
 
         ttk.Checkbutton(self,text="Reescalar si es más pequeña (upscale)",variable=self.upscale)\
             .grid(column=0,row=7,columnspan=2,sticky="w",**pad)
+        ttk.Checkbutton(self,text="Todas las versiones (blog, ligero, 1080) en una pasada",variable=self.all_renditions)\
+            .grid(column=2,row=7,sticky="w",**pad)
+
+        ttk.Checkbutton(self,text="Saltar duplicados",variable=self.skip_dups).grid(column=2,row=4,sticky="w",**pad)
+        ttk.Checkbutton(self,text="Avisar casi-duplicados",variable=self.warn_similar).grid(column=2,row=5,sticky="w",**pad)
 
-        self.pb = ttk.Progressbar(self, mode="determinate")
-        self.pb.grid(column=0,row=8,columnspan=3,sticky="we",**pad)
+        ttk.Checkbutton(self,text="Reanudar si se interrumpió",variable=self.resume).grid(column=2,row=6,sticky="w",**pad)
+
+        ttk.Label(self,text="Tamaño máx. (KB, 0 = sin límite):").grid(column=0,row=8,sticky="w",**pad)
+        ttk.Entry(self,textvariable=self.max_kb,width=10).grid(column=1,row=8,sticky="w",**pad)
+
+        self.pb, self.stats_panel = progress_area(self, row=9, columnspan=3, pad=pad)
 
         self.log = tk.Text(self, height=10)
-        self.log.grid(column=0,row=9,columnspan=3,sticky="nsew",**pad)
-        self.grid_rowconfigure(9, weight=1); self.grid_columnconfigure(1, weight=1)
+        self.log.grid(column=0,row=10,columnspan=3,sticky="nsew",**pad)
+        self.grid_rowconfigure(10, weight=1); self.grid_columnconfigure(1, weight=1)
 
         self.btn = ttk.Button(self,text="Procesar",command=self.start)
-        self.btn.grid(column=2,row=10,sticky="e",**pad)
+        self.btn.grid(column=2,row=11,sticky="e",**pad)
 
     def start(self):
         inp, out = self.inp.get().strip(), self.out.get().strip()
@@ -258,28 +595,50 @@ class FramesPicFrame(ttk.Frame):
         fp.MIN_BORDER = int(self.min_border.get())
         fp.CORNER_RADIUS_PCT = float(self.corner_pct.get())
         fp.UPSCALE_SMALLER = bool(self.upscale.get())
+        fp.MAX_BYTES = int(self.max_kb.get()) * 1024 or None
 
         self.pb["value"]=0; self.pb["maximum"]=len(files)
         self.log.delete("1.0","end")
         self.btn.state(["disabled"])
+        self.stats_panel.begin()
         threading.Thread(target=self._run,args=(inp,out,files),daemon=True).start()
 
     def _run(self, inp, out, files):
-        ok, fail = 0, 0
-        for i, f in enumerate(files, 1):
-            try:
-                src = os.path.join(inp, f)
-                name, _ = os.path.splitext(f)
-                dst = os.path.join(out, f"{name}_blog.jpg")
-                fp.process_image(src, dst)
-                ok += 1
-                self.log.insert("end", f"✅ {f}\n")
-            except Exception as e:
-                fail += 1
-                self.log.insert("end", f"❌ {f}: {e}\n")
-            self.log.see("end"); self.pb["value"]=i
-        self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
-        self.btn.state(["!disabled"])
+        prof.reset()
+        cp = None
+        try:
+            if self.skip_dups.get():
+                files = drop_duplicates(self.log, inp, files)
+                self.pb["maximum"] = len(files)
+            if self.warn_similar.get():
+                self.log.insert("end", "🔎 Buscando casi-duplicados (mismo negativo, otra exposición/encuadre)…\n")
+                report = sim.similar_groups_by_folder(inp, paths=[os.path.join(inp, f) for f in files])
+                self.log.insert("end", (sim.format_report(report) if report else "Sin casi-duplicados.") + "\n\n")
+                self.log.see("end")
+            # con todas las versiones, una decodificación alimenta la pirámide de tamaños (renditions.py)
+            tool = "renditions" if self.all_renditions.get() else "frames"
+            if tool == "renditions":
+                validate = lambda f: ck.outputs_complete(rd.output_paths(f, out))
+            else:
+                validate = lambda f: ck.jpeg_complete(os.path.join(out, f"{os.path.splitext(f)[0]}_blog.jpg"))
+            cp, todo = open_checkpoint(self.log, out, tool,
+                                       {"inp": inp, "long_edge": fp.OUTPUT_LONG_SIDE, "min_border": fp.MIN_BORDER,
+                                        "corner_pct": fp.CORNER_RADIUS_PCT, "upscale": fp.UPSCALE_SMALLER,
+                                        "max_bytes": fp.MAX_BYTES},
+                                       files, self.resume.get(), validate=validate)
+            ok, fail = run_scheduled(self.log, self.pb, cp, tool, inp, out, todo, len(files) - len(todo),
+                                     self.stats_panel.stats)
+            close_checkpoint(self.log, cp)
+            self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
+            report_profile(self.log, out)
+        except Exception as e:
+            self.log.insert("end", f"\n❌ Error: {e}\n")
+            messagebox.showerror("Error", str(e))
+        finally:
+            if cp is not None:
+                cp.close()  # sin "end": el siguiente run lo retoma
+            self.stats_panel.stats.finish_run()
+            self.btn.state(["!disabled"])
 
 # ====== Pantalla 4: Cambiar fechas ======
 class FixDatesFrame(ttk.Frame):
@@ -288,7 +647,11 @@ class FixDatesFrame(ttk.Frame):
         self.inp = tk.StringVar()
         self.recursive = tk.BooleanVar(value=True)
         self.dry_run = tk.BooleanVar(value=True)   # por defecto en prueba
-        self.pb = None; self.log = None; self.btn = None
+        self.skip_dups = tk.BooleanVar(value=False)
+        self.xmp_sidecar = tk.BooleanVar(value=fd.XMP_SIDECAR_FOR_RAW)
+        self.resume = tk.BooleanVar(value=True)
+        self.plan_items = None   # último plan del dry-run (para exportar)
+        self.pb = None; self.stats_panel = None; self.log = None; self.btn = None; self.export_btn = None
         self._build()
 
     def _build(self):
@@ -303,16 +666,40 @@ class FixDatesFrame(ttk.Frame):
 
         ttk.Checkbutton(self,text="Recursivo (subcarpetas)",variable=self.recursive).grid(column=0,row=3,sticky="w",**pad)
         ttk.Checkbutton(self,text="Dry-run (no cambia nada)",variable=self.dry_run).grid(column=1,row=3,sticky="w",**pad)
+        ttk.Checkbutton(self,text="Saltar duplicados",variable=self.skip_dups).grid(column=2,row=3,sticky="w",**pad)
 
-        self.pb = ttk.Progressbar(self, mode="determinate")
-        self.pb.grid(column=0,row=4,columnspan=3,sticky="we",**pad)
+        self.pb, self.stats_panel = progress_area(self, row=4, columnspan=3, pad=pad)
 
         self.log = tk.Text(self, height=12)
         self.log.grid(column=0,row=5,columnspan=3,sticky="nsew",**pad)
         self.grid_rowconfigure(5, weight=1); self.grid_columnconfigure(1, weight=1)
 
+        ttk.Checkbutton(self,text="RAW: fechas en sidecar .xmp (no reescribir originales)",variable=self.xmp_sidecar)\
+            .grid(column=0,row=6,columnspan=2,sticky="w",**pad)
+        ttk.Checkbutton(self,text="Reanudar si se interrumpió",variable=self.resume).grid(column=0,row=7,sticky="w",**pad)
+
         self.btn = ttk.Button(self,text="Ejecutar",command=self.start)
         self.btn.grid(column=2,row=6,sticky="e",**pad)
+        self.export_btn = ttk.Button(self,text="Exportar plan…",command=self.export_plan)
+        self.export_btn.grid(column=2,row=7,sticky="e",**pad)
+        self.export_btn.state(["disabled"])
+
+    def export_plan(self):
+        if not self.plan_items:
+            return
+        path = filedialog.asksaveasfilename(title="Exportar plan", defaultextension=".csv",
+                                            initialdir=self.inp.get().strip() or _last_dir,
+                                            initialfile="fix_dates_plan.csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            if path.lower().endswith(".json"):
+                fd.save_plan(self.inp.get().strip(), self.plan_items, {}, path=path)
+            else:
+                fd.export_plan_csv(path, self.plan_items)
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudo exportar el plan: {e}")
 
     def start(self):
         folder = self.inp.get().strip()
@@ -321,34 +708,88 @@ class FixDatesFrame(ttk.Frame):
         if not fd.has_exiftool():
             messagebox.showerror("Error","ExifTool no encontrado. Instálalo con: brew install exiftool"); return
 
-        # Conteo para barra
-        total = sum(1 for _ in fd.iter_files(folder, recursive=self.recursive.get()))
-        if total == 0:
-            messagebox.showinfo("Info","No se encontraron imágenes soportadas."); return
-
-        self.pb["value"]=0; self.pb["maximum"]=total
+        self.pb["value"]=0
         self.log.delete("1.0","end")
         self.btn.state(["disabled"])
-        threading.Thread(target=self._run,args=(folder,total),daemon=True).start()
+        self.export_btn.state(["disabled"])
+        self.stats_panel.begin()
+        threading.Thread(target=self._run,args=(folder,),daemon=True).start()
 
-    def _run(self, folder, total):
-        ok = fail = i = 0
+    def _run(self, folder):
+        prof.reset()
+        ok = fail = 0
         recursive = self.recursive.get()
         dry_run = self.dry_run.get()
+        xmp_sidecar = self.xmp_sidecar.get()
+        stats = self.stats_panel.stats
         try:
-            for path in fd.iter_files(folder, recursive=recursive):
-                success, msg = fd.set_file_times_from_best(path, dry_run=dry_run)
+            # Un único recorrido: el conteo de la barra y el procesamiento salen de la misma lista
+            self.log.insert("end", "🔎 Escaneando carpeta…\n")
+            entries = discovery.scan_media(folder, recursive=recursive, exts=fd.EXTS)
+            if not entries:
+                self.log.insert("end", "No se encontraron imágenes soportadas.\n")
+                return
+            self.log.insert("end", f"{len(entries)} archivos encontrados.\n\n")
+            if self.skip_dups.get():
+                idx = dd.update_index(folder, recursive=recursive, entries=entries)
+                before = len(entries)
+                entries = [e for e in entries if not idx.is_duplicate(e.path)]
+                if before != len(entries):
+                    self.log.insert("end", f"🧹 {before - len(entries)} duplicado(s) saltado(s)\n\n")
+            self.pb["maximum"] = len(entries)
+
+            by_rel = {os.path.relpath(e.path, folder): e for e in entries}
+            settings = {"recursive": recursive, "xmp_sidecar": xmp_sidecar}
+            # el dry-run deja un plan; el run real lo aplica sin volver a leer metadatos
+            prev = None if dry_run else fd.load_plan(folder)
+            planned = prev["items"] if prev else {}
+            if prev:
+                self.log.insert("end", f"📋 Aplicando el plan del dry-run ({prev['created']}, "
+                                       f"{len(planned)} archivos)\n\n")
+            if dry_run:
+                cp, todo = ck.NullCheckpoint(), list(by_rel)
+            else:
+                cp, todo = open_checkpoint(self.log, folder, "fixdates", settings,
+                                           list(by_rel), self.resume.get())
+            items, reread = [], 0
+            stats.total, stats.total_bytes = len(todo), sum(by_rel[rel].size for rel in todo)
+            for i, rel in enumerate(todo, len(by_rel) - len(todo) + 1):
+                entry = by_rel[rel]
+                cp.begin(rel)
+                stats.started(rel, entry.size)
+                item, fresh = fd.replan(planned.get(entry.path), entry.path, entry.stat, xmp_sidecar)
+                reread += fresh and bool(prev)
+                if dry_run:
+                    items.append(item)
+                    success, msg = fd.describe(item)
+                else:
+                    success, msg = fd.apply_item(item, entry.stat)
+                cp.finish(rel, success)
+                stats.finished(rel, success)
                 self.log.insert("end", msg + "\n"); self.log.see("end")
-                i += 1; self.pb["value"] = i
+                self.pb["value"] = i
                 if success: ok += 1
                 else: fail += 1
+            close_checkpoint(self.log, cp)
             self.log.insert("end", f"\nHecho. OK: {ok}, Fallos: {fail}\n")
             if dry_run:
                 self.log.insert("end", "Dry-run activado: no se modificó ningún archivo.\n")
+                self.plan_items = items
+                try:
+                    fd.save_plan(folder, items, settings)
+                    self.log.insert("end", "📋 Plan guardado: al desmarcar Dry-run se aplica sin releer metadatos.\n")
+                except OSError as e:
+                    self.log.insert("end", f"⚠️  No se pudo guardar el plan ({e})\n")
+                self.export_btn.state(["!disabled"])
+            elif prev:
+                self.log.insert("end", f"📋 {len(todo) - reread} desde el plan, {reread} releído(s) por cambios\n")
+                fd.discard_plan(folder)
+            report_profile(self.log, folder)
         except Exception as e:
             self.log.insert("end", f"\n❌ Error: {e}\n")
             messagebox.showerror("Error", str(e))
         finally:
+            stats.finish_run()
             self.btn.state(["!disabled"])
 
 # ====== Pantalla 5: Cambiar nombres ======
@@ -362,7 +803,8 @@ class RenameFilesFrame(ttk.Frame):
         self.camera = tk.StringVar()
         self.film = tk.StringVar()
         self.dry_run = tk.BooleanVar(value=True)     # safer default
-        self.pb = None; self.log = None; self.btn = None
+        self.resume = tk.BooleanVar(value=True)
+        self.pb = None; self.stats_panel = None; self.log = None; self.btn = None
         self._build()
 
     def _build(self):
@@ -391,9 +833,9 @@ class RenameFilesFrame(ttk.Frame):
         ttk.Entry(self,textvariable=self.film,width=24).grid(column=1,row=6,sticky="w",**pad)
 
         ttk.Checkbutton(self,text="Dry-run (preview only)",variable=self.dry_run).grid(column=0,row=7,sticky="w",**pad)
+        ttk.Checkbutton(self,text="Resume if interrupted",variable=self.resume).grid(column=1,row=7,sticky="w",**pad)
 
-        self.pb = ttk.Progressbar(self, mode="determinate")
-        self.pb.grid(column=0,row=8,columnspan=4,sticky="we",**pad)
+        self.pb, self.stats_panel = progress_area(self, row=8, columnspan=4, pad=pad)
 
         self.log = tk.Text(self, height=12)
         self.log.grid(column=0,row=9,columnspan=4,sticky="nsew",**pad)
@@ -411,33 +853,80 @@ class RenameFilesFrame(ttk.Frame):
         except ValueError as e:
             messagebox.showerror("Error", str(e)); return
 
-        files = rn.list_media(folder, recursive=self.recursive.get(), exts=rn.EXTS)
-        if not files:
-            messagebox.showinfo("Info","No supported media found."); return
-
-        plan = rn.plan_new_names(files, prefix)
+        # A half-applied rename must resume from its saved plan: re-planning would see the new names
+        settings = {"prefix": prefix, "recursive": self.recursive.get()}
+        cp = None
+        if self.resume.get() and not self.dry_run.get():
+            cp = ck.Checkpoint.resume(folder, "rename", settings)
+        prof.reset()
+        if cp and cp.data:
+            plan = [tuple(p) for p in cp.data]
+        else:
+            cp = None
+            files = rn.list_media(folder, recursive=self.recursive.get(), exts=rn.EXTS)
+            if not files:
+                messagebox.showinfo("Info","No supported media found."); return
+            files, how = rn.sort_for_rename(files)
+            plan = rn.plan_new_names(files, prefix, presorted=True)
         self.pb["value"]=0; self.pb["maximum"]=len(plan)
         self.log.delete("1.0","end")
+        if cp is None:
+            self.log.insert("end", "🔢 Order: file-name counters (no metadata read)\n\n" if how == "filename"
+                            else "🗓️ Order: capture date (metadata)\n\n")
         self.btn.state(["disabled"])
+        self.stats_panel.begin()
 
         # Run in thread
         import threading
-        threading.Thread(target=self._run,args=(folder, plan),daemon=True).start()
-
-    def _run(self, folder, plan):
-        ok = skipped = i = 0
-        for src, dst in plan:
-            # apply one by one to keep progress smooth
-            _ok, _sk, msgs = rn.apply_plan(os.path.dirname(src), [(src, dst)], dry_run=self.dry_run.get())
-            ok += _ok; skipped += _sk
-            self.log.insert("end", msgs[0] + "\n")
-            self.log.see("end")
-            i += 1; self.pb["value"]=i
+        threading.Thread(target=self._run,args=(folder, plan, settings, cp),daemon=True).start()
 
-        self.log.insert("end", f"\nDone. Renamed: {ok}, Skipped: {skipped}\n")
-        if self.dry_run.get():
-            self.log.insert("end", "Dry-run was ON — no files were changed.\n")
-        self.btn.state(["!disabled"])
+    def _run(self, folder, plan, settings, cp=None):
+        ok = skipped = 0
+        dry_run = self.dry_run.get()
+        stats = self.stats_panel.stats
+        by_src = {src: dst for src, dst in plan}
+        try:
+            if dry_run:
+                cp, todo = ck.NullCheckpoint(), list(by_src)
+            else:
+                if cp is None:
+                    try:
+                        cp = ck.Checkpoint.create(folder, "rename", settings, data=plan)
+                    except OSError as e:
+                        self.log.insert("end", f"⚠️  No checkpoint ({e})\n")
+                        cp = ck.NullCheckpoint()
+                # in-flight rename: done if the target exists and the source is gone
+                todo = cp.pending(list(by_src), validate=lambda src: not os.path.exists(src) and
+                                  os.path.exists(os.path.join(os.path.dirname(src), by_src[src])))
+                if cp.resumed:
+                    self.log.insert("end", f"⏯️  Resuming: {len(by_src) - len(todo)} done, {len(todo)} left\n\n")
+            stats.total = len(todo)
+            for i, src in enumerate(todo, len(by_src) - len(todo) + 1):
+                dst = by_src[src]
+                cp.begin(src)
+                stats.started(os.path.basename(src))
+                # apply one by one to keep progress smooth
+                _ok, _sk, msgs = rn.apply_plan(os.path.dirname(src), [(src, dst)], dry_run=dry_run)
+                cp.finish(src, bool(_ok) or dry_run)
+                stats.finished(os.path.basename(src), bool(_ok) or dry_run)
+                ok += _ok; skipped += _sk
+                self.log.insert("end", msgs[0] + "\n")
+                self.log.see("end")
+                self.pb["value"]=i
+            close_checkpoint(self.log, cp)
+
+            self.log.insert("end", f"\nDone. Renamed: {ok}, Skipped: {skipped}\n")
+            if self.dry_run.get():
+                self.log.insert("end", "Dry-run was ON — no files were changed.\n")
+            report_profile(self.log, folder)
+        except Exception as e:
+            self.log.insert("end", f"\n❌ Error: {e}\n")
+            messagebox.showerror("Error", str(e))
+        finally:
+            if cp is not None:
+                cp.close()  # no "end": the next run picks it up
+            stats.finish_run()
+            self.btn.state(["!disabled"])
 
 
 # ====== App principal (menú simple) ======
@@ -456,19 +945,25 @@ class MainApp(tk.Tk):
         tools.add_command(label="Fix Dates (EXIF → File)", command=lambda: self.show("fixdates"))
         tools.add_command(label="Rename (YYYYMM-Tag-Camera-Film)", command=lambda: self.show("rename"))
         menubar.add_cascade(label="Herramientas", menu=tools)
+
+        self.profile_var = tk.BooleanVar(value=prof.is_enabled())
+        options = tk.Menu(menubar, tearoff=0)
+        options.add_checkbutton(label="Perfilado por etapas (tiempos)", variable=self.profile_var,
+                                command=lambda: prof.enable(self.profile_var.get()))
+        menubar.add_cascade(label="Opciones", menu=options)
         menubar.add_command(label="Salir", command=self.destroy)
 
         self.container = ttk.Frame(self); self.container.pack(fill="both", expand=True)
 
-        self.views = {
-            "tiff":   TiffToJpegFrame(self.container),
-            "split":  SplitHalfFramesFrame(self.container),
-            "frames": FramesPicFrame(self.container),
-            "fixdates": FixDatesFrame(self.container),
-            "rename": RenameFilesFrame(self.container),
+        # cada pantalla se construye (e importa su herramienta) la primera vez que se abre
+        self.view_classes = {
+            "tiff":   TiffToJpegFrame,
+            "split":  SplitHalfFramesFrame,
+            "frames": FramesPicFrame,
+            "fixdates": FixDatesFrame,
+            "rename": RenameFilesFrame,
         }
-        for v in self.views.values():
-            v.place(relx=0, rely=0, relwidth=1, relheight=1)
+        self.views = {}
 
         # Splash minimal
         self.splash = ttk.Frame(self.container)
@@ -481,6 +976,12 @@ class MainApp(tk.Tk):
             self.splash.place_forget()
         for v in self.views.values():
             v.place_forget()
+        if key not in self.views:
+            self.config(cursor="watch"); self.update_idletasks()
+            try:
+                self.views[key] = self.view_classes[key](self.container)
+            finally:
+                self.config(cursor="")
         self.views[key].place(relx=0, rely=0, relwidth=1, relheight=1)
         self.views[key].lift()
 
@@ -0,0 +1,174 @@
+# jpeg_size.py
+"""
+JPEG con un tamaño máximo de archivo.
+
+Instagram y el CMS de la web limitan el peso de cada subida. Buscar a ciegas
+la calidad que cabe (búsqueda binaria) son 6–7 codificaciones a tamaño
+completo por imagen. Aquí:
+
+  1. se codifica una muestra pequeña de la imagen a unas pocas calidades
+     (PROXY_QUALITIES): cuesta milisegundos y da la forma de la curva
+     tamaño/calidad de esta imagen. La muestra es un mosaico de teselas
+     tomadas a resolución completa, no la imagen reducida: reducir promedia
+     el grano y el detalle, y la miniatura pesa por píxel otra cosa que el
+     original (y distinta según la calidad);
+  2. la curva se escala a los píxeles reales (factor 1) y se elige la
+     calidad más alta que cabe;
+  3. la primera codificación completa corrige el factor para esta imagen y,
+     si no acertó, la segunda suele ser la buena; luego pasos de 1 hasta
+     MAX_ENCODES. Cuando la calidad elegida cabe, siempre se prueba la
+     siguiente (si el límite de codificaciones lo permite): sólo así se sabe
+     que es la más alta.
+
+Normalmente salen unas 2 codificaciones completas. La calidad nunca pasa de la
+configurada en la herramienta (q_max): el límite sólo la baja. La búsqueda sólo
+depende de la imagen (su muestra y sus propias codificaciones), no de las que
+se procesaron antes: la misma entrada da los mismos bytes en un run
+secuencial, en shm_images o en cada worker de distributed.
+
+    python jpeg_size.py scans/ 1500      # calidad elegida y codificaciones por imagen con 1500 KB
+"""
+import sys
+import math
+import argparse
+from typing import Dict, NamedTuple, Optional
+
+from PIL import Image
+
+import profiling as prof
+import pipeline
+
+MIN_QUALITY      = 40                        # por debajo no se baja aunque no quepa
+PROXY_TILE       = 64                        # px por tesela (múltiplo de 16: bloques JPEG enteros)
+PROXY_TILES      = 8                         # mosaico de 8×8 teselas → muestra de 512×512
+PROXY_QUALITIES  = (40, 55, 70, 80, 88, 95)
+MAX_ENCODES      = 4                         # codificaciones a tamaño completo por imagen, como mucho
+
+
+class SizedJpeg(NamedTuple):
+    data: bytes
+    quality: int
+    encodes: int             # codificaciones a tamaño completo
+    fits: bool               # False: ni a q_min cabe (data es la de q_min)
+
+
+def sample_mosaic(img, tile=PROXY_TILE, tiles=PROXY_TILES):
+    """Teselas repartidas por toda la imagen, a resolución completa y alineadas a bloques de 16 px."""
+    w, h = img.size
+    if w < tile * tiles or h < tile * tiles:
+        return img
+    out = Image.new(img.mode, (tile * tiles, tile * tiles))
+    for j in range(tiles):
+        y = (h - tile) * j // (tiles - 1) // 16 * 16
+        for i in range(tiles):
+            x = (w - tile) * i // (tiles - 1) // 16 * 16
+            out.paste(img.crop((x, y, x + tile, y + tile)), (i * tile, j * tile))
+    return out
+
+
+def proxy_curve(img, qualities=PROXY_QUALITIES, **save_kw) -> Dict[int, float]:
+    """{calidad: bytes por píxel} de la muestra de img (sin la cabecera, que no escala con los píxeles)."""
+    proxy = sample_mosaic(img)
+    pixels = proxy.width * proxy.height
+    tiny = proxy.crop((0, 0, 16, 16))
+    curve = {}
+    for q in qualities:
+        header = len(pipeline.encode_jpeg(tiny, quality=q, **save_kw))
+        curve[q] = max(1, len(pipeline.encode_jpeg(proxy, quality=q, **save_kw)) - header) / pixels
+    return curve
+
+
+def _bpp(curve: Dict[int, float], q: int) -> float:
+    """Bytes por píxel a la calidad q: interpolación log-lineal entre los puntos medidos."""
+    qs = sorted(curve)
+    i = 1
+    while i < len(qs) - 1 and qs[i] < q:
+        i += 1
+    a, b = qs[i - 1], qs[i]
+    la, lb = math.log(curve[a]), math.log(curve[b])
+    return math.exp(la + (lb - la) * (q - a) / (b - a))
+
+
+def _ratio_at(ratios: Dict[int, float], q: int) -> float:
+    """Factor miniatura → real en q: lineal entre las calidades ya codificadas, el más cercano fuera de ellas."""
+    below = [k for k in ratios if k <= q]
+    above = [k for k in ratios if k >= q]
+    if not below or not above:
+        return ratios[min(ratios, key=lambda k: abs(k - q))]
+    a, b = max(below), min(above)
+    if a == b:
+        return ratios[a]
+    return ratios[a] + (ratios[b] - ratios[a]) * (q - a) / (b - a)
+
+
+def predict_quality(curve, pixels, max_bytes, ratios: Dict[int, float], q_min, q_max) -> int:
+    """La calidad más alta entre q_min y q_max cuyo tamaño previsto cabe en max_bytes."""
+    for q in range(q_max, q_min - 1, -1):
+        if _bpp(curve, q) * pixels * _ratio_at(ratios, q) <= max_bytes:
+            return q
+    return q_min
+
+
+def encode_max_bytes(img, max_bytes: int, q_max: int = 95, q_min: Optional[int] = None, **save_kw) -> SizedJpeg:
+    """JPEG de img a la calidad más alta ≤ q_max que no pasa de max_bytes."""
+    q_min = min(q_min or MIN_QUALITY, q_max)
+    pixels = img.width * img.height
+    with prof.stage("size_probe"):
+        curve = proxy_curve(img, **save_kw)
+
+    measured: Dict[int, float] = {}  # calidad → factor real de esta imagen
+    fit_q = fail_q = None            # calidad más alta que cabe / más baja que no cabe
+    fit_data = last_data = None
+    encodes = 0
+    q = predict_quality(curve, pixels, max_bytes, {q_max: 1.0}, q_min, q_max)
+    while True:
+        last_data = pipeline.encode_jpeg(img, quality=q, **save_kw)
+        encodes += 1
+        measured[q] = len(last_data) / (_bpp(curve, q) * pixels)
+        if len(last_data) <= max_bytes:
+            fit_q, fit_data = q, last_data
+        else:
+            fail_q = q
+        lo = fit_q + 1 if fit_q is not None else q_min
+        hi = fail_q - 1 if fail_q is not None else q_max
+        if lo > hi or encodes >= MAX_ENCODES:
+            break
+        nxt = predict_quality(curve, pixels, max_bytes, measured, q_min, q_max)
+        if fit_q is not None and nxt <= fit_q:
+            nxt = fit_q + 1  # la curva no promete más: se confirma que un paso arriba ya no cabe
+        q = min(max(nxt, lo), hi)
+
+    if fit_data is not None:
+        return SizedJpeg(fit_data, fit_q, encodes, True)
+    if fail_q != q_min:  # se acabaron los intentos sin llegar a q_min: el último recurso
+        last_data = pipeline.encode_jpeg(img, quality=q_min, **save_kw)
+        encodes += 1
+    return SizedJpeg(last_data, q_min, encodes, len(last_data) <= max_bytes)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Calidad JPEG más alta que cabe en un tamaño máximo, por imagen")
+    ap.add_argument("folder")
+    ap.add_argument("max_kb", type=int)
+    ap.add_argument("--quality", type=int, default=95, help="calidad máxima")
+    ap.add_argument("--long-edge", type=int, default=None, help="reducir antes (px), como tiff_to_jpeg")
+    args = ap.parse_args()
+    import discovery
+    total = n = 0
+    for e in discovery.scan_media(args.folder, recursive=False, exts=(".jpg", ".jpeg", ".png", ".tif", ".tiff")):
+        img = Image.open(e.path).convert("RGB")
+        if args.long_edge:
+            import tiff_to_jpeg as tj
+            img = tj.resize_to_long_edge(img, args.long_edge)
+        res = encode_max_bytes(img, args.max_kb * 1024, q_max=args.quality)
+        total += res.encodes
+        n += 1
+        print(f"{'✅' if res.fits else '⚠️ '} {e.name}: calidad {res.quality}, {len(res.data) / 1024:.0f} KB, "
+              f"{res.encodes} codificación(es)")
+    if n:
+        print(f"\n📊 {total / n:.2f} codificaciones por imagen")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+# pipeline.py
+"""
+Pipeline por etapas lectura → cálculo → escritura con colas acotadas.
+
+En carpetas del NAS el bucle por archivo (leer, decodificar, calcular,
+codificar, escribir) deja la CPU parada mientras se lee y el disco parado
+mientras corre LANCZOS o el encoder JPEG. Aquí:
+
+  - hilos de E/S leen por adelantado los K archivos siguientes a memoria
+    (cota por número, READ_AHEAD, y por bytes, READ_AHEAD_MB);
+  - los workers de cálculo decodifican desde memoria, procesan y codifican
+    a bytes (opcionalmente con un presupuesto de RAM por archivo, ver scheduler);
+  - hilos escritores vuelcan las salidas a disco.
+
+Las colas son acotadas, así que una etapa lenta frena a las anteriores en
+vez de acumular memoria. Al final, stats_table() dice cuánto tiempo estuvo
+ocupada cada etapa (si "read" está al 100% y "compute" al 30%, manda el NAS).
+
+Las herramientas exponen render_*(src, …) → [Output] (src puede ser ruta o
+archivo en memoria) y sus funciones de siempre escriben con write_outputs().
+"""
+import io
+import os
+import time
+import queue
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import profiling as prof
+
+IO_THREADS      = 2          # lecturas simultáneas (más ayuda en NAS con latencia alta)
+READ_AHEAD      = 4          # archivos leídos esperando CPU
+READ_AHEAD_MB   = 1024       # y como mucho estos MB en memoria
+WORKERS         = None       # hilos de cálculo; None = os.cpu_count()
+WRITE_THREADS   = 2
+WRITE_QUEUE     = 8          # resultados codificados esperando disco
+
+MB = 1024 * 1024
+_END = object()
+
+
+class Output(NamedTuple):
+    path: str
+    data: bytes
+    size: Optional[Tuple[int, int]] = None   # dimensiones de la imagen, sólo para el log
+
+
+def encode_jpeg(img, **save_kw) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", **save_kw)
+    return buf.getvalue()
+
+
+def write_outputs(outputs: Sequence[Output], src_path: Optional[str] = None, atomic: bool = False):
+    """atomic: escribe a un .part y lo renombra (nadie ve nunca un JPEG a medias, aunque dos procesos escriban el mismo)."""
+    for o in outputs:
+        with prof.stage("write", src_path or o.path) as st:
+            tmp = f"{o.path}.part-{os.getpid()}-{threading.get_ident()}" if atomic else o.path
+            with open(tmp, "wb") as f:
+                f.write(o.data)
+            if atomic:
+                os.replace(tmp, o.path)
+            st.add_bytes(len(o.data))
+
+
+class ByteBudget:
+    """Semáforo por bytes. Un elemento mayor que el total pasa solo cuando no hay nada más."""
+
+    def __init__(self, capacity: Optional[int]):
+        self.capacity = capacity
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int):
+        if not self.capacity:
+            return
+        with self._cond:
+            while self.used and self.used + n > self.capacity:
+                self._cond.wait()
+            self.used += n
+
+    def release(self, n: int):
+        if not self.capacity:
+            return
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+
+class StageStats:
+    def __init__(self, name: str, threads: int):
+        self.name = name
+        self.threads = threads
+        self.busy_s = 0.0
+        self.items = 0
+        self.nbytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, nbytes: int = 0):
+        with self._lock:
+            self.busy_s += seconds
+            self.items += 1
+            self.nbytes += nbytes
+
+    def utilization(self, wall_s: float) -> float:
+        return self.busy_s / (wall_s * self.threads) if wall_s > 0 else 0.0
+
+
+class PipelineResult(NamedTuple):
+    path: str
+    error: Optional[BaseException]
+    outputs: List[Output]
+    read_s: float
+    compute_s: float
+    write_s: float
+
+
+class Pipeline:
+    """
+    compute(path, buf) → [Output] se ejecuta en los workers con buf = BytesIO
+    del archivo ya leído. cost(path) → bytes (opcional) limita cuántos cálculos
+    caben a la vez en budget_bytes.
+    """
+
+    def __init__(self, compute: Callable[[str, io.BytesIO], List[Output]],
+                 io_threads: int = IO_THREADS, workers: Optional[int] = None,
+                 writers: int = WRITE_THREADS, read_ahead: int = READ_AHEAD,
+                 read_ahead_mb: Optional[int] = READ_AHEAD_MB, write_queue: int = WRITE_QUEUE,
+                 cost: Optional[Callable[[str], int]] = None, budget_bytes: Optional[int] = None):
+        self.compute = compute
+        self.io_threads = max(1, io_threads)
+        self.workers = max(1, workers or WORKERS or os.cpu_count() or 1)
+        self.writers = max(1, writers)
+        self.read_ahead = max(1, read_ahead)
+        self.read_ahead_bytes = read_ahead_mb * MB if read_ahead_mb else None
+        self.write_queue = max(1, write_queue)
+        self.cost = cost
+        self.budget_bytes = budget_bytes
+        self.stats: Dict[str, StageStats] = {}
+        self.wall_s = 0.0
+
+    def run(self, paths: Sequence[str], on_start: Optional[Callable[[str], None]] = None,
+            on_done: Optional[Callable[[PipelineResult], None]] = None) -> List[PipelineResult]:
+        """
+        Procesa paths (en ese orden de lectura). on_start/on_done se llaman desde
+        el hilo que llama a run(), así que pueden tocar checkpoints y logs sin locks.
+        """
+        paths = list(paths)
+        self.stats = {"read": StageStats("read", self.io_threads),
+                      "compute": StageStats("compute", self.workers),
+                      "write": StageStats("write", self.writers)}
+        read_q: "queue.Queue" = queue.Queue(maxsize=self.read_ahead)
+        write_q: "queue.Queue" = queue.Queue(maxsize=self.write_queue)
+        events: "queue.Queue" = queue.Queue()
+        read_budget = ByteBudget(self.read_ahead_bytes)
+        mem_budget = ByteBudget(self.budget_bytes if self.cost else None)
+        source = iter(paths)
+        lock = threading.Lock()
+        alive = {"read": self.io_threads, "compute": self.workers}
+        stop = threading.Event()  # un callback falló: vaciar las colas sin procesar nada más
+
+        def stage_exit(stage, q, n_next):
+            # el último hilo de una etapa avisa a la siguiente
+            with lock:
+                alive[stage] -= 1
+                last = alive[stage] == 0
+            if last:
+                for _ in range(n_next):
+                    q.put(_END)
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    with lock:
+                        p = next(source, None)
+                    if p is None:
+                        return
+                    try:
+                        size = os.path.getsize(p)
+                    except OSError as e:
+                        read_q.put((p, None, 0, e, 0.0))
+                        continue
+                    read_budget.acquire(size)
+                    t0 = time.perf_counter()
+                    try:
+                        with open(p, "rb") as f:
+                            data, err = f.read(), None
+                    except OSError as e:
+                        data, err = None, e
+                    dt = time.perf_counter() - t0
+                    self.stats["read"].add(dt, size if data is not None else 0)
+                    read_q.put((p, data, size, err, dt))
+            finally:
+                stage_exit("read", read_q, self.workers)
+
+        def worker():
+            try:
+                while True:
+                    item = read_q.get()
+                    if item is _END:
+                        return
+                    p, data, size, err, read_s = item
+                    if stop.is_set():
+                        read_budget.release(size)
+                        continue
+                    if err is not None:
+                        read_budget.release(size)
+                        events.put(("done", PipelineResult(p, err, [], read_s, 0.0, 0.0)))
+                        continue
+                    cost = self.cost(p) if self.cost else 0
+                    mem_budget.acquire(cost)
+                    events.put(("start", p))
+                    t0 = time.perf_counter()
+                    try:
+                        outs, err = self.compute(p, io.BytesIO(data)), None
+                    except Exception as e:
+                        outs, err = [], e
+                    finally:
+                        del data
+                        read_budget.release(size)
+                        mem_budget.release(cost)
+                    dt = time.perf_counter() - t0
+                    self.stats["compute"].add(dt, size)
+                    if err is not None:
+                        events.put(("done", PipelineResult(p, err, [], read_s, dt, 0.0)))
+                    else:
+                        write_q.put((p, outs, read_s, dt))
+            finally:
+                stage_exit("compute", write_q, self.writers)
+
+        def writer():
+            while True:
+                item = write_q.get()
+                if item is _END:
+                    return
+                if stop.is_set():
+                    continue
+                p, outs, read_s, compute_s = item
+                t0 = time.perf_counter()
+                try:
+                    write_outputs(outs, p)
+                    err = None
+                except Exception as e:
+                    err = e
+                dt = time.perf_counter() - t0
+                self.stats["write"].add(dt, sum(len(o.data) for o in outs))
+                events.put(("done", PipelineResult(p, err, outs, read_s, compute_s, dt)))
+
+        threads = ([threading.Thread(target=reader, name=f"pipe-read-{i}", daemon=True) for i in range(self.io_threads)]
+                   + [threading.Thread(target=worker, name=f"pipe-cpu-{i}", daemon=True) for i in range(self.workers)]
+                   + [threading.Thread(target=writer, name=f"pipe-write-{i}", daemon=True) for i in range(self.writers)])
+        t_start = time.perf_counter()
+        for t in threads:
+            t.start()
+        results: List[PipelineResult] = []
+        try:
+            while len(results) < len(paths):
+                kind, payload = events.get()
+                if kind == "start":
+                    if on_start:
+                        on_start(payload)
+                else:
+                    results.append(payload)
+                    if on_done:
+                        on_done(payload)
+        except BaseException:
+            # los hilos no se quedan colgados en una cola llena: terminan lo que
+            # tienen entre manos, descartan el resto y salen con _END
+            stop.set()
+            raise
+        finally:
+            for t in threads:
+                t.join()
+        self.wall_s = time.perf_counter() - t_start
+        return results
+
+    def stats_table(self) -> str:
+        lines = [f"{'etapa':<10} {'hilos':>5} {'ocupado s':>10} {'uso':>6} {'items':>6} {'MB/s':>8}"]
+        for s in self.stats.values():
+            mbps = s.nbytes / MB / s.busy_s if s.busy_s > 0 else 0.0
+            lines.append(f"{s.name:<10} {s.threads:5d} {s.busy_s:10.2f} {s.utilization(self.wall_s):6.0%} "
+                         f"{s.items:6d} {mbps:8.1f}")
+        lines.append(f"Total: {self.wall_s:.2f}s de reloj")
+        return "\n".join(lines)
+
+
+def renderer(tool: str, out_dir: str, prior=None) -> Callable[[str, io.BytesIO], List[Output]]:
+    """
+    compute() para Pipeline a partir del nombre de herramienta ("tiff", "split", "frames", "renditions").
+    prior: RollPrior del lote para "split" (split_half_frames.batch_prior), o None.
+    """
+    if tool == "tiff":
+        import tiff_to_jpeg as tj
+        return lambda p, buf: tj.render_tiff(buf, out_dir, src_path=p)
+    if tool == "split":
+        import split_half_frames as sf
+        return lambda p, buf: sf.render_split(buf, out_dir, img_path=p, prior=prior)
+    if tool == "frames":
+        import frames_pic as fp
+
+        def render(p, buf):
+            name = os.path.splitext(os.path.basename(p))[0]
+            return fp.render_image(buf, os.path.join(out_dir, f"{name}_blog.jpg"), img_path=p)
+        return render
+    if tool == "renditions":
+        import renditions
+        return lambda p, buf: renditions.render_renditions(buf, out_dir, src_path=p)
+    raise ValueError(f"Herramienta desconocida: {tool}")
+
+
+def main():
+    import argparse
+    import discovery
+    ap = argparse.ArgumentParser(description="Procesa una carpeta con lectura, cálculo y escritura solapados")
+    ap.add_argument("tool", choices=("tiff", "split", "frames", "renditions"))
+    ap.add_argument("folder")
+    ap.add_argument("out")
+    ap.add_argument("--io-threads", type=int, default=IO_THREADS)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--writers", type=int, default=WRITE_THREADS)
+    ap.add_argument("--read-ahead", type=int, default=READ_AHEAD)
+    args = ap.parse_args()
+    exts = (".tif", ".tiff") if args.tool == "tiff" else (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+    paths = [e.path for e in discovery.scan_media(args.folder, recursive=False, exts=exts)]
+    os.makedirs(args.out, exist_ok=True)
+    prior = None
+    if args.tool == "split":
+        import split_half_frames as sf
+        prior = sf.batch_prior(paths)
+    pipe = Pipeline(renderer(args.tool, args.out, prior), io_threads=args.io_threads, workers=args.workers,
+                    writers=args.writers, read_ahead=args.read_ahead)
+    results = pipe.run(paths, on_done=lambda r: print(f"{'❌' if r.error else '✅'} {os.path.basename(r.path)}"
+                                                      f"{': ' + str(r.error) if r.error else ''}"))
+    print("\n" + pipe.stats_table())
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
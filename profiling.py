@@ -0,0 +1,182 @@
+# profiling.py
+"""
+Instrumentación ligera por etapas (decode, exif_transpose, trim, resize,
+mask, encode, exiftool…) para las herramientas de Photo Tools.
+
+Uso en las herramientas:
+
+    with prof.stage("decode", path) as st:
+        img = Image.open(path).convert("RGB")
+        st.add_bytes(os.path.getsize(path))
+
+Desactivado (por defecto) `stage()` devuelve un objeto nulo compartido, así que
+el coste es una llamada y un `if`. Se activa con `enable()` o con la variable
+de entorno PHOTOTOOLS_PROFILE=1.
+"""
+import os
+import json
+import threading
+import time
+from typing import List, Optional
+
+ENABLED = os.environ.get("PHOTOTOOLS_PROFILE", "") not in ("", "0")
+
+_records: List[dict] = []
+_lock = threading.Lock()
+_t0_ns = time.perf_counter_ns()
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, n):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "path", "nbytes", "start_ns")
+
+    def __init__(self, name, path, nbytes):
+        self.name = name
+        self.path = path
+        self.nbytes = nbytes or 0
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end_ns = time.perf_counter_ns()
+        rec = {
+            "stage": self.name,
+            "file": self.path,
+            "start_ns": self.start_ns - _t0_ns,
+            "dur_ns": end_ns - self.start_ns,
+            "bytes": self.nbytes,
+            "tid": threading.get_ident(),
+        }
+        with _lock:
+            _records.append(rec)
+        return False
+
+    def add_bytes(self, n):
+        self.nbytes += n or 0
+
+
+def stage(name: str, path: Optional[str] = None, nbytes: int = 0):
+    """Context manager que mide una etapa. Coste casi nulo si el perfilado está desactivado."""
+    if not ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, path, nbytes)
+
+
+def enable(on: bool = True):
+    global ENABLED
+    ENABLED = bool(on)
+
+
+def is_enabled() -> bool:
+    return ENABLED
+
+
+def reset():
+    """Vacía los registros (llamar al inicio de cada run)."""
+    with _lock:
+        _records.clear()
+
+
+def records() -> List[dict]:
+    with _lock:
+        return list(_records)
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return 0
+    k = min(len(sorted_vals) - 1, int(round(pct * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+def summarize(recs: Optional[List[dict]] = None) -> List[dict]:
+    """Agrega por etapa: n, total, media, p95, bytes y % del tiempo total."""
+    recs = records() if recs is None else recs
+    by_stage = {}
+    for r in recs:
+        by_stage.setdefault(r["stage"], []).append(r)
+    grand = sum(r["dur_ns"] for r in recs) or 1
+    rows = []
+    for name, rs in by_stage.items():
+        durs = sorted(r["dur_ns"] for r in rs)
+        total = sum(durs)
+        rows.append({
+            "stage": name,
+            "count": len(rs),
+            "files": len({r["file"] for r in rs if r["file"]}),
+            "total_s": total / 1e9,
+            "mean_ms": total / len(durs) / 1e6,
+            "p95_ms": _percentile(durs, 0.95) / 1e6,
+            "bytes": sum(r["bytes"] for r in rs),
+            "pct": 100.0 * total / grand,
+        })
+    rows.sort(key=lambda row: row["total_s"], reverse=True)
+    return rows
+
+
+def summary_table(recs: Optional[List[dict]] = None) -> str:
+    rows = summarize(recs)
+    if not rows:
+        return "(sin datos de perfilado)"
+    lines = [f"{'etapa':<18} {'n':>6} {'total s':>9} {'media ms':>9} {'p95 ms':>9} {'MB':>9} {'%':>6}"]
+    for r in rows:
+        lines.append(
+            f"{r['stage']:<18} {r['count']:>6} {r['total_s']:>9.2f} {r['mean_ms']:>9.1f} "
+            f"{r['p95_ms']:>9.1f} {r['bytes'] / 1e6:>9.1f} {r['pct']:>5.1f}%"
+        )
+    return "\n".join(lines)
+
+
+def export_json(path: str, recs: Optional[List[dict]] = None):
+    recs = records() if recs is None else recs
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"summary": summarize(recs), "records": recs}, f, indent=1)
+    return path
+
+
+def export_chrome_trace(path: str, recs: Optional[List[dict]] = None):
+    """Formato Trace Event (chrome://tracing, Perfetto): eventos 'X' en microsegundos."""
+    recs = records() if recs is None else recs
+    events = [
+        {
+            "name": r["stage"],
+            "cat": "phototools",
+            "ph": "X",
+            "ts": r["start_ns"] / 1000,
+            "dur": r["dur_ns"] / 1000,
+            "pid": os.getpid(),
+            "tid": r["tid"],
+            "args": {"file": r["file"], "bytes": r["bytes"]},
+        }
+        for r in recs
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def export_all(folder: str, prefix: str = "phototools_profile") -> tuple:
+    """Escribe <prefix>.json y <prefix>_trace.json en folder. Devuelve las dos rutas."""
+    recs = records()
+    return (
+        export_json(os.path.join(folder, f"{prefix}.json"), recs),
+        export_chrome_trace(os.path.join(folder, f"{prefix}_trace.json"), recs),
+    )
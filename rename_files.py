@@ -4,13 +4,28 @@ import re
 from typing import Iterable, List, Tuple, Optional
 from datetime import datetime
 
+import discovery
 import fix_dates as fd  # reuse get_best_datetime() and EXTS
+import profiling as prof
 
 SAFE_CHARS = re.compile(r"[^A-Za-z0-9\-]+")
 
 # Use the same extensions list as the rest of your toolkit
 EXTS = fd.EXTS
 
+# Ordering: "auto" trusts camera/scanner counters in the filename and only reads
+# metadata when they are missing, ambiguous or from mixed cameras
+ORDER = "auto"   # "auto" | "filename" | "metadata"
+
+# (regex on the file stem, counter modulus for rollover or None)
+COUNTER_PATTERNS = [
+    (re.compile(r"(?P<prefix>DSC)(?P<num>\d{5})", re.I), 100000),                     # Sony DSC01234
+    (re.compile(r"(?P<prefix>_?DSC[_F]?|DSCN|_MG_|IMG_E?|CIMG|PICT|SAM_|GOPR|DJI_|MVI_|R\d{3}|P\d{3})"
+                r"(?P<num>\d{4})", re.I), 10000),                                        # Nikon/Fuji/Canon/Apple/Olympus…
+    (re.compile(r"(?P<prefix>.*?)(?P<num>\d{1,6})", re.I), None),                       # lab/scanner: trailing number
+]
+ROLLOVER_MAX_GAP = 500   # a wrap (…9999 → 0001) is only trusted if the counters nearly touch both ends
+
 def _parse_dt(s):
     if not s:
         return None
@@ -32,19 +47,7 @@ def best_datetime_for_sort(path):
     except Exception:
         return 0.0
 def list_media(folder: str, recursive: bool = False, exts: Iterable[str] = EXTS) -> List[str]:
-    out: List[str] = []
-    exts_lower = tuple(e.lower() for e in exts)
-    if recursive:
-        for root, _, files in os.walk(folder):
-            for f in files:
-                if f.lower().endswith(exts_lower):
-                    out.append(os.path.join(root, f))
-    else:
-        for f in os.listdir(folder):
-            p = os.path.join(folder, f)
-            if os.path.isfile(p) and f.lower().endswith(exts_lower):
-                out.append(p)
-    return out
+    return [e.path for e in discovery.scan_media(folder, recursive=recursive, exts=exts)]
 
 def _fs_datetime(path: str) -> datetime:
     st = os.stat(path)
@@ -54,7 +57,8 @@ def _fs_datetime(path: str) -> datetime:
     return datetime.fromtimestamp(ts)
 
 def best_datetime_for_sort(path: str) -> datetime:
-    tag, val = fd.get_best_datetime(path)
+    with prof.stage("read_date", path):
+        tag, val = fd.get_best_datetime(path)
     if tag and val and not val.startswith("0000:00:00"):
         try:
             return datetime.strptime(val, "%Y:%m:%d %H:%M:%S")
@@ -82,10 +86,67 @@ def build_prefix(yyyymm: str, tag: str, camera: str, film: str) -> str:
 def zero_pad_width(n_items: int) -> int:
     return max(2, len(str(n_items)))
 
-def plan_new_names(files: List[str], prefix: str) -> List[Tuple[str, str]]:
-    """Return list of (src, dst) with dst only the basename (no folder)."""
+def parse_counter(path: str) -> Optional[Tuple[str, int, Optional[int]]]:
+    """(prefix, counter, modulus) from a camera/scanner file name, or None."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for rx, mod in COUNTER_PATTERNS:
+        m = rx.fullmatch(stem)
+        if m:
+            return m.group("prefix").upper(), int(m.group("num")), mod
+    return None
+
+def order_by_filename(files: List[str]) -> Optional[List[str]]:
+    """
+    Shooting order from the file counters, or None when the names can't be
+    trusted: some file has no counter, several cameras/prefixes are mixed, or
+    a counter repeats with the same extension (two cards, two rollovers).
+    RAW+JPEG pairs (same counter, different extension) stay together.
+    Rollover (…9998, 9999, 0001…) is handled by starting after the largest
+    gap on the counter circle; a big gap that isn't a clean wrap is ambiguous.
+    """
+    parsed = [parse_counter(p) for p in files]
+    if not files or any(c is None for c in parsed):
+        return None
+    if len({(c[0], c[2]) for c in parsed}) != 1:
+        return None
+    seen = set()
+    for p, c in zip(files, parsed):
+        key = (c[1], os.path.splitext(p)[1].lower())
+        if key in seen:
+            return None
+        seen.add(key)
+    mod = parsed[0][2]
+    nums = sorted({c[1] for c in parsed})
+    start = 0
+    if mod and len(nums) > 1:
+        gaps = [b - a for a, b in zip(nums, nums[1:])]
+        wrap = nums[0] + mod - nums[-1]
+        widest = max(range(len(gaps)), key=gaps.__getitem__)
+        if gaps[widest] > wrap:
+            if wrap > ROLLOVER_MAX_GAP:
+                return None  # e.g. 0100 and 9000: rollover or two sessions? let the metadata decide
+            start = widest + 1  # the roll wrapped: the low counters come after the high ones
+    rank = {n: (i - start) % len(nums) for i, n in enumerate(nums)}
+    order = sorted(zip(files, parsed), key=lambda fc: (rank[fc[1][1]], os.path.basename(fc[0]).lower()))
+    return [f for f, _ in order]
+
+def sort_for_rename(files: List[str], order: Optional[str] = None) -> Tuple[List[str], str]:
+    """Return (files in shooting order, how it was decided)."""
+    order = order or ORDER
+    if order in ("auto", "filename"):
+        with prof.stage("order_by_filename"):
+            by_name = order_by_filename(files)
+        if by_name is not None:
+            return by_name, "filename"
+        if order == "filename":
+            raise ValueError("File names have no usable counter (missing, mixed cameras or repeated)")
     # Sort by best date, then by filename to stabilize ties
-    files_sorted = sorted(files, key=lambda p: (best_datetime_for_sort(p), os.path.basename(p).lower()))
+    return sorted(files, key=lambda p: (best_datetime_for_sort(p), os.path.basename(p).lower())), "metadata"
+
+def plan_new_names(files: List[str], prefix: str, order: Optional[str] = None,
+                   presorted: bool = False) -> List[Tuple[str, str]]:
+    """Return list of (src, dst) with dst only the basename (no folder)."""
+    files_sorted = list(files) if presorted else sort_for_rename(files, order)[0]
     pad = zero_pad_width(len(files_sorted))
     plan: List[Tuple[str, str]] = []
     for i, src in enumerate(files_sorted, start=1):
@@ -124,7 +185,8 @@ def apply_plan(folder: str, plan: List[Tuple[str, str]], dry_run: bool = True) -
             msgs.append(f"🛈 {os.path.basename(src)} → {dst_name} (dry-run)")
         else:
             try:
-                os.rename(src, dst_path)
+                with prof.stage("rename", src):
+                    os.rename(src, dst_path)
                 ok += 1
                 msgs.append(f"✅ {os.path.basename(src)} → {dst_name}")
             except Exception as e:
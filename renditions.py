@@ -0,0 +1,149 @@
+# renditions.py
+"""
+Varias salidas por escaneo con una sola decodificación.
+
+Cada escaneo se exporta a varios tamaños (marco de 1080 px para Instagram, el
+_blog.jpg de 3000 px de frames_pic y el JPEG ligero de 2048 px de
+tiff_to_jpeg). Con un run por tamaño se decodifica, endereza y recorta el
+original N veces. Aquí se hace una vez y se baja por una pirámide: cada
+tamaño se reescala desde el nivel inmediatamente mayor ya calculado, no desde
+el original, así que sólo el primer resize recorre la imagen completa.
+
+    python renditions.py scans/ salida/
+
+Todas las versiones parten de la misma base (EXIF enderezado y bordes
+oscuros recortados, como frames_pic). En TIFF multipágina sólo se usa la
+primera página.
+"""
+import os
+import sys
+import argparse
+from typing import List, NamedTuple, Optional
+
+import profiling as prof
+import pipeline
+import resampling
+import frames_pic as fp
+import tiff_to_jpeg as tj
+
+
+class Rendition(NamedTuple):
+    suffix: str                  # nombre de salida: <base><suffix>.jpg
+    kind: str                    # "frame" (lienzo con esquinas, frames_pic) | "light" (JPEG reducido, tiff_to_jpeg)
+    long_edge: Optional[int]     # None = el de la herramienta (fp.OUTPUT_LONG_SIDE / tj.MAX_LONG_EDGE)
+
+
+RENDITIONS: List[Rendition] = [
+    Rendition("_blog",  "frame", None),
+    Rendition("",       "light", None),
+    Rendition("_insta", "frame", 1080),
+]
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+
+def _long_edge(r: Rendition) -> int:
+    if r.long_edge:
+        return r.long_edge
+    return fp.OUTPUT_LONG_SIDE if r.kind == "frame" else tj.MAX_LONG_EDGE
+
+
+def output_paths(src_path: str, out_dir: str, renditions: Optional[List[Rendition]] = None) -> List[str]:
+    base = os.path.splitext(os.path.basename(src_path))[0]
+    return [os.path.join(out_dir, f"{base}{r.suffix}.jpg") for r in (renditions or RENDITIONS)]
+
+
+def rendition_layout(r: Rendition, w0: int, h0: int):
+    """(tamaño de la foto reescalada, lienzo o None) de r para un original de w0×h0 (también lo usa scheduler)."""
+    if r.kind == "frame":
+        canvas, size = fp.frame_layout(w0, h0, _long_edge(r))
+        return size, canvas
+    if r.kind == "light":
+        return tj.long_edge_size(w0, h0, _long_edge(r)), None
+    raise ValueError(f"Tipo de versión desconocido: {r.kind}")
+
+
+def build_pyramid(base, sizes, src_path=None) -> dict:
+    """
+    {tamaño: imagen} para cada tamaño pedido. Se calculan de mayor a menor y
+    cada uno sale del nivel más pequeño que todavía lo cubre (el original sólo
+    para el primero, o si hay que ampliar).
+    """
+    levels = {base.size: base}
+    for size in sorted(set(sizes), key=lambda s: s[0] * s[1], reverse=True):
+        if size in levels:
+            continue
+        covering = [im for sz, im in levels.items() if sz[0] >= size[0] and sz[1] >= size[1]]
+        src = min(covering, key=lambda im: im.width * im.height) if covering else base
+        with prof.stage("resize", src_path):
+            levels[size] = resampling.resize(src, size)
+    return {sz: levels[sz] for sz in sizes}  # suelta la base si ninguna versión la usa tal cual
+
+
+def render_renditions(src, out_dir, renditions: Optional[List[Rendition]] = None, src_path=None):
+    """Decodifica src una vez y devuelve [pipeline.Output] con todas las versiones, en el orden configurado."""
+    src_path = src_path or src
+    renditions = renditions or RENDITIONS
+    base = fp.load_prepared(src, src_path)
+    targets = [rendition_layout(r, *base.size) for r in renditions]
+    levels = build_pyramid(base, [size for size, _ in targets], src_path)
+    del base
+    outputs = []
+    for r, path, (size, canvas) in zip(renditions, output_paths(src_path, out_dir, renditions), targets):
+        img = levels[size]
+        if r.kind == "frame":
+            img = fp.compose_frame(img, canvas, src_path)
+            data = fp.encode_frame(img, src_path)
+        else:
+            data = tj.encode_light(img, src_path)
+        outputs.append(pipeline.Output(path, data, img.size))
+    return outputs
+
+
+def render_to_folder(src_path: str, out_dir: str, renditions: Optional[List[Rendition]] = None):
+    outputs = render_renditions(src_path, out_dir, renditions)
+    pipeline.write_outputs(outputs, src_path)
+    return outputs
+
+
+def parse_renditions(spec: str) -> List[Rendition]:
+    """'frame:3000:_blog,light:2048:,frame:1080:_insta' → [Rendition]."""
+    out = []
+    for part in spec.split(","):
+        kind, edge, suffix = (part.strip().split(":") + ["", ""])[:3]
+        if kind not in ("frame", "light"):
+            raise ValueError(f"Tipo de versión desconocido: {kind!r} (frame | light)")
+        out.append(Rendition(suffix, kind, int(edge) if edge else None))
+    if len({r.suffix for r in out}) != len(out):
+        raise ValueError("Dos versiones con el mismo sufijo se pisarían")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Exporta todas las versiones de cada imagen con una sola decodificación")
+    ap.add_argument("folder")
+    ap.add_argument("out")
+    ap.add_argument("--renditions", help="tipo:lado:sufijo separados por comas (por defecto, RENDITIONS)")
+    args = ap.parse_args()
+    import discovery
+    try:
+        renditions = parse_renditions(args.renditions) if args.renditions else RENDITIONS
+    except ValueError as e:
+        ap.error(str(e))
+    os.makedirs(args.out, exist_ok=True)
+    fail = 0
+    for e in discovery.scan_media(args.folder, recursive=False, exts=IMAGE_EXTS):
+        try:
+            outs = render_to_folder(e.path, args.out, renditions)
+        except Exception as ex:
+            fail += 1
+            print(f"❌ {e.name}: {ex}")
+            continue
+        print(f"✅ {e.name} → " + ", ".join(f"{os.path.basename(o.path)} ({o.size[0]}x{o.size[1]})" for o in outs))
+    if prof.is_enabled():
+        print("\n" + prof.summary_table())
+    return 1 if fail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
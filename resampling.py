@@ -0,0 +1,266 @@
+# resampling.py
+"""
+Reescalado con estrategia intercambiable y elección automática por factor.
+
+Reducir un escaneo de 50 MP a 2048 px con LANCZOS directo recorre todos los
+píxeles de origen con un kernel ancho. Para factores grandes es varias veces
+más rápido reducir primero por un factor entero (reduce(), media por cajas)
+y terminar con LANCZOS sobre una imagen ya pequeña; el resultado es
+indistinguible. Estrategias:
+
+  - "lanczos":          Image.resize(LANCZOS) directo (referencia).
+  - "reduce_lanczos":   reduce() entero dejando ≥ 3× para LANCZOS (reducing_gap=3).
+  - "reduce2_lanczos":  igual con reducing_gap=2 (más rápido, algo más blando).
+  - "reduce15_lanczos": reducing_gap=1.5: ya actúa en 3–4× (p. ej. 50 MP → 2048 px).
+  - "area":             media por áreas exacta en NumPy (sólo L/RGB/RGBX; si no, reduce_lanczos).
+
+resize(img, size) elige según el factor con RATIO_DEFAULTS, o con el perfil
+que genera el micro-benchmark en esta máquina (resampling_profile.json junto
+al módulo). El benchmark descarta las estrategias cuyo error frente a LANCZOS
+supere MAX_P999_ERROR / MAX_MEAN_ERROR:
+
+    python resampling.py bench --save
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+PROFILE_PATH     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resampling_profile.json")
+MAX_P999_ERROR   = 6.0       # percentil 99.9 de |Δ| por canal (0–255) frente a LANCZOS directo
+MAX_MEAN_ERROR   = 0.75      # media de |Δ|
+AREA_CHUNK_ROWS  = 256       # filas por bloque en la media por áreas (acota la memoria)
+TIE_MARGIN       = 0.05      # si LANCZOS directo está a menos de un 5% del más rápido, se queda LANCZOS
+
+# (factor mínimo, estrategia): la última fila cuyo factor ≤ al pedido gana.
+# Valores por defecto medidos con `python resampling.py bench`; el perfil local los sustituye.
+RATIO_DEFAULTS: List[Tuple[float, str]] = [
+    (0.0,  "lanczos"),           # ampliar o < 2.5×: reduce() no llega a actuar
+    (2.5,  "reduce15_lanczos"),  # 3–4×: ~2–3× más rápido, p99.9 ≤ 3; 8×: ~6×, p99.9 5
+    (10.0, "reduce2_lanczos"),   # con gap 1.5 el error ya pasa el límite
+]
+
+BENCH_RATIOS = (1.5, 2.0, 3.0, 3.9, 6.0, 8.0, 12.0)
+BENCH_SIZE   = (6000, 4000)
+BENCH_REPEAT = 3
+
+
+# ---------- Estrategias ----------
+def _lanczos(img, size):
+    return img.resize(size, Image.LANCZOS)
+
+
+def _reduce_lanczos(img, size):
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+def _reduce2_lanczos(img, size):
+    return img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def _reduce15_lanczos(img, size):
+    return img.resize(size, Image.LANCZOS, reducing_gap=1.5)
+
+
+def _area_axis(a, n_out, axis):
+    """Media por áreas a lo largo de axis (float32 → float32) con sumas acumuladas."""
+    import numpy as np
+    n_in = a.shape[axis]
+    edges = np.linspace(0, n_in, n_out + 1)
+    cs = np.cumsum(a, axis=axis, dtype=np.float64)
+    zero_shape = list(cs.shape)
+    zero_shape[axis] = 1
+    cs = np.concatenate([np.zeros(zero_shape), cs], axis=axis)
+    # C(x) con interpolación lineal en los bordes fraccionarios
+    lo = np.floor(edges).astype(np.int64)
+    frac = edges - lo
+    hi = np.minimum(lo + 1, n_in)
+    c_lo = np.take(cs, lo, axis=axis)
+    c_hi = np.take(cs, hi, axis=axis)
+    shape = [1] * cs.ndim
+    shape[axis] = -1
+    c = c_lo + (c_hi - c_lo) * frac.reshape(shape)
+    widths = np.diff(edges).reshape(shape)
+    return (np.diff(c, axis=axis) / widths).astype(np.float32)
+
+
+def _area(img, size):
+    import numpy as np
+    # RGBX: la vista sin copia de shm_images; el canal de relleno se promedia sin más
+    if img.mode not in ("L", "RGB", "RGBX") or size[0] > img.width or size[1] > img.height:
+        return _reduce_lanczos(img, size)
+    w, h = size
+    src = np.asarray(img)
+    rows = []
+    for y in range(0, src.shape[0], AREA_CHUNK_ROWS):
+        rows.append(_area_axis(src[y:y + AREA_CHUNK_ROWS].astype(np.float32), w, axis=1))
+    out = _area_axis(np.concatenate(rows, axis=0), h, axis=0)
+    return Image.fromarray(np.clip(out + 0.5, 0, 255).astype(np.uint8), img.mode)
+
+
+STRATEGIES: Dict[str, Callable] = {
+    "lanczos":         _lanczos,
+    "reduce_lanczos":  _reduce_lanczos,
+    "reduce2_lanczos": _reduce2_lanczos,
+    "reduce15_lanczos": _reduce15_lanczos,
+    "area":            _area,
+}
+
+
+# ---------- Elección ----------
+_profile: Optional[List[Tuple[float, str]]] = None
+
+
+def load_profile(path: str = PROFILE_PATH) -> List[Tuple[float, str]]:
+    """Tabla (factor mínimo, estrategia) del benchmark local, o RATIO_DEFAULTS."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            rows = [(float(r), str(s)) for r, s in json.load(f)["ratios"]]
+        if rows and all(s in STRATEGIES for _, s in rows):
+            return sorted(rows)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return list(RATIO_DEFAULTS)
+
+
+def strategy_for(ratio: float) -> str:
+    global _profile
+    if _profile is None:
+        _profile = load_profile()
+    name = _profile[0][1]
+    for min_ratio, s in _profile:
+        if ratio >= min_ratio:
+            name = s
+    return name
+
+
+def resize(img, size, strategy: Optional[str] = None):
+    """Sustituto de img.resize(size, Image.LANCZOS) que elige la estrategia más rápida válida."""
+    size = (int(size[0]), int(size[1]))
+    if size == img.size:
+        return img.copy()
+    ratio = max(img.width / size[0], img.height / size[1])
+    if ratio <= 1 and strategy is None:
+        return _lanczos(img, size)  # ampliar: no hay nada que reducir
+    return STRATEGIES[strategy or strategy_for(ratio)](img, size)
+
+
+# ---------- Calidad y micro-benchmark ----------
+def pixel_error(a, b) -> Dict[str, float]:
+    import numpy as np
+    d = np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16))
+    return {"max": float(d.max()), "p999": float(np.percentile(d, 99.9)), "mean": float(d.mean())}
+
+
+def passes_guard(err: Dict[str, float]) -> bool:
+    return err["p999"] <= MAX_P999_ERROR and err["mean"] <= MAX_MEAN_ERROR
+
+
+def _bench_image(size=BENCH_SIZE, seed=1234):
+    """Gradiente + grano correlacionado + bordes duros: parecido a un escaneo, peor caso para el aliasing."""
+    import numpy as np
+    from PIL import ImageFilter
+    w, h = size
+    rng = np.random.default_rng(seed)
+    x = np.linspace(40, 220, w, dtype=np.float32)
+    y = np.linspace(30, 200, h, dtype=np.float32)[:, None]
+    base = x[None, :] * 0.6 + y * 0.4
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    for c, k in enumerate((1.0, 0.9, 0.8)):
+        out[..., c] = np.clip(base * k + rng.normal(0, 14, size=(h, w)), 0, 255)
+    img = Image.fromarray(out, "RGB").filter(ImageFilter.GaussianBlur(0.8))
+    arr = np.asarray(img).copy()
+    for i in range(12):  # líneas y bloques nítidos
+        x0, y0 = int(rng.integers(0, w - 200)), int(rng.integers(0, h - 200))
+        arr[y0:y0 + 180, x0:x0 + 4] = 250
+        arr[y0:y0 + 3, x0:x0 + 180] = 5
+    return Image.fromarray(arr, "RGB")
+
+
+def _best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def benchmark(img=None, ratios=BENCH_RATIOS, repeat=BENCH_REPEAT) -> Dict[float, Dict[str, dict]]:
+    """{factor: {estrategia: {"s": segundos, "err": {...}, "ok": bool}}}"""
+    img = img if img is not None else _bench_image()
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    results = {}
+    for r in ratios:
+        size = (max(1, round(img.width / r)), max(1, round(img.height / r)))
+        ref_s, ref = _best_time(lambda: _lanczos(img, size), repeat)
+        row = {"lanczos": {"s": ref_s, "err": {"max": 0.0, "p999": 0.0, "mean": 0.0}, "ok": True}}
+        for name, fn in STRATEGIES.items():
+            if name == "lanczos":
+                continue
+            s, out = _best_time(lambda: fn(img, size), repeat)
+            err = pixel_error(ref, out)
+            row[name] = {"s": s, "err": err, "ok": passes_guard(err)}
+        results[r] = row
+    return results
+
+
+def pick_profile(results) -> List[Tuple[float, str]]:
+    """Estrategia más rápida que pasa el control de calidad en cada factor, compactada en rangos."""
+    rows: List[Tuple[float, str]] = []
+    prev = None
+    for r in sorted(results):
+        ok = {n: v for n, v in results[r].items() if v["ok"]}
+        best = min(ok, key=lambda n: ok[n]["s"])
+        if ok[best]["err"]["max"] == 0 or ok["lanczos"]["s"] <= ok[best]["s"] * (1 + TIE_MARGIN):
+            best = "lanczos"  # misma salida o sin ganancia clara: la referencia
+        if not rows or best != rows[-1][1]:
+            # el rango empieza a medio camino desde el factor medido anterior
+            rows.append((0.0 if prev is None else (prev + r) / 2, best))
+        prev = r
+    return rows
+
+
+def format_results(results) -> str:
+    names = list(STRATEGIES)
+    lines = [f"{'factor':>7} " + " ".join(f"{n:>22}" for n in names)]
+    for r in sorted(results):
+        cells = []
+        for n in names:
+            v = results[r][n]
+            flag = "" if v["ok"] else "✗"
+            cells.append(f"{v['s']*1000:8.1f} ms p99.9={v['err']['p999']:4.1f}{flag:1}")
+        lines.append(f"{r:7.1f} " + " ".join(f"{c:>22}" for c in cells))
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmark de estrategias de reescalado")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_b = sub.add_parser("bench", help="mide cada estrategia por factor y elige la más rápida válida")
+    p_b.add_argument("--image", help="imagen real a usar (por defecto, sintética 24 MP)")
+    p_b.add_argument("--repeat", type=int, default=BENCH_REPEAT)
+    p_b.add_argument("--save", action="store_true", help=f"guardar el perfil en {PROFILE_PATH}")
+    args = ap.parse_args()
+    img = None
+    if args.image:
+        with Image.open(args.image) as im:
+            img = im.convert("RGB")
+    results = benchmark(img, repeat=args.repeat)
+    print(format_results(results))
+    profile = pick_profile(results)
+    print("\nPerfil: " + ", ".join(f"≥{r:g}× → {s}" for r, s in profile))
+    if args.save:
+        with open(PROFILE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"ratios": profile, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+        print(f"💾 {PROFILE_PATH}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
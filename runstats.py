@@ -0,0 +1,148 @@
+# runstats.py
+"""
+Estadísticas en vivo de un lote: archivos/s y MB/s en una ventana móvil,
+ETA, latencia por archivo (p50/p95), los más lentos y los que están en curso.
+
+Los workers llaman a started()/finished(); el GUI lee snapshot() cada medio
+segundo desde su hilo (todo va con un lock). Al terminar, export_csv()
+escribe un informe con una fila por archivo.
+"""
+import csv
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+WINDOW_SECONDS = 30.0     # ventana móvil para las tasas
+SLOWEST_N      = 5
+
+MB = 1024 * 1024
+
+
+class FileRecord(NamedTuple):
+    key: str
+    started: float        # time.time()
+    seconds: float
+    nbytes: int
+    ok: bool
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    seconds = int(round(seconds))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h {m:02d}m" if h else (f"{m}m {s:02d}s" if m else f"{s}s")
+
+
+class RunStats:
+    def __init__(self, total: int = 0, total_bytes: Optional[int] = None, window: float = WINDOW_SECONDS):
+        self.total = total
+        self.total_bytes = total_bytes
+        self.window = window
+        self.records: List[FileRecord] = []
+        self.inflight: Dict[str, tuple] = {}   # key -> (perf_counter inicio, time.time inicio, bytes)
+        self.t0 = time.perf_counter()
+        self.t_end: Optional[float] = None
+        self._recent: List[tuple] = []         # (perf_counter fin, bytes) dentro de la ventana
+        self._lock = threading.Lock()
+
+    # ----- lado worker -----
+    def started(self, key: str, nbytes: int = 0):
+        with self._lock:
+            self.inflight[key] = (time.perf_counter(), time.time(), nbytes)
+
+    def finished(self, key: str, ok: bool = True, nbytes: Optional[int] = None):
+        now = time.perf_counter()
+        with self._lock:
+            t_start, wall_start, started_bytes = self.inflight.pop(key, (now, time.time(), 0))
+            n = started_bytes if nbytes is None else nbytes
+            self.records.append(FileRecord(key, wall_start, now - t_start, n, ok))
+            self._recent.append((now, n))
+
+    def finish_run(self):
+        with self._lock:
+            if self.t_end is None:  # idempotente: el finally del GUI puede llamarlo otra vez
+                self.t_end = time.perf_counter()
+
+    @property
+    def running(self) -> bool:
+        return self.t_end is None
+
+    # ----- lado GUI -----
+    def snapshot(self) -> dict:
+        now = time.perf_counter()
+        with self._lock:
+            cutoff = now - self.window
+            self._recent = [r for r in self._recent if r[0] >= cutoff]
+            elapsed = (self.t_end or now) - self.t0
+            done = len(self.records)
+            done_bytes = sum(r.nbytes for r in self.records)
+            if self.t_end is None:
+                span = min(self.window, elapsed) or 1e-9
+                files_s = len(self._recent) / span
+                mb_s = sum(b for _, b in self._recent) / MB / span
+            else:  # lote terminado: media de todo el run
+                files_s = done / elapsed if elapsed > 0 else 0.0
+                mb_s = done_bytes / MB / elapsed if elapsed > 0 else 0.0
+            latencies = [r.seconds for r in self.records]
+            slowest = sorted(self.records, key=lambda r: r.seconds, reverse=True)[:SLOWEST_N]
+            inflight = sorted(((k, now - v[0]) for k, v in self.inflight.items()), key=lambda x: -x[1])
+            failed = sum(1 for r in self.records if not r.ok)
+        remaining = max(0, self.total - done)
+        eta = None
+        if self.t_end is None and remaining:
+            if self.total_bytes and mb_s > 0:
+                eta = (self.total_bytes - done_bytes) / MB / mb_s
+            elif files_s > 0:
+                eta = remaining / files_s
+        return {
+            "done": done, "total": self.total, "failed": failed,
+            "elapsed_s": elapsed, "files_s": files_s, "mb_s": mb_s, "eta_s": eta,
+            "p50_s": percentile(latencies, 0.50), "p95_s": percentile(latencies, 0.95),
+            "slowest": [(r.key, r.seconds) for r in slowest],
+            "inflight": inflight,
+        }
+
+    def summary_lines(self) -> List[str]:
+        s = self.snapshot()
+        lat = (f"p50 {s['p50_s']:.1f}s · p95 {s['p95_s']:.1f}s" if s["p50_s"] is not None else "p50 — · p95 —")
+        lines = [
+            f"{s['done']}/{s['total']} · {s['files_s']:.2f} arch/s · {s['mb_s']:.1f} MB/s · "
+            f"ETA {format_duration(s['eta_s'])} · {format_duration(s['elapsed_s'])} transcurrido",
+            f"Latencia {lat}" + (" · más lentos: " + ", ".join(f"{k} {t:.1f}s" for k, t in s["slowest"][:3])
+                                  if s["slowest"] else ""),
+        ]
+        if s["inflight"]:
+            lines.append("En curso: " + ", ".join(f"{k} ({t:.0f}s)" for k, t in s["inflight"][:4])
+                         + (f" +{len(s['inflight']) - 4}" if len(s["inflight"]) > 4 else ""))
+        else:
+            lines.append("En curso: —")
+        return lines
+
+    def export_csv(self, path: str) -> str:
+        with self._lock:
+            records = list(self.records)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["archivo", "inicio", "segundos", "bytes", "MB_s", "ok"])
+            for r in records:
+                mbps = r.nbytes / MB / r.seconds if r.seconds > 0 else ""
+                w.writerow([r.key, datetime.fromtimestamp(r.started).isoformat(timespec="seconds"),
+                            f"{r.seconds:.3f}", r.nbytes, f"{mbps:.2f}" if mbps != "" else "", int(r.ok)])
+            s = self.snapshot()
+            w.writerow([])
+            w.writerow(["# total", s["done"], "fallos", s["failed"], "segundos", f"{s['elapsed_s']:.1f}"])
+            w.writerow(["# p50_s", f"{s['p50_s'] or 0:.3f}", "p95_s", f"{s['p95_s'] or 0:.3f}"])
+        return path
@@ -0,0 +1,355 @@
+# scheduler.py
+"""
+Planificador de trabajos con presupuesto de memoria.
+
+Mezclar JPEG de 12 MP con TIFF cosidos de 200 MP en un pool fijo de hilos o
+deja núcleos parados o se queda sin RAM. Aquí cada entrada se abre de forma
+perezosa con PIL (sólo cabecera: tamaño, modo, nº de páginas), se estima el
+pico de memoria de trabajo de la herramienta —incluida la máscara 4× de
+frames_pic— y los trabajos se admiten mientras quepan en MEMORY_BUDGET_MB
+(el ByteBudget de pipeline.py, el mismo en el GUI y aquí; ver
+budgeted_pipeline). Orden: el más grande primero (mejor reparto de carga).
+Un trabajo que no cabe ni solo se ejecuta solo.
+
+Al terminar cada archivo se informa del pico estimado y del real (RSS del
+proceso muestreado mientras corría; con varios trabajos a la vez es una cota
+superior, porque el pico se reparte entre los que estaban en vuelo).
+"""
+import os
+import sys
+import argparse
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import pipeline
+
+MEMORY_BUDGET_MB = None      # None = RAM_FRACTION de la memoria física
+RAM_FRACTION     = 0.6
+WORKERS          = None      # None = os.cpu_count()
+SAFETY_FACTOR    = 1.15      # buffers de libjpeg/libtiff, fragmentación
+SAMPLE_SECONDS   = 0.01      # muestreo del RSS para el pico real
+
+MB = 1024 * 1024
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+    mode: str
+    n_frames: int
+
+
+class Job(NamedTuple):
+    key: str            # lo que se registra en el checkpoint / log (nombre de archivo)
+    path: str
+    tool: str
+    info: Optional[ImageInfo]
+    est_bytes: int
+
+
+class JobResult(NamedTuple):
+    job: Job
+    seconds: float
+    actual_bytes: Optional[int]
+    error: Optional[BaseException]
+
+
+# ---------- Cabeceras y estimaciones ----------
+def probe(path: str) -> ImageInfo:
+    """Lee tamaño/modo/páginas de la cabecera (Image.open no decodifica los píxeles)."""
+    from PIL import Image
+    with Image.open(path) as im:
+        return ImageInfo(im.width, im.height, im.mode, getattr(im, "n_frames", 1))
+
+
+def pixel_bytes(mode: str) -> int:
+    """Bytes por píxel en memoria de Pillow (RGB se guarda en 4 bytes, no 3)."""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def _lanczos_tmp(w, h, nw, nh, bpp):
+    # resize separable: pasada horizontal a (nw, h) y luego vertical
+    return nw * h * bpp if nw != w else 0
+
+
+def _est_frames(info: ImageInfo) -> int:
+    import frames_pic as fp
+    w, h = info.width, info.height
+    src = w * h * pixel_bytes(info.mode)
+    rgb = w * h * 4
+    cw, ch = fp.choose_canvas_size(w, h)
+    scale = min((cw - 2 * fp.MIN_BORDER) / w, (ch - 2 * fp.MIN_BORDER) / h)
+    if scale >= 1 and not fp.UPSCALE_SMALLER:
+        scale = 1
+    iw, ih = max(1, int(w * scale)), max(1, int(h * scale))
+    small = iw * ih * 4
+    aa = iw * ih * fp.ANTIALIAS_SCALE ** 2            # máscara L supersampleada
+    aa_tmp = iw * ih * fp.ANTIALIAS_SCALE              # pasada horizontal del resize de la máscara
+    canvas = cw * ch * 4
+    return max(
+        src + rgb,                                     # decode + convert("RGB")
+        2 * rgb,                                       # exif_transpose / recorte (copia)
+        rgb + small + _lanczos_tmp(w, h, iw, ih, 4),   # resize
+        small + canvas + aa + aa_tmp + iw * ih,        # máscara redondeada
+    )
+
+
+def _est_split(info: ImageInfo) -> int:
+    import split_half_frames as sf
+    w, h = info.width, info.height
+    src = w * h * pixel_bytes(info.mode)
+    rgb = w * h * 4
+    small = rgb // (sf.DETECT_SCALE ** 2)              # copia reducida para buscar la división
+    return max(
+        src + rgb,                                     # decode color (una sola vez)
+        rgb + 2 * small,                               # detección (reduce + L)
+        rgb + rgb + w * h + rgb // 2,                  # crops A/B + recorte de bordes
+    )
+
+
+def _est_tiff(info: ImageInfo) -> int:
+    import tiff_to_jpeg as tj
+    w, h = info.width, info.height
+    frame = w * h * pixel_bytes(info.mode)
+    rgb = w * h * 4
+    s = min(1.0, tj.MAX_LONG_EDGE / max(w, h))
+    nw, nh = int(w * s), int(h * s)
+    alpha = (rgb + w * h) if "A" in info.mode else 0   # fondo + canal alfa al aplanar
+    # las páginas se procesan de una en una: el pico es el de una página
+    return max(2 * frame + rgb + alpha, frame + rgb + nw * nh * 4 + _lanczos_tmp(w, h, nw, nh, 4))
+
+
+def _est_renditions(info: ImageInfo) -> int:
+    import frames_pic as fp
+    import renditions as rd
+    w, h = info.width, info.height
+    src = w * h * pixel_bytes(info.mode)
+    rgb = w * h * 4
+    targets = [rd.rendition_layout(r, w, h) for r in rd.RENDITIONS]
+    levels = sum(sz[0] * sz[1] * 4 for sz in {size for size, _ in targets})
+    biggest = max((sz for sz, _ in targets), key=lambda sz: sz[0] * sz[1])
+    compose = max((c[0] * c[1] * 4 + sz[0] * sz[1] * (fp.ANTIALIAS_SCALE ** 2 + fp.ANTIALIAS_SCALE + 1)
+                   for sz, c in targets if c), default=0)
+    return max(
+        src + rgb,                                                       # decode + convert("RGB")
+        2 * rgb,                                                         # exif_transpose / recorte
+        rgb + levels + _lanczos_tmp(w, h, biggest[0], biggest[1], 4),   # pirámide (todos los niveles vivos)
+        levels + compose,                                                # marco más grande
+    )
+
+
+ESTIMATORS: Dict[str, Callable[[ImageInfo], int]] = {
+    "frames": _est_frames,
+    "renditions": _est_renditions,
+    "split":  _est_split,
+    "tiff":   _est_tiff,
+}
+
+
+def estimate_peak(tool: str, info: ImageInfo) -> int:
+    return int(ESTIMATORS[tool](info) * SAFETY_FACTOR)
+
+
+def make_jobs(paths: Iterable[str], tool: str, keys: Optional[Iterable[str]] = None) -> List[Job]:
+    """Lee las cabeceras y ordena el más grande primero. Las ilegibles van al final con estimación 0."""
+    paths = list(paths)
+    keys = list(keys) if keys is not None else paths
+    jobs = []
+    for key, p in zip(keys, paths):
+        try:
+            info = probe(p)
+            est = estimate_peak(tool, info)
+        except Exception:
+            info, est = None, 0  # el fallo real lo dará la herramienta
+        jobs.append(Job(key, p, tool, info, est))
+    jobs.sort(key=lambda j: j.est_bytes, reverse=True)
+    return jobs
+
+
+# ---------- Memoria del proceso ----------
+def physical_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_budget() -> int:
+    if MEMORY_BUDGET_MB:
+        return int(MEMORY_BUDGET_MB * MB)
+    phys = physical_memory()
+    return int(phys * RAM_FRACTION) if phys else 4096 * MB
+
+
+def current_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil  # opcional (macOS/Windows)
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _load_malloc_trim():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        return ctypes.CDLL("libc.so.6").malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+
+_malloc_trim = _load_malloc_trim()
+
+
+def release_free_memory():
+    """Devuelve al sistema la memoria ya liberada (glibc se queda los bloques grandes)."""
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+class RssSampler:
+    """Hilo que muestrea el RSS y mantiene el máximo visto por cada trabajo en vuelo."""
+
+    def __init__(self, interval=SAMPLE_SECONDS):
+        self.interval = interval
+        self.available = current_rss() is not None
+        self._start: Dict[int, int] = {}
+        self._peak: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.available:
+            self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return False
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss() or 0
+        with self._lock:
+            for k in self._peak:
+                if rss > self._peak[k]:
+                    self._peak[k] = rss
+
+    def begin(self, k):
+        if self.available:
+            # sin esto el trabajo siguiente reutiliza la memoria del anterior y su pico "real" sale 0
+            release_free_memory()
+            rss = current_rss() or 0
+            with self._lock:
+                self._start[k] = self._peak[k] = rss
+
+    def end(self, k) -> Optional[int]:
+        if not self.available:
+            return None
+        self.sample()
+        with self._lock:
+            return max(0, self._peak.pop(k) - self._start.pop(k))
+
+
+# ---------- Planificador ----------
+def budgeted_pipeline(jobs: List[Job], compute: Callable, budget_bytes: Optional[int] = None,
+                      workers: Optional[int] = None) -> "pipeline.Pipeline":
+    """
+    Pipeline cuyos cálculos se admiten con la estimación de cada trabajo contra
+    budget_bytes (ByteBudget de pipeline: un trabajo que no cabe ni solo pasa
+    cuando no hay nada más en vuelo). Pásale a run() las rutas en el orden de
+    make_jobs(), el más grande primero. Es el mismo mecanismo en el GUI y en main().
+    """
+    est = {j.path: j.est_bytes for j in jobs}
+    return pipeline.Pipeline(compute, workers=workers or WORKERS, cost=lambda p: est.get(p, 0),
+                             budget_bytes=budget_bytes or default_budget())
+
+
+def format_result(res: JobResult) -> str:
+    est = res.job.est_bytes / MB
+    real = f"{res.actual_bytes / MB:.0f} MB" if res.actual_bytes is not None else "n/d"
+    return f"est {est:.0f} MB / real {real}, {res.seconds:.1f}s"
+
+
+def summary_table(results: List[JobResult]) -> str:
+    lines = [f"{'archivo':<40} {'MPx':>6} {'est MB':>8} {'real MB':>8} {'s':>6}"]
+    for r in sorted(results, key=lambda r: r.job.est_bytes, reverse=True):
+        info = r.job.info
+        mpx = info.width * info.height / 1e6 if info else 0
+        real = f"{r.actual_bytes / MB:8.0f}" if r.actual_bytes is not None else f"{'n/d':>8}"
+        lines.append(f"{os.path.basename(r.job.path)[:40]:<40} {mpx:6.1f} {r.job.est_bytes / MB:8.0f} {real} {r.seconds:6.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    import discovery
+    import watch_folder as wf
+    ap = argparse.ArgumentParser(description="Procesa una carpeta en paralelo con presupuesto de memoria")
+    ap.add_argument("tool", choices=sorted(ESTIMATORS))
+    ap.add_argument("folder")
+    ap.add_argument("out")
+    ap.add_argument("--budget-mb", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--estimate-only", action="store_true", help="sólo muestra las estimaciones")
+    args = ap.parse_args()
+    tool = wf.TOOLS[args.tool]
+    paths = [e.path for e in discovery.scan_media(args.folder, recursive=False, exts=tool.exts)]
+    jobs = make_jobs(paths, args.tool)
+    budget = args.budget_mb * MB if args.budget_mb else default_budget()
+    print(f"🧮 {len(jobs)} archivos, presupuesto {budget / MB:.0f} MB")
+    if args.estimate_only:
+        for j in jobs:
+            print(f"   {os.path.basename(j.path)}: {j.est_bytes / MB:.0f} MB")
+        return 0
+    os.makedirs(args.out, exist_ok=True)
+    prior = None
+    if args.tool == "split":
+        import split_half_frames as sf
+        prior = sf.batch_prior(paths)
+    render = pipeline.renderer(args.tool, args.out, prior)
+    rss = RssSampler()
+    actual = {}
+
+    def compute(p, buf):
+        rss.begin(p)
+        try:
+            return render(p, buf)
+        finally:
+            actual[p] = rss.end(p)
+
+    by_path = {j.path: j for j in jobs}
+    results: List[JobResult] = []
+
+    def on_done(res):
+        r = JobResult(by_path[res.path], res.compute_s, actual.get(res.path), res.error)
+        results.append(r)
+        print(f"{'❌' if r.error else '✅'} {os.path.basename(r.job.path)} "
+              f"({format_result(r)}){': ' + str(r.error) if r.error else ''}")
+
+    pipe = budgeted_pipeline(jobs, compute, budget, args.workers)
+    with rss:
+        pipe.run([j.path for j in jobs], on_done=on_done)
+    print("\n" + summary_table(results))
+    print("\n" + pipe.stats_table())
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
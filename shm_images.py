@@ -0,0 +1,477 @@
+# shm_images.py
+"""
+Transporte de imágenes entre procesos por memoria compartida.
+
+Con un pool de procesos, pasar un escaneo decodificado de un worker a otro
+significa picklearlo: 50 MP en RGB son 150 MB que se copian a un buffer, se
+escriben por una tubería, se leen y se vuelven a copiar al deshacer el pickle.
+En escaneos de 100 MB eso cuesta tanto como el propio proceso. Aquí los
+píxeles viven en un segmento de multiprocessing.shared_memory y entre
+procesos sólo viaja un ImageRef (nombre del segmento, tamaño y modo, unos
+100 bytes):
+
+  - share(img) copia los píxeles una vez al segmento (por franjas, sin un
+    buffer temporal del tamaño de la imagen);
+  - attach(ref) da una vista NumPy (.array) y una imagen Pillow (.image())
+    sobre la misma memoria, sin copiar (también la de un recorte, con
+    stride). RGB se guarda como RGBX porque es la disposición interna de
+    Pillow: así frombuffer() no necesita copiar;
+  - cada segmento lleva un contador de referencias en la cabecera. retain()
+    lo sube, release() lo baja y el que lo deja a cero hace unlink(), esté en
+    el proceso que esté. Si un worker muere, cleanup_leaked() borra los
+    segmentos huérfanos de la sesión.
+
+run() encadena tres pools (decodificar → calcular → codificar y escribir)
+para split_half_frame, convert_tiff y process_image usando este transporte.
+El corte de split_half_frame ni siquiera crea segmentos nuevos: las mitades
+son cajas (ImageRef.box) sobre el escaneo original.
+
+    python shm_images.py run split scans/ splits/
+    python shm_images.py cleanup
+    python bench_tools.py transport --sizes 24,50    # pickle frente a memoria compartida
+"""
+import os
+import sys
+import glob
+import time
+import queue
+import secrets
+import argparse
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+import profiling as prof
+import pipeline
+
+DECODE_WORKERS  = 2          # procesos que leen y decodifican
+COMPUTE_WORKERS = None       # procesos de cálculo; None = os.cpu_count()
+ENCODE_WORKERS  = 2          # procesos que codifican y escriben
+IN_FLIGHT       = 4          # archivos entre decodificar y escribir (cada uno ocupa su segmento)
+SHARE_BAND_ROWS = 256        # filas copiadas por paso en share()
+
+NAME_PREFIX = "ptimg_"       # los nombres POSIX de memoria compartida no pueden pasar de 31 caracteres en macOS
+HEADER_BYTES = 64            # contador de referencias (int64) + relleno; los píxeles empiezan alineados
+
+# modo de la imagen → (disposición en memoria, bytes por píxel)
+_LAYOUTS = {"L": ("L", 1), "RGB": ("RGBX", 4), "RGBA": ("RGBA", 4)}
+
+_lock = None                 # protege los contadores de referencias entre procesos
+_session = None              # prefijo de los segmentos de este run (para cleanup_leaked)
+
+
+class ImageRef(NamedTuple):
+    """Lo único que viaja entre procesos: el nombre del segmento y cómo leerlo."""
+    name: str
+    size: Tuple[int, int]                        # (ancho, alto) del segmento completo
+    mode: str                                    # "L" | "RGB" | "RGBA"
+    box: Optional[Tuple[int, int, int, int]] = None   # recorte sobre el segmento (sin copiar)
+
+    def nbytes(self) -> int:
+        return self.size[0] * self.size[1] * _LAYOUTS[self.mode][1]
+
+
+def init_worker(lock, session):
+    """initializer de los pools: el lock de los contadores y la sesión del proceso padre."""
+    global _lock, _session
+    _lock, _session = lock, session
+
+
+def _get_lock(mp_context=None):
+    """El lock sale del mismo contexto (fork/spawn) que los pools que lo heredan."""
+    global _lock
+    if _lock is None:
+        _lock = (mp_context or mp.get_context()).Lock()
+    return _lock
+
+
+def _get_session() -> str:
+    global _session
+    if _session is None:
+        _session = f"{os.getpid():x}"
+    return _session
+
+
+def process_pool(workers: int, mp_context=None) -> ProcessPoolExecutor:
+    """ProcessPoolExecutor cuyos procesos comparten el lock y la sesión de este."""
+    if os.name == "posix":
+        # un único resource_tracker para todos: si cada worker arranca el suyo, el que
+        # registra un segmento no es el que ve su unlink() y avisa de "leaked" al salir
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()
+    return ProcessPoolExecutor(max_workers=max(1, workers), mp_context=mp_context,
+                               initializer=init_worker, initargs=(_get_lock(mp_context), _get_session()))
+
+
+def _counter(shm):
+    return np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+
+
+def share(img: Image.Image, refs: int = 1) -> ImageRef:
+    """Copia img a un segmento nuevo con `refs` referencias (cada dueño hará un release())."""
+    if img.mode not in _LAYOUTS:
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    layout, bpp = _LAYOUTS[img.mode]
+    w, h = img.size
+    name = f"{NAME_PREFIX}{_get_session()}_{secrets.token_hex(4)}"
+    with prof.stage("shm_share") as st:
+        # una fila de más: un recorte con stride puede leer hasta una fila entera pasado el final
+        shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_BYTES + (h + 1) * w * bpp)
+        try:
+            _counter(shm)[0] = refs
+            row = w * bpp
+            for y in range(0, h, SHARE_BAND_ROWS):
+                y1 = min(h, y + SHARE_BAND_ROWS)
+                band = img.crop((0, y, w, y1)).tobytes("raw", layout)
+                shm.buf[HEADER_BYTES + y * row:HEADER_BYTES + y1 * row] = band
+                del band
+            st.add_bytes(w * h * bpp)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        shm.close()
+    return ImageRef(name, (w, h), img.mode)
+
+
+class SharedImage:
+    """
+    Vista sobre un segmento. Hay que soltar las imágenes y arrays obtenidos
+    antes de close() (o salir del with): Pillow y NumPy apuntan a esa memoria.
+    """
+
+    def __init__(self, ref: ImageRef):
+        self.ref = ref
+        self.shm = shared_memory.SharedMemory(name=ref.name)
+        w, h = ref.size
+        bpp = _LAYOUTS[ref.mode][1]
+        self._pixels = self.shm.buf[HEADER_BYTES:HEADER_BYTES + (h + 1) * w * bpp]
+        self.array = np.ndarray((h, w, bpp), dtype=np.uint8, buffer=self._pixels)
+        if ref.box:
+            x0, y0, x1, y1 = ref.box
+            self.array = self.array[y0:y1, x0:x1]
+
+    def image(self) -> Image.Image:
+        """Imagen Pillow de sólo lectura sobre el segmento (RGB se ve como RGBX), o sobre ref.box."""
+        layout, bpp = _LAYOUTS[self.ref.mode]
+        w = self.ref.size[0]
+        x0, y0, x1, y1 = self.ref.box or (0, 0, w, self.ref.size[1])
+        start = (y0 * w + x0) * bpp
+        return Image.frombuffer(layout, (x1 - x0, y1 - y0), self._pixels[start:], "raw", layout, w * bpp, 1)
+
+    def close(self):
+        self.array = None
+        self._pixels.release()
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(ref: ImageRef) -> SharedImage:
+    return SharedImage(ref)
+
+
+def _add_refs(ref: ImageRef, n: int) -> int:
+    shm = shared_memory.SharedMemory(name=ref.name)
+    counter = _counter(shm)
+    try:
+        with _get_lock():
+            counter[0] += n
+            left = int(counter[0])
+    finally:
+        del counter
+        shm.close()
+    if left <= 0:
+        shm.unlink()
+    return left
+
+
+def retain(ref: ImageRef, n: int = 1) -> int:
+    """n dueños más (p. ej. una tarea por cada recorte que se reparte)."""
+    return _add_refs(ref, n)
+
+
+def release(ref: ImageRef) -> int:
+    """Suelta una referencia; con la última se borra el segmento. Devuelve las que quedan."""
+    return _add_refs(ref, -1)
+
+
+def cleanup_leaked(session: Optional[str] = None) -> int:
+    """
+    Borra los segmentos de una sesión (o todos los de Photo Tools) que siguen
+    vivos, p. ej. tras un worker muerto a media tarea. Sólo donde los segmentos
+    se pueden listar (/dev/shm en Linux); en Windows desaparecen solos al
+    cerrarse el último handle.
+    """
+    if not os.path.isdir("/dev/shm"):
+        return 0
+    pattern = f"{NAME_PREFIX}{session}_*" if session else f"{NAME_PREFIX}*"
+    removed = 0
+    for path in glob.glob(os.path.join("/dev/shm", pattern)):
+        try:
+            shm = shared_memory.SharedMemory(name=os.path.basename(path))
+        except FileNotFoundError:
+            continue
+        shm.close()
+        try:
+            shm.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+# ---------- Etapas por herramienta (se ejecutan en los pools) ----------
+class Job(NamedTuple):
+    """Una salida pendiente de codificar: ruta, imagen compartida y codificador."""
+    out_path: str
+    ref: ImageRef
+    encode: str              # "split" | "frames" | "tiff"
+
+
+def _decode(tool: str, path: str) -> List[ImageRef]:
+    with prof.stage("decode", path) as st:
+        st.add_bytes(os.path.getsize(path))
+        if tool == "split":
+            imgs = [Image.open(path).convert("RGB")]
+        elif tool == "frames":
+            import frames_pic as fp
+            imgs = [fp.load_prepared(path)]
+        elif tool == "tiff":
+            import tiff_to_jpeg as tj
+            from PIL import ImageSequence
+            with Image.open(path) as im:
+                imgs = [tj.flatten_if_alpha(frame.copy()) for frame in ImageSequence.Iterator(im)]
+        else:
+            raise ValueError(f"Herramienta desconocida: {tool}")
+    refs = []
+    try:
+        while imgs:
+            refs.append(share(imgs.pop(0)))
+    except BaseException:
+        for r in refs:
+            release(r)
+        raise
+    return refs
+
+
+def _compute_split(path, out_dir, ref, prior=None) -> List[Job]:
+    import split_half_frames as sf
+    with attach(ref) as sh:
+        img = sh.image()
+        with prof.stage("find_split", path):
+            if sf.FRAMES == 2:
+                cuts = [sf.locate_split(img, prior=prior)]
+            else:
+                cuts = sf.find_gaps(img, sf.FRAMES)
+        with prof.stage("crop_trim", path):
+            profile = np.asarray(img.convert("L")).mean(axis=0)
+        del img
+    w, h = ref.size
+    edges = [0] + cuts + [w]
+    boxes = []
+    for a, b in zip(edges, edges[1:]):
+        bounds = sf.black_edge_bounds(profile[a:b])
+        boxes.append((a + bounds[0], 0, a + bounds[1], h) if bounds else (a, 0, b, h))
+    retain(ref, len(boxes))  # cada mitad es una caja sobre el mismo segmento
+    return [Job(p, ref._replace(box=box), "split")
+            for p, box in zip(sf.output_paths(path, out_dir), boxes)]
+
+
+def _compute_frames(path, out_dir, ref) -> List[Job]:
+    import frames_pic as fp
+    import resampling
+    with attach(ref) as sh:
+        img = sh.image()
+        canvas_size, new_size = fp.frame_layout(*img.size)
+        if new_size != img.size:
+            with prof.stage("resize", path):
+                img = resampling.resize(img, new_size)
+        canvas = fp.compose_frame(img, canvas_size, path)
+        del img
+    name = os.path.splitext(os.path.basename(path))[0]
+    return [Job(os.path.join(out_dir, f"{name}_blog.jpg"), share(canvas), "frames")]
+
+
+def _compute_tiff(path, out_dir, refs) -> List[Job]:
+    import tiff_to_jpeg as tj
+    base = os.path.splitext(os.path.basename(path))[0]
+    jobs = []
+    try:
+        for i, ref in enumerate(refs, start=1):
+            with attach(ref) as sh:
+                with prof.stage("resize", path):
+                    img = tj.resize_to_long_edge(sh.image(), tj.MAX_LONG_EDGE)
+                out = share(img)
+                del img
+            jobs.append(Job(os.path.join(out_dir, tj._out_name(base, i, len(refs))), out, "tiff"))
+    except BaseException:
+        for j in jobs:
+            release(j.ref)
+        raise
+    return jobs
+
+
+def _compute(tool: str, path: str, out_dir: str, refs: List[ImageRef], prior=None) -> List[Job]:
+    """Dueña de refs: los suelta pase lo que pase; los Job devueltos son de quien los codifique."""
+    try:
+        if tool == "split":
+            return _compute_split(path, out_dir, refs[0], prior)
+        if tool == "frames":
+            return _compute_frames(path, out_dir, refs[0])
+        if tool == "tiff":
+            return _compute_tiff(path, out_dir, refs)
+        raise ValueError(f"Herramienta desconocida: {tool}")
+    finally:
+        for r in refs:
+            release(r)
+
+
+def _encode(path: str, job: Job) -> Tuple[str, Tuple[int, int]]:
+    """Codifica y escribe una salida; suelta su referencia."""
+    try:
+        with attach(job.ref) as sh:
+            img = sh.image()
+            size = img.size
+            if job.encode == "tiff":
+                import tiff_to_jpeg as tj
+                data = tj.encode_light(img, path)
+            elif job.encode == "frames":
+                import frames_pic as fp
+                data = fp.encode_frame(img, path)
+            else:
+                with prof.stage("encode", path) as st:
+                    data = pipeline.encode_jpeg(img, quality=95, subsampling=0)
+                    st.add_bytes(len(data))
+            del img
+        pipeline.write_outputs([pipeline.Output(job.out_path, data, size)], path)
+        return job.out_path, size
+    finally:
+        release(job.ref)
+
+
+# ---------- Orquestación ----------
+class ShmResult(NamedTuple):
+    path: str
+    error: Optional[BaseException]
+    outputs: List[Tuple[str, Tuple[int, int]]]   # (ruta escrita, tamaño)
+
+
+def run(paths: Sequence[str], tool: str, out_dir: str, workers: Optional[int] = None,
+        in_flight: int = IN_FLIGHT, on_done: Optional[Callable[[ShmResult], None]] = None) -> List[ShmResult]:
+    """
+    Procesa paths con tres pools de procesos que se pasan ImageRef en vez de
+    píxeles. on_done se llama desde el hilo que llama a run().
+    """
+    paths = list(paths)
+    if tool not in ("split", "frames", "tiff"):
+        raise ValueError(f"Herramienta desconocida: {tool}")
+    prior = None
+    if tool == "split":
+        import split_half_frames as sf
+        prior = sf.batch_prior(paths)  # se calcula aquí una vez y viaja (pickled) a cada worker
+    session = f"{os.getpid():x}{secrets.token_hex(2)}"
+    init_worker(_get_lock(), session)
+    slots = threading.Semaphore(max(1, in_flight))
+    events: "queue.Queue" = queue.Queue()
+    pools = [process_pool(DECODE_WORKERS),
+             process_pool(workers or COMPUTE_WORKERS or os.cpu_count() or 1),
+             process_pool(ENCODE_WORKERS)]
+    decoders, computers, encoders = pools
+
+    def finish(path, error, outputs):
+        slots.release()
+        events.put(ShmResult(path, error, outputs))
+
+    def after_encode(path, state, fut):
+        with state["lock"]:
+            err = fut.exception()
+            if err is not None:
+                state["error"] = state["error"] or err
+            else:
+                state["outputs"].append(fut.result())
+            state["left"] -= 1
+            last = state["left"] == 0
+        if last:
+            finish(path, state["error"], sorted(state["outputs"]))
+
+    def after_compute(path, fut):
+        err = fut.exception()
+        if err is not None:
+            return finish(path, err, [])
+        jobs = fut.result()
+        if not jobs:
+            return finish(path, None, [])
+        state = {"lock": threading.Lock(), "left": len(jobs), "error": None, "outputs": []}
+        for job in jobs:
+            encoders.submit(_encode, path, job).add_done_callback(
+                lambda f, p=path, s=state: after_encode(p, s, f))
+
+    def after_decode(path, fut):
+        err = fut.exception()
+        if err is not None:
+            return finish(path, err, [])
+        computers.submit(_compute, tool, path, out_dir, fut.result(), prior).add_done_callback(
+            lambda f, p=path: after_compute(p, f))
+
+    results: List[ShmResult] = []
+    try:
+        for p in paths:
+            slots.acquire()
+            decoders.submit(_decode, tool, p).add_done_callback(lambda f, p=p: after_decode(p, f))
+            while not events.empty():
+                results.append(events.get())
+                if on_done:
+                    on_done(results[-1])
+        while len(results) < len(paths):
+            results.append(events.get())
+            if on_done:
+                on_done(results[-1])
+    finally:
+        for pool in pools:
+            pool.shutdown(wait=True)
+        leaked = cleanup_leaked(session)
+        if leaked:
+            print(f"🧹 {leaked} segmento(s) de memoria compartida huérfanos borrados")
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Procesa imágenes con pools de procesos que comparten los píxeles en memoria")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="decodificar → calcular → codificar en procesos separados")
+    p_run.add_argument("tool", choices=("split", "frames", "tiff"))
+    p_run.add_argument("folder")
+    p_run.add_argument("out")
+    p_run.add_argument("--workers", type=int, default=None, help="procesos de cálculo")
+    p_run.add_argument("--in-flight", type=int, default=IN_FLIGHT)
+    sub.add_parser("cleanup", help="borra segmentos de memoria compartida huérfanos")
+    args = ap.parse_args()
+
+    if args.cmd == "cleanup":
+        print(f"🧹 {cleanup_leaked()} segmento(s) borrados")
+        return 0
+
+    import discovery
+    exts = (".tif", ".tiff") if args.tool == "tiff" else (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+    paths = [e.path for e in discovery.scan_media(args.folder, recursive=False, exts=exts)]
+    os.makedirs(args.out, exist_ok=True)
+    t0 = time.perf_counter()
+    results = run(paths, args.tool, args.out, workers=args.workers, in_flight=args.in_flight,
+                  on_done=lambda r: print(f"{'❌' if r.error else '✅'} {os.path.basename(r.path)}"
+                                          f"{': ' + str(r.error) if r.error else ''}"))
+    print(f"\n⏱️  {len(results)} archivo(s) en {time.perf_counter() - t0:.2f}s")
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# similarity.py
+"""
+Índice de similitud perceptual para casi-duplicados (dos escaneos del mismo
+negativo con distinta exposición o encuadre).
+
+Cada imagen se decodifica pequeña (draft() en JPEG) y se resume en dos hashes
+de 64 bits calculados con NumPy: dHash (gradientes) y pHash (DCT). El índice
+guarda los hashes en un array uint64 y resuelve consultas por distancia de
+Hamming con multi-index hashing: con radio r se parte el hash en r+1 trozos y,
+por el principio del palomar, dos hashes a distancia ≤ r coinciden exactamente
+en al menos un trozo. Sólo se comparan los candidatos de cada cubo, así que
+agrupar una biblioteca de 100k imágenes no es O(N²).
+"""
+import os
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import discovery
+
+IMAGE_EXTS    = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+DECODE_SIZE   = 64        # lado mínimo del decode reducido
+HASH_KIND     = "phash"   # "phash" (robusto a exposición) o "dhash"
+RADIUS        = 6         # bits distintos (de 64) para considerar casi-duplicado
+HASH_WORKERS  = 4
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # NumPy ≥ 2.0
+        return np.bitwise_count(x).astype(np.uint8)
+    x = np.ascontiguousarray(x, dtype=np.uint64)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# ---------- Hashes ----------
+def load_small(path: str, size: int = DECODE_SIZE):
+    """Decodifica en gris a ~size px usando draft() (JPEG: IDCT reducida, sin decodificar a tamaño completo)."""
+    from PIL import Image
+    with Image.open(path) as im:
+        im.draft("L", (size, size))
+        im = im.convert("L")
+        im.thumbnail((size * 2, size * 2), Image.BILINEAR, reducing_gap=2.0)
+        return im.copy()
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def dhash(gray) -> int:
+    from PIL import Image
+    a = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    return _bits_to_int(a[:, 1:] > a[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(gray) -> int:
+    from PIL import Image
+    a = np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    coeffs = (_DCT32 @ a @ _DCT32.T)[:8, :8]
+    med = np.median(coeffs.ravel()[1:])  # sin el término DC
+    return _bits_to_int(coeffs > med)
+
+
+def hash_file(path: str, kind: str = HASH_KIND) -> Optional[int]:
+    try:
+        gray = load_small(path)
+    except Exception:
+        return None
+    return phash(gray) if kind == "phash" else dhash(gray)
+
+
+def dhash_file(path: str) -> Optional[int]:
+    return hash_file(path, "dhash")
+
+
+# ---------- Índice ----------
+def _chunk_spans(radius: int) -> List[Tuple[int, int]]:
+    """Parte 64 bits en radius+1 trozos contiguos: [(shift, width), …]."""
+    m = max(1, min(64, radius + 1))
+    base, extra = divmod(64, m)
+    spans, shift = [], 0
+    for i in range(m):
+        w = base + (1 if i < extra else 0)
+        spans.append((shift, w))
+        shift += w
+    return spans
+
+
+class HashIndex:
+    """Hashes de 64 bits en un array uint64 + rutas paralelas."""
+
+    def __init__(self, paths: Sequence[str], hashes: Sequence[int]):
+        self.paths = list(paths)
+        self.hashes = np.array(hashes, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def build(cls, paths: Sequence[str], kind: str = HASH_KIND, workers: int = HASH_WORKERS,
+              cache: Optional[Dict[str, int]] = None) -> "HashIndex":
+        """Calcula (o toma de cache) el hash de cada ruta; las ilegibles se omiten."""
+        cache = cache if cache is not None else {}
+        todo = [p for p in paths if p not in cache]
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for p, h in zip(todo, ex.map(lambda p: hash_file(p, kind), todo)):
+                if h is not None:
+                    cache[p] = h
+        kept = [p for p in paths if p in cache]
+        return cls(kept, [cache[p] for p in kept])
+
+    def _chunks(self, shift, width):
+        mask = np.uint64((1 << width) - 1)
+        return (self.hashes >> np.uint64(shift)) & mask
+
+    def query(self, h: int, radius: int = RADIUS) -> List[Tuple[int, int]]:
+        """[(índice, distancia)] de los hashes a distancia ≤ radius de h."""
+        if not len(self):
+            return []
+        cand = np.zeros(len(self), dtype=bool)
+        for shift, width in _chunk_spans(radius):
+            cand |= self._chunks(shift, width) == ((h >> shift) & ((1 << width) - 1))
+        idx = np.nonzero(cand)[0]
+        d = popcount64(self.hashes[idx] ^ np.uint64(h))
+        keep = d <= radius
+        return list(zip(idx[keep].tolist(), d[keep].tolist()))
+
+    def pairs(self, radius: int = RADIUS) -> set:
+        """Todos los pares (i, j), i < j, a distancia ≤ radius, comparando sólo dentro de cada cubo."""
+        out = set()
+        n = len(self)
+        if n < 2:
+            return out
+        for shift, width in _chunk_spans(radius):
+            keys = self._chunks(shift, width)
+            order = np.argsort(keys, kind="stable")
+            sk = keys[order]
+            bounds = np.flatnonzero(np.diff(sk)) + 1
+            for grp in np.split(order, bounds):
+                if len(grp) < 2:
+                    continue
+                hs = self.hashes[grp]
+                d = popcount64(hs[:, None] ^ hs[None, :])
+                ii, jj = np.nonzero(np.triu(d <= radius, k=1))
+                for a, b in zip(grp[ii].tolist(), grp[jj].tolist()):
+                    out.add((a, b) if a < b else (b, a))
+        return out
+
+    def groups(self, radius: int = RADIUS) -> List[List[str]]:
+        """Componentes conexas de casi-duplicados (union-find sobre pairs())."""
+        parent = list(range(len(self)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in self.pairs(radius):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[rb] = ra
+        comps: Dict[int, List[str]] = {}
+        for i in range(len(self)):
+            comps.setdefault(find(i), []).append(self.paths[i])
+        return sorted((sorted(g) for g in comps.values() if len(g) > 1), key=lambda g: g[0])
+
+
+def similar_groups_by_folder(folder: str, recursive: bool = False, radius: int = RADIUS,
+                             kind: str = HASH_KIND, paths: Optional[Sequence[str]] = None) -> Dict[str, List[List[str]]]:
+    """{carpeta: [[ruta, ruta, …], …]} — los casi-duplicados no cruzan carpetas."""
+    if paths is None:
+        paths = [e.path for e in discovery.scan_media(folder, recursive=recursive, exts=IMAGE_EXTS)]
+    by_dir: Dict[str, List[str]] = {}
+    for p in paths:
+        by_dir.setdefault(os.path.dirname(p), []).append(p)
+    report = {}
+    for d, ps in sorted(by_dir.items()):
+        groups = HashIndex.build(ps, kind=kind).groups(radius)
+        if groups:
+            report[d] = groups
+    return report
+
+
+def format_report(report: Dict[str, List[List[str]]]) -> str:
+    lines = []
+    for d, groups in report.items():
+        lines.append(f"📁 {d} — {len(groups)} grupo(s) de casi-duplicados")
+        for g in groups:
+            lines.append("   ≈ " + ", ".join(os.path.basename(p) for p in g))
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Agrupa escaneos casi duplicados por carpeta")
+    ap.add_argument("folder")
+    ap.add_argument("--recursive", action="store_true")
+    ap.add_argument("--radius", type=int, default=RADIUS)
+    ap.add_argument("--kind", choices=("phash", "dhash"), default=HASH_KIND)
+    args = ap.parse_args()
+    report = similar_groups_by_folder(args.folder, args.recursive, args.radius, args.kind)
+    print(format_report(report) if report else "✅ Sin casi-duplicados")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
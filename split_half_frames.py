@@ -1,7 +1,12 @@
 import os
+import sys
+import string
 import numpy as np
 from PIL import Image
 
+import profiling as prof
+import pipeline
+
 # 🔧 Configuration: change these folder names if needed
 INPUT_FOLDER = "scans"
 OUTPUT_FOLDER = "splits"
@@ -11,11 +16,27 @@ THRESHOLD = 10   # darkness threshold for trimming (0=black, 255=white)
 MARGIN = 0.2     # ignore this fraction at each side when searching for divider
 WINDOW = 20      # refinement window size around the divider
 
+# Divider detection: the dark band is tens of px wide, so it is located on a
+# 1/DETECT_SCALE copy and only the columns around it are read at full resolution
+DETECT_SCALE = 8
+ROLL_PRIOR = False       # narrow the search with the median divider of the roll (see RollPrior)
+PRIOR_SEED_FRAMES = 5    # scans (in name order) measured without prior to seed a batch's RollPrior
+PRIOR_MIN_FRAMES = 3     # frames needed before the prior is used
+PRIOR_SPAN = 0.05        # ± fraction of the width searched around the prior
+PRIOR_TOLERANCE = 8.0    # ignore the prior if its minimum is this much brighter than the global one
+
+# Full strips: FRAMES > 2 cuts a 35 mm strip into N frames (_A.._F)
+FRAMES = 2               # frames per scan (2 = half-frame pair)
+GAP_SMOOTH = 24          # px (full resolution) of box smoothing for the column profile
+PITCH_TOLERANCE = 0.25   # each gap is searched within ± this fraction of the frame pitch
+
 
-def find_split_column(arr, margin=MARGIN, window=WINDOW):
+def find_split_column(arr, margin=None, window=None):
     """
     Find the vertical column with the darkest average (likely the divider).
     """
+    margin = MARGIN if margin is None else margin
+    window = WINDOW if window is None else window
     profile = arr.mean(axis=0)  # average brightness per column
     w = arr.shape[1]
 
@@ -33,14 +54,123 @@ def find_split_column(arr, margin=MARGIN, window=WINDOW):
     return refined
 
 
-def trim_black_edges(img, threshold=THRESHOLD):
+class RollPrior:
     """
-    Trim vertical black borders from a split image.
+    Median divider position (fraction of the width) of one batch (one folder = one roll).
+    It is measured once, before the batch, on its first PRIOR_SEED_FRAMES scans in name
+    order, and never updated: a file splits the same whatever order the workers finish in,
+    and on a resumed run.
     """
-    gray = img.convert("L")
-    arr = np.array(gray)
-    profile = arr.mean(axis=0)
 
+    def __init__(self, positions=()):
+        self.positions = list(positions)
+
+    @classmethod
+    def seed(cls, paths, n=None):
+        positions = []
+        for path in sorted(paths)[:n or PRIOR_SEED_FRAMES]:
+            try:
+                with Image.open(path) as im:
+                    img = im.convert("RGB")
+            except OSError:
+                continue  # the file will fail (and be reported) in the batch itself
+            positions.append(locate_split(img) / img.width)
+        return cls(positions)
+
+    def estimate(self):
+        if len(self.positions) < PRIOR_MIN_FRAMES:
+            return None
+        return float(np.median(self.positions))
+
+
+def batch_prior(paths):
+    """Fresh RollPrior for a batch of half-frame scans, or None if ROLL_PRIOR is off (or FRAMES > 2)."""
+    if not ROLL_PRIOR or FRAMES != 2:
+        return None
+    with prof.stage("roll_prior"):
+        return RollPrior.seed(paths)
+
+
+def locate_split(img, margin=None, window=None, prior=None, scale=None):
+    """
+    Finds the divider like find_split_column() on the full grayscale image, but
+    the search runs on a reduced copy and only 2*(window+scale) columns are read
+    at full resolution. prior: RollPrior of the roll, or None.
+    margin/window default to the module settings at call time (the GUI changes them).
+    """
+    margin = MARGIN if margin is None else margin
+    window = WINDOW if window is None else window
+    w, h = img.size
+    scale = scale or DETECT_SCALE
+    if min(w, h) < scale * 32:
+        scale = 1
+    small = img.reduce(scale) if scale > 1 else img
+    profile = np.asarray(small.convert("L"), dtype=np.float32).mean(axis=0)
+    sw = len(profile)
+    start, end = int(sw * margin), max(int(sw * (1 - margin)), int(sw * margin) + 1)
+    cand = start + int(np.argmin(profile[start:end]))
+
+    estimate = prior.estimate() if prior is not None else None
+    if estimate is not None:
+        lo = max(start, int((estimate - PRIOR_SPAN) * sw))
+        hi = min(end, int((estimate + PRIOR_SPAN) * sw) + 1)
+        if hi > lo:
+            near = lo + int(np.argmin(profile[lo:hi]))
+            if profile[near] <= profile[cand] + PRIOR_TOLERANCE:
+                cand = near  # a dark detail elsewhere in the picture does not win over the roll's divider
+
+    # refine at full resolution, only around the candidate
+    full_start, full_end = int(w * margin), int(w * (1 - margin))
+    x0 = max(full_start, cand * scale - window - scale)
+    x1 = min(full_end, (cand + 1) * scale + window)
+    if x1 <= x0:
+        x0, x1 = full_start, max(full_end, full_start + 1)
+    strip = np.asarray(img.crop((x0, 0, x1, h)).convert("L"), dtype=np.float32)
+    return x0 + int(np.argmin(strip.mean(axis=0)))
+
+
+def find_gaps(img, frames, window=None, scale=None, threshold=None):
+    """
+    Columns where a strip of `frames` frames must be cut (frames - 1 values).
+    The smoothed column profile of a reduced copy gives the lit extent of the
+    strip and so the expected pitch; every gap is the darkest column within
+    ± PITCH_TOLERANCE of its expected position (all gaps at once, vectorized),
+    then refined at full resolution like locate_split().
+    """
+    window = WINDOW if window is None else window
+    threshold = THRESHOLD if threshold is None else threshold
+    w, h = img.size
+    scale = scale or DETECT_SCALE
+    if min(w, h) < scale * 32:
+        scale = 1
+    small = img.reduce(scale) if scale > 1 else img
+    profile = np.asarray(small.convert("L"), dtype=np.float32).mean(axis=0)
+    k = max(1, GAP_SMOOTH // scale)
+    smooth = np.convolve(profile, np.ones(k, dtype=np.float32) / k, mode="same")
+    sw = len(smooth)
+
+    # film leader / scanner bed at the ends does not count towards the pitch
+    lit = np.flatnonzero(smooth >= threshold)
+    left, right = (int(lit[0]), int(lit[-1]) + 1) if len(lit) else (0, sw)
+    pitch = (right - left) / frames
+    expected = np.round(left + pitch * np.arange(1, frames)).astype(np.int64)
+    half = max(1, int(pitch * PITCH_TOLERANCE))
+    idx = np.clip(expected[:, None] + np.arange(-half, half + 1)[None, :], 0, sw - 1)
+    coarse = idx[np.arange(len(idx)), np.argmin(smooth[idx], axis=1)]
+
+    cuts = []
+    for c in coarse:
+        x0 = max(0, int(c) * scale - window - scale)
+        x1 = min(w, (int(c) + 1) * scale + window)
+        strip = np.asarray(img.crop((x0, 0, x1, h)).convert("L"), dtype=np.float32)
+        cut = x0 + int(np.argmin(strip.mean(axis=0)))
+        cuts.append(max(cut, cuts[-1] + 1) if cuts else cut)
+    return cuts
+
+
+def black_edge_bounds(profile, threshold=None):
+    """(left, right) columns to keep given a column brightness profile, or None if nothing is lit."""
+    threshold = THRESHOLD if threshold is None else threshold
     left = 0
     while left < len(profile) and profile[left] < threshold:
         left += 1
@@ -49,42 +179,95 @@ def trim_black_edges(img, threshold=THRESHOLD):
     while right > 0 and profile[right] < threshold:
         right -= 1
 
-    if right > left:
-        img = img.crop((left, 0, right, img.height))
+    return (left, right) if right > left else None
+
+
+def trim_black_edges(img, threshold=None):
+    """
+    Trim vertical black borders from a split image.
+    """
+    gray = img.convert("L")
+    arr = np.array(gray)
+    profile = arr.mean(axis=0)
+
+    bounds = black_edge_bounds(profile, threshold)
+    if bounds:
+        img = img.crop((bounds[0], 0, bounds[1], img.height))
     return img
 
 
-def split_half_frame(img_path, output_folder):
-    """Split one lab scan into two half-frame images and trim black edges."""
-    img_gray = Image.open(img_path).convert("L")
-    arr = np.array(img_gray)
+def _suffixes(frames=None):
+    n = frames or FRAMES
+    if not 2 <= n <= len(string.ascii_uppercase):
+        raise ValueError(f"frames must be between 2 and {len(string.ascii_uppercase)}, not {n}")
+    return string.ascii_uppercase[:n]
 
-    split_col = find_split_column(arr)
 
-    img_color = Image.open(img_path).convert("RGB")
-    left_img = img_color.crop((0, 0, split_col, img_color.height))
-    right_img = img_color.crop((split_col, 0, img_color.width, img_color.height))
+def output_paths(img_path, output_folder, frames=None):
+    """Rutas _A/_B (… _F con FRAMES > 2) que split_half_frame() escribirá para img_path."""
+    basename = os.path.splitext(os.path.basename(img_path))[0]
+    return [os.path.join(output_folder, f"{basename}_{s}.jpg") for s in _suffixes(frames)]
 
-    # trim leftover dark bands
-    left_img = trim_black_edges(left_img)
-    right_img = trim_black_edges(right_img)
 
-    # save
+def split_half_frame(img_path, output_folder, frames=None, prior=None):
+    """Split one lab scan into two half-frame images (or a strip into FRAMES frames) and trim black edges."""
+    pipeline.write_outputs(render_split(img_path, output_folder, frames=frames, prior=prior), img_path)
     basename = os.path.splitext(os.path.basename(img_path))[0]
-    left_img.save(os.path.join(output_folder, f"{basename}_A.jpg"), quality=95, subsampling=0)
-    right_img.save(os.path.join(output_folder, f"{basename}_B.jpg"), quality=95, subsampling=0)
+    print(f"✅ {basename} → " + " + ".join(f"{basename}_{s}.jpg" for s in _suffixes(frames)))
+
+
+def render_split(src, output_folder, img_path=None, frames=None, prior=None):
+    """
+    Like split_half_frame but returns the encoded frames ([pipeline.Output])
+    instead of writing them. src may be a path or an in-memory file.
+    prior: the batch's RollPrior (batch_prior()), or None.
+    """
+    frames = frames or FRAMES
+    threshold, margin, window = THRESHOLD, MARGIN, WINDOW  # the settings of this call, read once
+    img_path = img_path or src
+    # one decode: detection works on a reduced copy of the colour image
+    with prof.stage("decode", img_path) as st:
+        img_color = Image.open(src).convert("RGB")
+        if isinstance(src, str):
+            st.add_bytes(os.path.getsize(img_path))
+
+    with prof.stage("find_split", img_path):
+        if frames == 2:
+            cuts = [locate_split(img_color, margin=margin, window=window, prior=prior)]
+        else:
+            cuts = find_gaps(img_color, frames, window=window, threshold=threshold)
+    with prof.stage("crop_trim", img_path):
+        edges = [0] + cuts + [img_color.width]
+        # trim leftover dark bands
+        parts = [trim_black_edges(img_color.crop((a, 0, b, img_color.height)), threshold)
+                 for a, b in zip(edges, edges[1:])]
 
-    print(f"✅ {basename} → {basename}_A.jpg + {basename}_B.jpg")
+    # encode
+    outputs = []
+    with prof.stage("encode", img_path) as st:
+        for out_path, part in zip(output_paths(img_path, output_folder, frames), parts):
+            data = pipeline.encode_jpeg(part, quality=95, subsampling=0)
+            st.add_bytes(len(data))
+            outputs.append(pipeline.Output(out_path, data, part.size))
+    return outputs
 
 
 def main():
+    global FRAMES
+    if len(sys.argv) > 1:
+        FRAMES = int(sys.argv[1])  # python split_half_frames.py 6  → strips of 6 frames
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-    for file in os.listdir(INPUT_FOLDER):
-        if file.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".tiff")):
-            split_half_frame(os.path.join(INPUT_FOLDER, file), OUTPUT_FOLDER)
+    paths = [os.path.join(INPUT_FOLDER, file) for file in sorted(os.listdir(INPUT_FOLDER))
+             if file.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".tiff"))]
+    prior = batch_prior(paths)
+    for path in paths:
+        split_half_frame(path, OUTPUT_FOLDER, prior=prior)
 
     print(f"\n🎞️ All done! Split images saved in: {OUTPUT_FOLDER}")
+    if prof.is_enabled():
+        print("\n" + prof.summary_table())
+        prof.export_all(OUTPUT_FOLDER)
 
 
 if __name__ == "__main__":
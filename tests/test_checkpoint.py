@@ -0,0 +1,48 @@
+import checkpoint as ck
+
+SETTINGS = {"inp": "scans", "quality": 90}
+ITEMS = [f"scan_{i:04d}.tif" for i in range(6)]
+
+
+def test_failed_items_are_retried_and_batch_stays_open(tmp_path):
+    cp = ck.Checkpoint.open(str(tmp_path), "tiff", SETTINGS)
+    for it in ITEMS[:3]:
+        cp.begin(it)
+        cp.finish(it, True)
+    for it in ITEMS[3:]:  # el NAS se cae: el resto falla rápido
+        cp.begin(it)
+        cp.finish(it, False)
+    assert cp.complete() is False
+
+    again = ck.Checkpoint.open(str(tmp_path), "tiff", SETTINGS)
+    assert again.resumed
+    assert again.failed_before == 3
+    assert again.pending(ITEMS) == ITEMS[3:]
+    for it in ITEMS[3:]:
+        again.begin(it)
+        again.finish(it, True)
+    assert again.complete() is True
+
+    fresh = ck.Checkpoint.open(str(tmp_path), "tiff", SETTINGS)
+    assert not fresh.resumed
+    assert fresh.pending(ITEMS) == ITEMS
+
+
+def test_inflight_items_are_revalidated(tmp_path):
+    cp = ck.Checkpoint.open(str(tmp_path), "tiff", SETTINGS)
+    cp.begin(ITEMS[0])
+    cp.finish(ITEMS[0], True)
+    cp.begin(ITEMS[1])
+    cp.begin(ITEMS[2])
+    cp.close()  # se cae a media escritura
+
+    again = ck.Checkpoint.open(str(tmp_path), "tiff", SETTINGS)
+    assert again.pending(ITEMS, validate=lambda it: it == ITEMS[1]) == ITEMS[2:]
+
+
+def test_discard_closes_batch_with_failures(tmp_path):
+    cp = ck.Checkpoint.open(str(tmp_path), "tiff", SETTINGS)
+    cp.begin(ITEMS[0])
+    cp.finish(ITEMS[0], False)
+    cp.discard()
+    assert ck.Checkpoint.resume(str(tmp_path), "tiff", SETTINGS) is None
@@ -0,0 +1,39 @@
+from PIL import Image
+
+import distributed as dist
+
+
+def _worker(tmp_path, render):
+    inp, out = tmp_path / "in", tmp_path / "out"
+    inp.mkdir()
+    Image.new("RGB", (64, 48)).save(inp / "a.tif")
+    w = dist.DistributedWorker("tiff", str(inp), str(out), workers=1, poll=0.01, on_event=lambda *a: None)
+    w.render = render
+    return w, str(out)
+
+
+def test_failed_item_is_retried_until_it_succeeds(tmp_path):
+    calls = []
+
+    def flaky(src, buf):
+        calls.append(src)
+        if len(calls) < dist.MAX_ATTEMPTS:
+            raise OSError("NAS no disponible")
+        return []
+
+    w, out = _worker(tmp_path, flaky)
+    assert w.run() == (1, 0)
+    assert len(calls) == dist.MAX_ATTEMPTS
+    s = dist.status(out, "tiff")
+    assert (s["done"], s["failed"]) == (1, 0)
+
+
+def test_item_gives_up_after_max_attempts_and_retry_failed_requeues(tmp_path):
+    def broken(src, buf):
+        raise ValueError("archivo corrupto")
+
+    w, out = _worker(tmp_path, broken)
+    assert w.run() == (0, 1)
+    assert dist.status(out, "tiff")["failed"] == 1
+    assert dist.LeaseDir(dist.lease_dir(out, "tiff"), "t").clear_failed() == 1
+    assert dist.status(out, "tiff")["pending"] == 1
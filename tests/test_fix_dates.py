@@ -0,0 +1,80 @@
+import os
+
+import pytest
+from PIL import Image
+
+import fix_dates as fd
+
+
+def _jpeg(path, original=None, create=None):
+    img = Image.new("RGB", (32, 32), (120, 80, 40))
+    exif = img.getexif()
+    ifd = exif.get_ifd(0x8769)
+    if original:
+        ifd[0x9003] = original
+    if create:
+        ifd[0x9004] = create
+    img.save(path, exif=exif)
+    return str(path)
+
+
+def test_native_reader_uses_best_datetime_names(tmp_path):
+    p = _jpeg(tmp_path / "a.jpg", original="2021:06:05 10:11:12", create="2021:06:05 10:11:13")
+    md = fd.read_header_dates(p)
+    assert md == {"EXIF:DateTimeOriginal": "2021:06:05 10:11:12", "EXIF:CreateDate": "2021:06:05 10:11:13"}
+    assert set(md) <= set(fd.DATE_TAGS)
+    assert fd.get_best_datetime(p) == ("EXIF:DateTimeOriginal", "2021:06:05 10:11:12")
+
+
+def test_native_reader_without_dates_falls_back(tmp_path):
+    p = _jpeg(tmp_path / "b.jpg")
+    assert fd.read_header_dates(p) is None
+
+
+@pytest.mark.skipif(not fd.has_exiftool(), reason="exiftool no instalado")
+@pytest.mark.parametrize("dates", [("2021:06:05 10:11:12", "2021:06:05 10:11:13"),
+                                   (None, "2019:01:02 03:04:05")])
+def test_native_and_exiftool_agree(tmp_path, monkeypatch, dates):
+    p = _jpeg(tmp_path / "c.jpg", *dates)
+    native = fd.get_best_datetime(p)
+    monkeypatch.setattr(fd, "NATIVE_READERS", False)
+    assert fd.get_best_datetime(p) == native
+    md = fd.read_metadata(p)
+    assert {t: md[t] for t in fd.DATE_TAGS if t in md} == fd.read_header_dates(p)
+
+
+def test_write_command_uses_planned_value(tmp_path):
+    p = _jpeg(tmp_path / "d.jpg", original="2021:06:05 10:11:12")
+    item = fd.plan_file(p)
+    cmd = fd.write_command(item)
+    assert "-AllDates=2021:06:05 10:11:12" in cmd
+    assert "-FileModifyDate=2021:06:05 10:11:12" in cmd
+    assert not [a for a in cmd[1:] if "<" in a]  # nada se copia de los tags del archivo
+
+
+def _mov(path, utc):
+    import struct
+    from datetime import datetime, timezone
+    secs = int((utc - datetime(1904, 1, 1, tzinfo=timezone.utc)).total_seconds())
+    mvhd = struct.pack(">I4sIIIII", 108, b"mvhd", 0, secs, secs, 600, 0) + b"\0" * 80
+    moov = struct.pack(">I4s", 8 + len(mvhd), b"moov") + mvhd
+    ftyp = struct.pack(">I4s4sI4s", 20, b"ftyp", b"qt  ", 0, b"qt  ")
+    path.write_bytes(ftyp + moov + struct.pack(">I4s", 8, b"mdat"))
+    return str(path)
+
+
+def test_video_target_is_local_time_and_written_as_such(tmp_path):
+    from datetime import datetime, timezone
+    utc = datetime(2020, 3, 4, 12, 0, 0, tzinfo=timezone.utc)
+    local = utc.astimezone().replace(tzinfo=None).strftime("%Y:%m:%d %H:%M:%S")
+    p = _mov(tmp_path / "v.mov", utc)
+    item = fd.plan_file(p)
+    assert (item.tag, item.target) == ("QuickTime:CreateDate", local)
+    cmd = fd.write_command(item)
+    assert cmd[1:4] == ["-overwrite_original", "-api", "QuickTimeUTC=1"]
+    assert f"-FileModifyDate={local}" in cmd
+    if fd.has_exiftool():
+        ok, msg = fd.apply_item(item)
+        assert ok, msg
+        assert datetime.fromtimestamp(os.stat(p).st_mtime).strftime("%Y:%m:%d %H:%M:%S") == local
+        assert fd.read_metadata(p)["QuickTime:CreateDate"] == local
@@ -0,0 +1,31 @@
+import numpy as np
+from PIL import Image
+
+import jpeg_size as js
+import pipeline
+
+
+def _noisy(seed, size=(640, 576)):
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray(rng.integers(0, 255, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8))
+    arr = np.asarray(base.resize(size, Image.BICUBIC), dtype=np.float32) + rng.normal(0, 6, (size[1], size[0], 3))
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+
+def test_returns_highest_quality_that_fits():
+    for seed in range(4):
+        img = _noisy(seed)
+        limit = len(pipeline.encode_jpeg(img, quality=80))
+        res = js.encode_max_bytes(img, limit)
+        assert res.fits and len(res.data) <= limit
+        assert len(pipeline.encode_jpeg(img, quality=res.quality + 1)) > limit
+        assert res.encodes <= js.MAX_ENCODES
+
+
+def test_result_does_not_depend_on_previous_images():
+    img = _noisy(7)
+    limit = len(pipeline.encode_jpeg(img, quality=70))
+    first = js.encode_max_bytes(img, limit)
+    for seed in range(3):  # otras imágenes antes: nada aprendido pasa a la siguiente
+        js.encode_max_bytes(_noisy(seed, (704, 512)), limit // 3)
+    assert js.encode_max_bytes(img, limit) == first
@@ -0,0 +1,26 @@
+import threading
+
+import pytest
+
+import pipeline
+
+
+def test_callback_error_stops_all_threads(tmp_path):
+    paths = []
+    for i in range(40):
+        p = tmp_path / f"{i:02d}.bin"
+        p.write_bytes(b"x" * 1024)
+        paths.append(str(p))
+    pipe = pipeline.Pipeline(lambda p, buf: [], io_threads=2, workers=2, writers=1,
+                             read_ahead=1, write_queue=1, read_ahead_mb=None)
+    seen = []
+
+    def on_done(res):
+        seen.append(res.path)
+        if len(seen) == 3:
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        pipe.run(paths, on_done=on_done)
+    assert not [t for t in threading.enumerate() if t.name.startswith("pipe-")]
+    assert len(seen) == 3
@@ -0,0 +1,37 @@
+from PIL import Image, ImageDraw
+
+import split_half_frames as sf
+
+
+def _scan(path, divider):
+    img = Image.new("RGB", (800, 300), (180, 170, 160))
+    ImageDraw.Draw(img).rectangle((divider - 10, 0, divider + 10, 299), fill=(0, 0, 0))
+    img.save(path)
+    return str(path)
+
+
+def test_batch_prior_is_seeded_from_first_files_in_name_order(tmp_path, monkeypatch):
+    paths = [_scan(tmp_path / f"{i:02d}.png", 400 + i) for i in range(8)]
+    monkeypatch.setattr(sf, "ROLL_PRIOR", False)
+    assert sf.batch_prior(paths) is None
+    monkeypatch.setattr(sf, "ROLL_PRIOR", True)
+    prior = sf.batch_prior(list(reversed(paths)))
+    assert len(prior.positions) == sf.PRIOR_SEED_FRAMES
+    assert prior.estimate() == sf.batch_prior(paths).estimate()
+    # the prior does not learn from the files being processed
+    img = Image.open(paths[-1]).convert("RGB")
+    before = list(prior.positions)
+    assert abs(sf.locate_split(img, prior=prior) - 407) <= 10
+    assert prior.positions == before
+
+
+def test_settings_are_read_at_call_time(monkeypatch):
+    # darker band near the left edge: only found when the margin lets the search reach it
+    img = Image.new("RGB", (800, 300), (180, 170, 160))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((390, 0, 410, 299), fill=(40, 40, 40))
+    draw.rectangle((110, 0, 130, 299), fill=(0, 0, 0))
+    assert abs(sf.locate_split(img) - 400) <= 10
+    monkeypatch.setattr(sf, "MARGIN", 0.1)
+    assert abs(sf.locate_split(img) - 120) <= 10
+    assert abs(sf.locate_split(img, margin=0.2) - 400) <= 10
@@ -0,0 +1,10 @@
+import pytest
+
+import watch_folder as wf
+
+
+def test_output_folder_cannot_be_watched_folder(tmp_path):
+    with pytest.raises(ValueError):
+        wf.FolderWatcher(str(tmp_path), str(tmp_path) + "/", backend="poll")
+    w = wf.FolderWatcher(str(tmp_path), str(tmp_path / "out"), backend="poll")
+    assert w.out_dir == str(tmp_path / "out")
@@ -1,6 +1,11 @@
 import os
 from PIL import Image, ImageSequence
 
+import profiling as prof
+import pipeline
+import resampling
+import jpeg_size
+
 TIFF_INPUT  = "scans"
 JPEG_OUTPUT = "jpeg_output_light"
 
@@ -10,6 +15,7 @@ JPEG_SUBSAMPLING = 2         # 4:2:0 (standard)
 JPEG_PROGRESSIVE = True
 JPEG_OPTIMIZE    = True
 FLATTEN_BG       = (255, 255, 255)
+MAX_BYTES        = None      # límite por archivo (p. ej. 1_500_000): JPEG_QUALITY pasa a ser el máximo
 
 def flatten_if_alpha(img):
     if img.mode in ("RGBA", "LA") or ("transparency" in img.info):
@@ -19,34 +25,70 @@ def flatten_if_alpha(img):
         return bg
     return img.convert("RGB")
 
+def long_edge_size(w, h, max_long):
+    """Tamaño con el lado largo a max_long (nunca amplía)."""
+    if max(w, h) <= max_long:
+        return w, h
+    if w >= h:
+        return max_long, int(h * max_long / w)
+    return int(w * max_long / h), max_long
+
 def resize_to_long_edge(img, max_long):
-    w, h = img.size
-    if max(w, h) > max_long:
-        if w >= h:
-            new_w = max_long
-            new_h = int(h * max_long / w)
-        else:
-            new_h = max_long
-            new_w = int(w * max_long / h)
-        return img.resize((new_w, new_h), Image.LANCZOS)
+    size = long_edge_size(*img.size, max_long)
+    if size != img.size:
+        return resampling.resize(img, size)
     return img
 
-def convert_tiff(src_path, out_dir):
+def encode_light(img, src_path=None) -> bytes:
+    save_kw = dict(subsampling=JPEG_SUBSAMPLING, progressive=JPEG_PROGRESSIVE, optimize=JPEG_OPTIMIZE)
+    with prof.stage("encode", src_path) as st:
+        if MAX_BYTES:
+            res = jpeg_size.encode_max_bytes(img, MAX_BYTES, q_max=JPEG_QUALITY, **save_kw)
+            if not res.fits:
+                print(f"⚠️  {src_path}: {len(res.data) // 1024} KB a calidad {res.quality}, no cabe en {MAX_BYTES // 1024} KB")
+            data = res.data
+        else:
+            data = pipeline.encode_jpeg(img, quality=JPEG_QUALITY, **save_kw)
+        st.add_bytes(len(data))
+    return data
+
+def _out_name(base, i, n_frames):
+    return f"{base}_p{i:03d}.jpg" if n_frames > 1 else f"{base}.jpg"
+
+def output_paths(src_path, out_dir):
+    """Rutas que convert_tiff() escribirá para src_path (lee sólo la cabecera del TIFF)."""
+    base = os.path.splitext(os.path.basename(src_path))[0]
     with Image.open(src_path) as im:
+        n = getattr(im, "n_frames", 1)
+    return [os.path.join(out_dir, _out_name(base, i, n)) for i in range(1, n + 1)]
+
+def render_tiff(src, out_dir, src_path=None):
+    """
+    Decodifica, aplana, reduce y codifica cada página de src (ruta o archivo en
+    memoria) sin tocar disco. Devuelve [pipeline.Output] para write_outputs().
+    """
+    src_path = src_path or src
+    outputs = []
+    with Image.open(src) as im:
         base = os.path.splitext(os.path.basename(src_path))[0]
         for i, frame in enumerate(ImageSequence.Iterator(im), start=1):
-            img = flatten_if_alpha(frame.copy())
-            img = resize_to_long_edge(img, MAX_LONG_EDGE)
-            out_name = f"{base}_p{i:03d}.jpg" if im.n_frames > 1 else f"{base}.jpg"
-            out_path = os.path.join(out_dir, out_name)
-            img.save(
-                out_path,
-                quality=JPEG_QUALITY,
-                subsampling=JPEG_SUBSAMPLING,
-                progressive=JPEG_PROGRESSIVE,
-                optimize=JPEG_OPTIMIZE,
-            )
-            print(f"✅ {src_path} → {out_path} ({img.size[0]}x{img.size[1]})")
+            with prof.stage("decode", src_path) as st:
+                img = frame.copy()
+                if i == 1 and isinstance(src, str):
+                    st.add_bytes(os.path.getsize(src_path))
+            with prof.stage("flatten", src_path):
+                img = flatten_if_alpha(img)
+            with prof.stage("resize", src_path):
+                img = resize_to_long_edge(img, MAX_LONG_EDGE)
+            out_path = os.path.join(out_dir, _out_name(base, i, im.n_frames))
+            outputs.append(pipeline.Output(out_path, encode_light(img, src_path), img.size))
+    return outputs
+
+def convert_tiff(src_path, out_dir):
+    outputs = render_tiff(src_path, out_dir)
+    pipeline.write_outputs(outputs, src_path)
+    for o in outputs:
+        print(f"✅ {src_path} → {o.path} ({o.size[0]}x{o.size[1]})")
 
 def main():
     os.makedirs(JPEG_OUTPUT, exist_ok=True)
@@ -54,6 +96,9 @@ def main():
         if f.lower().endswith((".tif", ".tiff")):
             convert_tiff(os.path.join(TIFF_INPUT, f), JPEG_OUTPUT)
     print(f"\n🎉 All done! Lighter JPEGs saved in: {JPEG_OUTPUT}")
+    if prof.is_enabled():
+        print("\n" + prof.summary_table())
+        prof.export_all(JPEG_OUTPUT)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,311 @@
+# watch_folder.py
+"""
+Carpeta caliente: vigila la carpeta donde el escáner deja los TIFF y procesa
+cada archivo nuevo en cuanto termina de escribirse, sin pulsar «Procesar».
+
+Backends:
+  - inotify (Linux, paquete opcional inotify_simple): el kernel avisa de
+    cada archivo creado/cerrado/movido, sin listar nada.
+  - sondeo: sólo se vuelve a listar la carpeta cuando cambia su mtime (o cada
+    RESCAN_SECONDS, por si el NAS no la actualiza); no se recorre entera en
+    cada vuelta.
+
+En ambos casos un archivo sólo entra en cola cuando su tamaño y mtime no han
+cambiado durante STABLE_SECONDS (un escaneo a medio escribir no se toca). Los
+archivos pasan por una herramienta o una cadena ("split,frames") con
+WATCH_WORKERS hilos como máximo; los intermedios de una cadena van a
+out/_<herramienta>.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import discovery
+import checkpoint as ck
+import tiff_to_jpeg as tj
+import split_half_frames as sf
+import frames_pic as fp
+import renditions
+
+try:
+    from inotify_simple import INotify, flags as _iflags
+except ImportError:
+    INotify = None
+
+POLL_SECONDS    = 1.0        # cada cuánto se re-comprueban los candidatos
+STABLE_SECONDS  = 3.0        # tamaño/mtime sin cambios durante este tiempo = escritura terminada
+RESCAN_SECONDS  = 60.0       # listado completo de seguridad aunque el mtime de la carpeta no cambie
+WATCH_WORKERS   = 2          # archivos procesándose a la vez (cada TIFF grande ocupa cientos de MB)
+BACKEND         = "auto"     # "auto" | "inotify" | "poll"
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+
+class Tool(NamedTuple):
+    exts: tuple
+    run: Callable[[str, str], None]                 # (src, out_dir)
+    outputs: Callable[[str, str], List[str]]        # (src, out_dir) -> rutas que escribirá
+
+
+def _frames_outputs(src, out_dir):
+    name = os.path.splitext(os.path.basename(src))[0]
+    return [os.path.join(out_dir, f"{name}_blog.jpg")]
+
+
+TOOLS: Dict[str, Tool] = {
+    "tiff":   Tool((".tif", ".tiff"), tj.convert_tiff, tj.output_paths),
+    "split":  Tool(IMAGE_EXTS, sf.split_half_frame, sf.output_paths),
+    "frames": Tool(IMAGE_EXTS, lambda src, out: fp.process_image(src, _frames_outputs(src, out)[0]), _frames_outputs),
+    "renditions": Tool(IMAGE_EXTS, renditions.render_to_folder, renditions.output_paths),
+}
+
+
+def parse_steps(spec) -> List[str]:
+    steps = [s.strip() for s in spec.split(",")] if isinstance(spec, str) else list(spec)
+    steps = [s for s in steps if s]
+    unknown = [s for s in steps if s not in TOOLS]
+    if not steps or unknown:
+        raise ValueError(f"Herramienta desconocida: {', '.join(unknown) or spec!r} (opciones: {', '.join(TOOLS)})")
+    return steps
+
+
+def _step_dirs(out_dir: str, steps: Sequence[str]) -> List[str]:
+    return [os.path.join(out_dir, f"_{s}") for s in steps[:-1]] + [out_dir]
+
+
+def pipeline_outputs(src: str, out_dir: str, steps: Sequence[str]) -> List[str]:
+    """Salidas finales de la cadena para src (falla si falta un intermedio)."""
+    files = [src]
+    for step, d in zip(steps, _step_dirs(out_dir, steps)):
+        files = [o for f in files for o in TOOLS[step].outputs(f, d)]
+    return files
+
+
+def run_pipeline(src: str, out_dir: str, steps: Sequence[str]) -> List[str]:
+    """Pasa src por cada herramienta; las salidas de una son las entradas de la siguiente."""
+    files = [src]
+    for step, d in zip(steps, _step_dirs(out_dir, steps)):
+        os.makedirs(d, exist_ok=True)
+        tool = TOOLS[step]
+        nxt = []
+        for f in files:
+            tool.run(f, d)
+            nxt.extend(tool.outputs(f, d))
+        files = nxt
+    return files
+
+
+def _already_done(src, out_dir, steps) -> bool:
+    try:
+        return ck.outputs_complete(pipeline_outputs(src, out_dir, steps))
+    except Exception:
+        return False
+
+
+def _print_event(kind, path, info):
+    name = os.path.basename(path)
+    if kind == "done":
+        print(f"✅ {name} ({info:.1f}s desde que apareció)")
+    elif kind == "fail":
+        print(f"❌ {name}: {info}")
+    elif kind == "skip":
+        print(f"⏭️  {name} (ya procesado)")
+    elif kind == "info":
+        print(info)
+
+
+class FolderWatcher:
+    """
+    Vigila folder y procesa los archivos nuevos con steps hacia out_dir.
+    on_event(kind, path, info) recibe "done" (info = latencia en s), "fail"
+    (info = excepción), "skip" e "info" (info = mensaje); se llama desde hilos.
+    """
+
+    def __init__(self, folder: str, out_dir: str, steps="tiff", workers: int = WATCH_WORKERS,
+                 stable: float = STABLE_SECONDS, poll: float = POLL_SECONDS, backend: str = BACKEND,
+                 on_event: Optional[Callable] = None):
+        self.folder = os.path.abspath(folder)
+        self.out_dir = out_dir
+        if os.path.realpath(out_dir) == os.path.realpath(folder):
+            # cada salida (.jpg, .tif) sería un archivo nuevo de la carpeta vigilada: bucle sin fin
+            raise ValueError("La carpeta de salida no puede ser la carpeta vigilada")
+        self.steps = parse_steps(steps)
+        self.exts = TOOLS[self.steps[0]].exts
+        self.workers = max(1, workers)
+        self.stable = stable
+        self.poll = poll
+        self.backend = self._pick_backend(backend)
+        self.on_event = on_event or _print_event
+
+        self._cand: Dict[str, tuple] = {}    # ruta -> (size, mtime, estable_desde, visto_en)
+        self._handled: Dict[str, tuple] = {}  # ruta -> (size, mtime) ya procesado (o fallido)
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._dir_mtime = None
+        self._last_scan = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+
+    @staticmethod
+    def _pick_backend(backend):
+        if backend == "inotify" and INotify is None:
+            raise RuntimeError("Backend inotify no disponible (pip install inotify_simple)")
+        if backend == "auto":
+            return "inotify" if INotify is not None and sys.platform.startswith("linux") else "poll"
+        return backend
+
+    # ----- control -----
+    def start(self) -> "FolderWatcher":
+        self._thread = threading.Thread(target=self.run, name="watch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if wait and self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """Bucle bloqueante hasta stop()."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="watch-work")
+        inotify = None
+        if self.backend == "inotify":
+            inotify = INotify()
+            inotify.add_watch(self.folder, _iflags.CREATE | _iflags.MODIFY | _iflags.CLOSE_WRITE | _iflags.MOVED_TO)
+        self.on_event("info", self.folder,
+                      f"👀 Vigilando {self.folder} ({self.backend}) → {' → '.join(self.steps)} → {self.out_dir}")
+        try:
+            self._initial_scan()
+            while not self._stop.is_set():
+                if inotify is not None:
+                    for ev in inotify.read(timeout=int(self.poll * 1000)):
+                        if ev.name:
+                            self._touch(os.path.join(self.folder, ev.name))
+                    if time.monotonic() - self._last_scan >= RESCAN_SECONDS:
+                        self._scan()
+                else:
+                    self._stop.wait(self.poll)
+                    self._poll_dir()
+                self._check_candidates()
+        finally:
+            if inotify is not None:
+                inotify.close()
+            self._pool.shutdown(wait=True)
+            self.on_event("info", self.folder,
+                          f"⏹️  Vigilancia detenida. OK: {self.processed}, Fallos: {self.failed}")
+
+    # ----- descubrimiento -----
+    def _initial_scan(self):
+        for e in discovery.scan_media(self.folder, recursive=False, exts=self.exts):
+            if _already_done(e.path, self.out_dir, self.steps):
+                self._handled[e.path] = (e.size, e.mtime)
+                self.on_event("skip", e.path, None)
+        self._scan()
+
+    def _scan(self):
+        self._last_scan = time.monotonic()
+        try:
+            self._dir_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return
+        for e in discovery.iter_media(self.folder, recursive=False, exts=self.exts):
+            self._touch(e.path, (e.size, e.mtime))
+
+    def _poll_dir(self):
+        try:
+            m = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return  # NAS desconectado: se reintenta en la siguiente vuelta
+        if m != self._dir_mtime or time.monotonic() - self._last_scan >= RESCAN_SECONDS:
+            self._scan()
+
+    def _touch(self, path, sig=None):
+        if not path.lower().endswith(self.exts) or os.path.basename(path).startswith("."):
+            return
+        if sig is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+            sig = (st.st_size, st.st_mtime)
+        if self._handled.get(path) == sig or path in self._cand:
+            return
+        now = time.monotonic()
+        self._cand[path] = (sig[0], sig[1], now, now)
+
+    # ----- estabilidad y cola -----
+    def _check_candidates(self):
+        now = time.monotonic()
+        for path, (size, mtime, since, seen) in list(self._cand.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._cand[path]  # borrado o movido antes de terminar
+                continue
+            sig = (st.st_size, st.st_mtime)
+            if sig != (size, mtime) or sig[0] == 0:
+                self._cand[path] = (sig[0], sig[1], now, seen)
+                continue
+            if now - since < self.stable:
+                continue
+            with self._lock:
+                if self._inflight >= self.workers:
+                    return  # cola llena: lo que quede espera a la siguiente vuelta
+                self._inflight += 1
+            del self._cand[path]
+            self._handled[path] = sig
+            self._pool.submit(self._process, path, seen)
+
+    def _process(self, path, seen):
+        try:
+            run_pipeline(path, self.out_dir, self.steps)
+        except Exception as e:
+            self.failed += 1
+            self.on_event("fail", path, e)
+        else:
+            latency = time.monotonic() - seen
+            self.processed += 1
+            self.latencies.append(latency)
+            self.on_event("done", path, latency)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Vigila una carpeta de escaneos y procesa los archivos nuevos")
+    ap.add_argument("folder")
+    ap.add_argument("out")
+    ap.add_argument("--tool", default="tiff", help=f"herramienta o cadena separada por comas ({', '.join(TOOLS)})")
+    ap.add_argument("--workers", type=int, default=WATCH_WORKERS)
+    ap.add_argument("--stable", type=float, default=STABLE_SECONDS)
+    ap.add_argument("--poll", type=float, default=POLL_SECONDS)
+    ap.add_argument("--backend", choices=("auto", "inotify", "poll"), default=BACKEND)
+    args = ap.parse_args()
+    if not os.path.isdir(args.folder):
+        ap.error(f"no es una carpeta: {args.folder}")
+    try:
+        w = FolderWatcher(args.folder, args.out, args.tool, args.workers, args.stable, args.poll, args.backend)
+    except (ValueError, RuntimeError) as e:
+        ap.error(str(e))
+    try:
+        w.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())